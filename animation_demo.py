@@ -1,11 +1,40 @@
 import streamlit as st
 import numpy as np
-from typing import Any
+from julia_cache import ANIMATION_DIR, FrameCache, frame_key, publish_animation
+from julia_encode import PALETTES, FrameEncoder, encode_animation
+from julia_render import PREVIEW_STEP, render_frames_progressive
+from static_files import static_path_url, static_url
+
+
+@st.cache_resource
+def get_frame_cache():
+    """プロセス内で共有するフレーム列のキャッシュを返す関数"""
+    return FrameCache()
+
 
 # Interactive Streamlit elements, like these sliders, return their value.
 # This gives you an extremely simple interaction model.
-iterations = st.sidebar.slider("Level of detail", 2, 20, 10, 1)
+# Deep mode allows far higher iteration limits: frames are computed in
+# complex64 row bands and colored by smooth (continuous) iteration counts.
+deep = st.sidebar.checkbox("Deep iterations (smooth coloring)", False)
+if deep:
+    iterations = st.sidebar.slider("Level of detail", 50, 2000, 300, 50)
+else:
+    iterations = st.sidebar.slider("Level of detail", 2, 20, 10, 1)
 separation = st.sidebar.slider("Separation", 0.7, 2.0, 0.7885)
+# Progressive rendering shows a quarter-resolution preview of any frame that
+# isn't ready yet; adaptive tiling skips tiles whose border never escapes (or escapes at once).
+progressive = st.sidebar.checkbox("Progressive rendering", True)
+tiled = st.sidebar.checkbox("Adaptive tiling", False)
+palette = st.sidebar.selectbox("Palette", PALETTES)
+# "Stream frames" sends one small palette PNG per frame; the animated formats
+# encode the whole sequence once and let the browser play it. WebP needs static
+# file serving (st.image would re-encode it as a still PNG); GIF works either way.
+outputs = ["Stream frames", "Animated WebP", "Animated GIF"]
+if not static_url(static_path_url(ANIMATION_DIR)):
+    outputs.remove("Animated WebP")
+output = st.sidebar.radio("Output", outputs)
+stream_frames = output == "Stream frames"
 
 # Non-interactive elements return a placeholder to their location
 # in the app. Here we're storing progress_bar to update it later.
@@ -17,28 +46,64 @@ frame_text = st.sidebar.empty()
 image = st.empty()
 
 m, n, s = 960, 640, 400
-x = np.linspace(-m / s, m / s, num=m).reshape((1, m))
-y = np.linspace(-n / s, n / s, num=n).reshape((n, 1))
+n_frames = 100
+
+# Frames for slider values we've already seen are replayed from the cache
+# instead of being recomputed.
+frame_cache = get_frame_cache()
+key = frame_key(iterations=iterations, separation=separation, width=m, height=n, scale=s, frames=n_frames,
+                tiled=tiled and not deep, deep=deep)
+cached_frames = frame_cache.get(key)
+rendered = []
+
+if cached_frames is None:
+    # Performing some fractal wizardry. Frames are independent, so they are
+    # computed in a process pool and streamed back in order as they finish.
+    cs = separation * np.exp(1j * np.linspace(0.0, 4 * np.pi, n_frames))
+    frames = render_frames_progressive(cs, iterations, m, n, s, tiled=tiled, deep=deep,
+                                       preview_step=PREVIEW_STEP if progressive else None)
+elif stream_frames:
+    frames = ((frame, True) for frame in cached_frames)
+else:
+    # The animation is built from the cached frames below.
+    frames = []
+
+encoder = FrameEncoder(m, n, palette)
+frame_num = 0
+for frame, final in frames:
+    # Update the image placeholder by calling the image() function on it.
+    # The PNG bytes are served as-is, without any server-side conversion.
+    if stream_frames:
+        image.image(encoder.encode(frame), output_format="PNG", width="stretch")
+    if not final:
+        # A low-resolution preview; the full frame follows.
+        continue
 
-for frame_num, a in enumerate(np.linspace(0.0, 4 * np.pi, 100)):
     # Here were setting value for these two elements.
     progress_bar.progress(frame_num)
     frame_text.text("Frame %i/100" % (frame_num + 1))
+    frame_num += 1
+    if cached_frames is None:
+        rendered.append(frame)
 
-    # Performing some fractal wizardry.
-    c = separation * np.exp(1j * a)
-    Z = np.tile(x, (n, 1)) + 1j * np.tile(y, (1, m))
-    C = np.full((n, m), c)
-    M: Any = np.full((n, m), True, dtype=bool)
-    N = np.zeros((n, m))
+# Only complete sequences are cached (a rerun mid-animation stops the script
+# before we get here).
+if cached_frames is None:
+    cached_frames = np.stack(rendered)
+    frame_cache.put(key, cached_frames)
 
-    for i in range(iterations):
-        Z[M] = Z[M] * Z[M] + C[M]
-        M[np.abs(Z) > 2] = False
-        N[M] = i
-
-    # Update the image placeholder by calling the image() function on it.
-    image.image(1.0 - (N / N.max()), use_column_width=True)
+if not stream_frames:
+    fmt = output.split()[-1].lower()
+    # The animation is encoded once per setting and written under static/, so
+    # the browser fetches it by URL instead of receiving it inline on every rerun.
+    path = publish_animation(key, fmt, palette,
+                             lambda: encode_animation(cached_frames, fmt, palette=palette))
+    url = static_url(static_path_url(path))
+    if url:
+        image.markdown('<img src="%s" style="width: 100%%">' % url, unsafe_allow_html=True)
+    else:
+        # Without static serving, Streamlit's media manager serves the GIF as is.
+        image.image(path, width="stretch")
 
 # We clear elements by calling empty on them.
 progress_bar.empty()
@@ -0,0 +1,164 @@
+"""ベンチマーク用の入力データ（気象庁の日別ページ・都道府県と市区町村のGeoJSON）。
+
+ネットワークに依存しないように、実データと同じ構造のデータを乱数の種から毎回同じ内容で作る。
+"""
+import calendar
+import json
+import math
+import random
+import re
+
+import requests
+
+from population_data import PREFECTURES
+
+# 日別値の表の見出し（daily_s1.php と同じ2段構成）
+JMA_FIRST_HEADERS = ['日', '気圧(hPa)', '降水量(mm)', '気温(℃)', '湿度(％)', '風向・風速(m/s)', '日照時間(h)',
+                     '雪(cm)', '天気概況']
+JMA_SECOND_HEADERS = ['日', '現地', '海面', '合計', '最大1時間', '最大10分間', '平均', '最高', '最低', '平均', '最小',
+                      '平均風速', '最大風速', '風向', '最大瞬間風速', '風向', '最多風向', '', '降雪', '最深積雪',
+                      '昼(06:00-18:00)', '夜(18:00-翌日06:00)']
+WEATHER_TEXTS = ['晴', '曇', '雨', '雪', 'みぞれ', '晴後曇', '曇時々雨', '快晴', '晴一時雨', '雨後雪']
+
+_URL_PATTERN = re.compile(r'year=(\d+).*month=(\d+)')
+
+
+def make_jma_page(year, month, seed=None, header_class='header'):
+    """気象庁の日別値ページ（daily_s1.php）と同じ構造のHTMLを作る関数。
+
+    見出しの2行は header_class の行にする（既定の 'header' なら、パーサーが見出しから列の位置を決める）。
+    'mtx' にすると見出しとして検出されず、パーサーは既定の列位置（DEFAULT_COLUMNS）を使う。
+    """
+    rnd = random.Random(seed if seed is not None else year * 100 + month)
+    # 実ページと同じく、表の前後にメニューや注記などのマークアップがある
+    boilerplate = ''.join(f'<li><a href="/menu/{i}.html">メニュー{i}</a></li>' for i in range(300))
+    out = [f'<html><head><title>{year}年{month}月 日ごとの値</title></head><body>',
+           f'<div id="menu"><ul>{boilerplate}</ul></div>',
+           '<table id="tablefix1" class="data2_s">',
+           f'<tr class="{header_class}">' + ''.join(f'<th>{h}</th>' for h in JMA_FIRST_HEADERS) + '</tr>',
+           f'<tr class="{header_class}">' + ''.join(f'<th>{h}</th>' for h in JMA_SECOND_HEADERS) + '</tr>']
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        max_temp = round(rnd.uniform(-5, 35), 1)
+        min_temp = round(max_temp - rnd.uniform(3, 12), 1)
+        # 欠測（//）や準正常値（")"付き）もときどき混ぜる
+        roll = rnd.random()
+        max_text = '//' if roll < 0.02 else (f'{max_temp} )' if roll < 0.05 else str(max_temp))
+        cells = ([f'<div class="a_print"><a href="#">{day}</a></div>', '1010.2', '1013.1', '0.5', '--', '--',
+                  f'{(max_temp + min_temp) / 2:.1f}', max_text, str(min_temp)]
+                 + ['1'] * 11 + [rnd.choice(WEATHER_TEXTS), rnd.choice(WEATHER_TEXTS)])
+        out.append('<tr class="mtx" style="text-align:right;">'
+                   + ''.join(f'<td class="data_0_0">{cell}</td>' for cell in cells) + '</tr>')
+    out.append('</table><div id="footer">' + boilerplate + '</div></body></html>')
+    return '\n'.join(out)
+
+
+class FakeResponse:
+    """requests.Response の代わりに使う最小限の応答"""
+
+    def __init__(self, body, status_code=200):
+        self.content = body.encode('utf-8')
+        self.text = body
+        self.status_code = status_code
+        self.headers = {}
+        self.encoding = None
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+
+class FakeSession:
+    """URLの年・月に対応する気象庁ページを返すセッション。作ったページは使い回す。"""
+
+    def __init__(self):
+        self._pages = {}
+
+    def get(self, url, headers=None, timeout=None):
+        match = _URL_PATTERN.search(url)
+        year, month = int(match.group(1)), int(match.group(2))
+        if (year, month) not in self._pages:
+            self._pages[(year, month)] = make_jma_page(year, month)
+        return FakeResponse(self._pages[(year, month)])
+
+
+def make_prefecture_geojson(points_per_feature=2000, seed=0):
+    """都道府県の境界データ（dataofjapan/land の japan.geojson と同じ属性）を作る関数
+
+    形は実際の県境ではなく、日本付近に並べたギザギザの多角形。頂点数は実データと同程度にする。
+    """
+    rnd = random.Random(seed)
+    features = []
+    for index, (pref_code, info) in enumerate(PREFECTURES.items()):
+        center_lon = 129.0 + (index % 8) * 2.0
+        center_lat = 31.0 + (index // 8) * 2.2
+        ring = []
+        for i in range(points_per_feature):
+            angle = 2 * math.pi * i / points_per_feature
+            radius = 0.8 * (1.0 + 0.15 * math.sin(angle * 7) + rnd.uniform(-0.03, 0.03))
+            ring.append([round(center_lon + radius * math.cos(angle), 6),
+                         round(center_lat + radius * math.sin(angle), 6)])
+        ring.append(ring[0])
+        features.append({
+            'type': 'Feature',
+            'properties': {'nam': info['name'], 'nam_ja': info['name'], 'id': int(pref_code)},
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def write_prefecture_geojson(path, **kwargs):
+    """都道府県の境界データをファイルに書き出す関数"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(make_prefecture_geojson(**kwargs), f, ensure_ascii=False)
+    return path
+
+
+def make_municipality_geojson(per_side=6, points_per_edge=20):
+    """市区町村の境界データ（国土数値情報 N03 と同じ属性）を作る関数
+
+    都道府県ごとに、make_prefecture_geojson と同じ場所に per_side × per_side 個の正方形を敷き詰める
+    （既定で全国 1,692 市区町村）。各都道府県の最初の市区町村は2つの地物（本土と島）に分け、
+    市区町村コードのない地物（所属未定地）も1つ入れる。
+    """
+    size = 1.6 / per_side
+    step = size / points_per_edge
+    features = []
+
+    def square(west, south, width, height):
+        # 隣の正方形と辺の頂点がそろうように、同じ間隔で頂点を置く
+        ring = [[west + step * i, south] for i in range(round(width / step))]
+        ring += [[west + width, south + step * i] for i in range(round(height / step))]
+        ring += [[west + width - step * i, south + height] for i in range(round(width / step))]
+        ring += [[west, south + height - step * i] for i in range(round(height / step))]
+        ring.append(ring[0])
+        return {'type': 'Polygon', 'coordinates': [[[round(x, 6), round(y, 6)] for x, y in ring]]}
+
+    def feature(info, code, name, geometry):
+        return {
+            'type': 'Feature',
+            'properties': {'N03_001': info['name'], 'N03_002': None, 'N03_003': None, 'N03_004': name,
+                           'N03_005': None, 'N03_007': code},
+            'geometry': geometry,
+        }
+
+    for index, (pref_code, info) in enumerate(PREFECTURES.items()):
+        west0 = 129.0 + (index % 8) * 2.0 - 0.8
+        south0 = 31.0 + (index // 8) * 2.2 - 0.8
+        for i in range(per_side * per_side):
+            west, south = west0 + (i % per_side) * size, south0 + (i // per_side) * size
+            code, name = f'{pref_code}{i + 1:03d}', f"{info['name'][:-1]}第{i + 1}市"
+            if i == 0:
+                half = step * (points_per_edge // 2)
+                features.append(feature(info, code, name, square(west, south, size, half)))
+                features.append(feature(info, code, name, square(west, south + half, size, size - half)))
+            else:
+                features.append(feature(info, code, name, square(west, south, size, size)))
+    features.append(feature(PREFECTURES['01'], None, None, square(150.0, 45.0, step * 4, step * 4)))
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def write_municipality_geojson(path, **kwargs):
+    """市区町村の境界データをファイルに書き出す関数"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(make_municipality_geojson(**kwargs), f, ensure_ascii=False)
+    return path
@@ -0,0 +1,613 @@
+"""3つのデモアプリの計算部分（画面表示なし）のベンチマーク。
+
+各段階の所要時間（中央値・中央絶対偏差）とピークメモリ（tracemalloc）を計測し、同じマシンで保存した基準値
+（benchmarks/baseline.json）と比べる。入力は benchmarks/fixtures.py で作る気象庁ページとGeoJSONで、ネットワークには接続しない。
+
+    python benchmarks/run_benchmarks.py --save-baseline  # 変更前に計測して、このマシンの基準値を保存
+    python benchmarks/run_benchmarks.py                  # 計測して基準値と比較（退行は表示するだけ）
+    python benchmarks/run_benchmarks.py --check          # 退行があれば終了コード1で終わる
+    python benchmarks/run_benchmarks.py --only weather   # 名前に weather を含む段階だけ
+    python benchmarks/run_benchmarks.py --import-profile # 各ページの起動時のimportの内訳（-X importtime）を表示
+
+基準値は計測したマシンに依存するのでリポジトリには含めない（.gitignore 済み）。
+時間は中央値どうしを比べ、差が許容倍率を超え、かつ計測のばらつき（中央絶対偏差）より十分大きい場合だけ退行とする。
+同じ処理でもプロセスごとに速さが変わることがあるので、退行に見えた段階は新しいプロセスで計測し直し、
+すべて退行だった場合だけ報告する。
+"""
+import argparse
+import ast
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from benchmarks.fixtures import FakeSession, make_jma_page, write_municipality_geojson, write_prefecture_geojson
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# 基準値に対する許容倍率（既定: 中央値が1.5倍まで）
+DEFAULT_TOLERANCE = 1.5
+
+# 中央値を安定させるため、各段階は少なくともこの回数は繰り返す
+MIN_REPEAT = 9
+
+# 時間の差がばらつき（基準値と今回の中央絶対偏差の和）のこの倍数以下なら、退行とみなさない
+NOISE_MADS = 3
+
+# 退行に見えた段階を新しいプロセスで計測し直す回数
+RECHECKS = 2
+
+# ピークメモリはほぼ毎回同じなので、これより小さい差だけ無視する
+MIN_MEMORY_DELTA = 1024 ** 2  # バイト
+
+# 登録された段階（名前, 準備関数, 繰り返し回数）
+BENCHMARKS = []
+
+
+def benchmark(name, repeat=5):
+    """段階を登録するデコレーター。
+
+    登録する関数は準備（計測しない）をしてから、計測対象の引数なし関数を返す。
+    """
+    def register(setup):
+        BENCHMARKS.append((name, setup, repeat))
+        return setup
+    return register
+
+
+# --- 気温データ（weather_streamlit.py） ---
+
+LOCATION = {'name': 'Tokyo', 'prec_no': '44', 'block_no': '47662'}
+
+
+def _weather_frame(start_year, n_years, precipitation=True):
+    from weather_data import fetch_range
+    df, _ = fetch_range(LOCATION, (start_year, 1), (start_year + n_years - 1, 12), precipitation=precipitation,
+                        max_workers=1, session=FakeSession())
+    return df
+
+
+@benchmark('weather.parse_month_lxml', repeat=20)
+def bench_parse_lxml():
+    from jma_table_parser import parse_daily_columns
+    html = make_jma_page(2023, 7)
+    return lambda: parse_daily_columns(html, backend='lxml')
+
+
+@benchmark('weather.parse_month_bs4', repeat=10)
+def bench_parse_bs4():
+    from jma_table_parser import parse_daily_columns
+    html = make_jma_page(2023, 7)
+    return lambda: parse_daily_columns(html, backend='bs4')
+
+
+@benchmark('weather.fetch_month', repeat=20)
+def bench_fetch_month():
+    from weather_data import fetch_month_rows, rows_to_frame
+    session = FakeSession()
+    session.get('year=2023&month=7')
+
+    def run():
+        return rows_to_frame(fetch_month_rows(2023, 7, LOCATION, session=session), precipitation=True)
+    return run
+
+
+@benchmark('weather.fetch_year', repeat=5)
+def bench_fetch_year():
+    from weather_data import fetch_range
+    session = FakeSession()
+    for month in range(1, 13):
+        session.get(f'year=2023&month={month}')
+    return lambda: fetch_range(LOCATION, (2023, 1), (2023, 12), precipitation=True, session=session)
+
+
+def _plot_to_png(df, year, month, end=None):
+    from weather_charts import plot_temperature
+    fig = plot_temperature(df, LOCATION['name'], year, month, show_precipitation=True, end=end)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+@benchmark('weather.plot_month', repeat=5)
+def bench_plot_month():
+    df = _weather_frame(2023, 1)
+    df = df[df['date'].dt.month == 7].reset_index(drop=True)
+    return lambda: _plot_to_png(df, 2023, 7)
+
+
+@benchmark('weather.plot_10_years', repeat=3)
+def bench_plot_range():
+    df = _weather_frame(2014, 10)
+    return lambda: _plot_to_png(df, 2014, 1, end=(2023, 12))
+
+
+@benchmark('weather.plot_cached', repeat=20)
+def bench_plot_cached():
+    from figure_render import FigureRenderer
+    from weather_charts import plot_temperature
+    df = _weather_frame(2014, 10)
+    renderer = FigureRenderer()
+    renderer.render(plot_temperature, df, LOCATION['name'], 2014, 1, True, end=(2023, 12))
+    # 2回目以降は画像のキャッシュから返す（DataFrameのハッシュ計算だけ）
+    return lambda: renderer.render(plot_temperature, df, LOCATION['name'], 2014, 1, True, end=(2023, 12))
+
+
+@benchmark('weather.chart_30_years', repeat=5)
+def bench_chart():
+    import altair as alt
+    from weather_charts import temperature_chart
+    df = _weather_frame(1994, 30)
+
+    def run():
+        # Streamlitは表示用のデータを別に送るので、Altairの行数の上限は外して仕様に変換する
+        chart, _, _ = temperature_chart(df, 'Tokyo', show_precipitation=True)
+        with alt.data_transformers.disable_max_rows():
+            return chart.to_dict()
+    return run
+
+
+# --- ジュリア集合（animation_demo.py） ---
+
+ITERATIONS = 10
+SEPARATION = 0.7885
+
+
+def _julia_kernel_bench(kernel, iterations=ITERATIONS):
+    from julia_render import grid
+    x, y = grid()
+    c = SEPARATION * np.exp(1j * 0.5)
+    return lambda: kernel(x, y, c, iterations)
+
+
+@benchmark('julia.frame_reference', repeat=3)
+def bench_julia_reference():
+    from julia_render import julia_counts_reference
+    return _julia_kernel_bench(julia_counts_reference)
+
+
+@benchmark('julia.frame_compacted', repeat=5)
+def bench_julia_compacted():
+    from julia_render import julia_counts
+    return _julia_kernel_bench(julia_counts)
+
+
+@benchmark('julia.frame_tiled', repeat=5)
+def bench_julia_tiled():
+    from julia_render import julia_counts_tiled
+    return _julia_kernel_bench(julia_counts_tiled)
+
+
+@benchmark('julia.frame_smooth_1000', repeat=3)
+def bench_julia_smooth():
+    from julia_render import smooth_counts
+    return _julia_kernel_bench(smooth_counts, iterations=1000)
+
+
+@benchmark('julia.animation_10_frames', repeat=3)
+def bench_julia_animation():
+    # animation_demo.py のループと同じく、フレームを順に計算してPNGに変換する（このプロセスだけで計算）
+    from julia_encode import FrameEncoder
+    from julia_render import HEIGHT, WIDTH, render_frames
+    cs = SEPARATION * np.exp(1j * np.linspace(0.0, 4 * np.pi, 100))[:10]
+    encoder = FrameEncoder(WIDTH, HEIGHT, 'magma')
+
+    def run():
+        return [encoder.encode(frame) for frame in render_frames(cs, ITERATIONS, tiled=True, max_workers=1)]
+    return run
+
+
+# --- 人口統計地図（population_map_dashboard.py） ---
+
+_geojson_path = None
+
+
+def _geojson_file():
+    """GeoJSONを一時ファイルに書き出してパスを返す（1回だけ作る）"""
+    global _geojson_path
+    if _geojson_path is None:
+        fd, _geojson_path = tempfile.mkstemp(suffix='.geojson')
+        os.close(fd)
+        write_prefecture_geojson(_geojson_path)
+    return _geojson_path
+
+
+_geometry_root = None
+
+
+def _geometry_levels():
+    """GeoJSONから詳細度ごとの簡略化済みファイルを一時ディレクトリに作ってパスを返す（1回だけ作る）"""
+    global _geometry_root
+    if _geometry_root is None:
+        from prefecture_geometry import build_levels
+        _geometry_root = tempfile.mkdtemp(prefix='geometry')
+        with open(_geojson_file(), 'rb') as f:
+            build_levels(f.read(), _geometry_root)
+    return _geometry_root
+
+
+_municipality_root = None
+
+
+def _municipality_levels():
+    """市区町村の境界データを詳細度ごと・マス目ごとに一時ディレクトリに作ってパスを返す（1回だけ作る）"""
+    global _municipality_root
+    if _municipality_root is None:
+        from municipality_geometry import build_levels
+        _municipality_root = tempfile.mkdtemp(prefix='municipalities')
+        source = write_municipality_geojson(os.path.join(_municipality_root, 'source.geojson'), points_per_edge=8)
+        build_levels(source, _municipality_root)
+    return _municipality_root
+
+
+@benchmark('population.build_cube', repeat=5)
+def bench_population_cube():
+    from population_data import YEARS, PopulationCube, sample_population_frame
+    return lambda: PopulationCube(sample_population_frame(YEARS))
+
+
+@benchmark('population.load_geojson', repeat=5)
+def bench_population_geojson():
+    path = _geojson_file()
+
+    def run():
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return run
+
+
+@benchmark('population.choropleth_map', repeat=3)
+def bench_population_map():
+    from population_data import fetch_population_data
+    from population_maps import create_choropleth_map
+    with open(_geojson_file(), encoding='utf-8') as f:
+        geo_data = json.load(f)
+    df = fetch_population_data(2020)
+
+    def run():
+        # st_folium と同じく、地図をHTMLに書き出すところまでを計測する
+        return create_choropleth_map(geo_data, df, 'total_population', '総人口（人）').get_root().render()
+    return run
+
+
+@benchmark('population.load_geometry_low', repeat=5)
+def bench_population_geometry_low():
+    from prefecture_geometry import level_path
+    path = level_path('low', _geometry_levels())
+
+    def run():
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return run
+
+
+@benchmark('population.choropleth_map_low', repeat=3)
+def bench_population_map_low():
+    from population_data import fetch_population_data
+    from population_maps import create_choropleth_map
+    from prefecture_geometry import level_path
+    with open(level_path('low', _geometry_levels()), encoding='utf-8') as f:
+        geo_data = json.load(f)
+    df = fetch_population_data(2020)
+    return lambda: create_choropleth_map(geo_data, df, 'total_population', '総人口（人）').get_root().render()
+
+
+@benchmark('population.map_style_update', repeat=5)
+def bench_population_map_update():
+    # 境界データはブラウザが読み込むので、再実行ごとに作るのは地図の枠と色・凡例の層だけ
+    from population_data import fetch_population_data
+    from population_maps import create_base_map, create_style_layer
+    df = fetch_population_data(2020)
+
+    def run():
+        m = create_base_map('/app/static/geometry/v1/prefectures_low.geojson')
+        create_style_layer(df, 'total_population', '総人口（人）').add_to(m)
+        return m.get_root().render()
+    return run
+
+
+@benchmark('population.map_animation', repeat=5)
+def bench_population_map_animation():
+    # 再生モードでは全年の階級を1つの層にまとめて送る（年の切り替えはブラウザ内）
+    from population_data import load_population_cube
+    from population_maps import create_base_map, create_animation_layer
+    cube = load_population_cube()
+
+    def run():
+        m = create_base_map('/app/static/geometry/v1/prefectures_low.geojson')
+        create_animation_layer(cube.series('density'), '人口密度（人/km²）', decimals=1).add_to(m)
+        return m.get_root().render()
+    return run
+
+
+@benchmark('population.municipality_map', repeat=5)
+def bench_population_municipality_map():
+    # 静的ファイル配信のとき: 地図にはマス目の一覧だけを入れ、境界データはブラウザが表示範囲の分だけ読む
+    from municipality_geometry import cell_keys, load_manifest, load_municipalities
+    from population_data import load_population_cube, sample_municipality_frame
+    from population_maps import create_municipality_map, create_style_layer
+    root = _municipality_levels()
+    manifest = load_manifest(root)
+    bounds = manifest['prefecture_bounds']['01']
+    levels = [{'name': name, 'max_zoom': info['max_zoom'], 'cell': info['cell'],
+               'chunks': [key for key in cell_keys(bounds, info['cell']) if key in set(info['chunks'])]}
+              for name, info in manifest['levels'].items()]
+    df = sample_municipality_frame(load_municipalities(root), load_population_cube().year(2020))
+    df = df[df['pref_code'] == '01']
+
+    def run():
+        m = create_municipality_map(bounds, chunk_url='/app/static/municipalities/v1', levels=levels, pref_code='01')
+        create_style_layer(df, 'total_population', '総人口（人）', key='code', target='municipality_layer').add_to(m)
+        return m.get_root().render()
+    return run
+
+
+@benchmark('population.municipality_features', repeat=5)
+def bench_population_municipality_features():
+    # 静的ファイル配信が無効なとき: 都道府県の範囲のマス目を読んで、その都道府県の地物だけを集める
+    from municipality_geometry import load_chunk, load_features, load_manifest
+    root = _municipality_levels()
+    bounds = load_manifest(root)['prefecture_bounds']['01']
+
+    def run():
+        load_chunk.cache_clear()
+        return load_features('medium', bounds, '01', root)
+    return run
+
+
+@benchmark('population.cube_views', repeat=20)
+def bench_population_views():
+    # ダッシュボードの1回の表示で使う取り出し（年の表・上位5件・全件の表・地域別集計）
+    from population_data import PopulationCube, sample_population_frame
+    cube = PopulationCube(sample_population_frame())
+    return lambda: [(cube.year(year), cube.top(year, 'density', 5), cube.by_name(year), cube.regions(year))
+                    for year in cube.years]
+
+
+# --- ダウンロード用ファイル（data_export.py） ---
+
+def _export_frame():
+    """市区町村単位・全年の人口データ（約1,700市区町村 × 7年）を作る"""
+    from population_data import PREFECTURES, load_population_cube, sample_municipality_frame
+    import pandas as pd
+    codes = [f'{pref_code}{i + 1:03d}' for pref_code in PREFECTURES for i in range(36)]
+    municipalities = pd.DataFrame({'code': codes, 'name': [f'市{code}' for code in codes],
+                                   'pref_code': [code[:2] for code in codes], 'area': 200.0})
+    cube = load_population_cube()
+    return pd.concat([sample_municipality_frame(municipalities, cube.year(year)).assign(year=year)
+                      for year in cube.years], ignore_index=True)
+
+
+def _bench_export(fmt):
+    from data_export import export_callable
+    frame = _export_frame()
+    # ボタンが押されたときに実行される関数と同じものを計測する
+    return export_callable(lambda: frame, fmt)
+
+
+@benchmark('export.csv', repeat=5)
+def bench_export_csv():
+    return _bench_export('csv')
+
+
+@benchmark('export.csv_gzip', repeat=5)
+def bench_export_csv_gzip():
+    return _bench_export('csv.gz')
+
+
+@benchmark('export.parquet', repeat=5)
+def bench_export_parquet():
+    return _bench_export('parquet')
+
+
+# --- 起動時のimport（各ページのスクリプトの先頭のimport文） ---
+
+APP_SCRIPTS = {
+    'weather': 'weather_streamlit.py',
+    'julia': 'animation_demo.py',
+    'population': 'population_map_dashboard.py',
+}
+
+# --import-profile で表示するモジュールの数
+IMPORT_PROFILE_TOP = 10
+
+
+def _top_level_imports(script):
+    """ページのスクリプトから、先頭の階層にあるimport文だけを取り出したコードを返す関数"""
+    with open(os.path.join(ROOT, script), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return '\n'.join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_profile(script):
+    """ページのimport文を新しいプロセスで -X importtime 付きで実行する関数。
+
+    (モジュール名, 階層, 自身の時間[秒], 配下を含む時間[秒]) のリストを読み込んだ順に返す。階層0がページから直接読み込んだもの。
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', _top_level_imports(script)],
+                               cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def print_import_profile(top=IMPORT_PROFILE_TOP):
+    """各ページの起動時のimportの合計時間と、時間のかかるモジュール（ページから直接読み込んだもの）を表示する関数"""
+    for app, script in APP_SCRIPTS.items():
+        rows = [row for row in import_profile(script) if row[1] == 0]
+        total = sum(row[3] for row in rows)
+        print(f'{app} ({script}): {total * 1000:.0f} ms')
+        for name, _, _, cumulative in sorted(rows, key=lambda row: row[3], reverse=True)[:top]:
+            print(f'  {name:<32}{cumulative * 1000:9.1f}ms')
+
+
+def _bench_app_imports(script):
+    code = _top_level_imports(script)
+    return lambda: subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, check=True)
+
+
+@benchmark('startup.weather_imports', repeat=3)
+def bench_weather_imports():
+    return _bench_app_imports(APP_SCRIPTS['weather'])
+
+
+@benchmark('startup.julia_imports', repeat=3)
+def bench_julia_imports():
+    return _bench_app_imports(APP_SCRIPTS['julia'])
+
+
+@benchmark('startup.population_imports', repeat=3)
+def bench_population_imports():
+    return _bench_app_imports(APP_SCRIPTS['population'])
+
+
+def measure(func, repeat):
+    """func を repeat 回（少なくとも MIN_REPEAT 回）実行した時間と、別に1回実行したときのピークメモリを返す関数"""
+    # 1回目は遅延importやキャッシュの作成を含むので計測しない
+    func()
+    times = []
+    for _ in range(max(repeat, MIN_REPEAT)):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # tracemallocは実行を遅くするので、時間とは別に計測する
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    median = statistics.median(times)
+    return {'best': min(times), 'median': median, 'mad': statistics.median(abs(t - median) for t in times),
+            'repeat': len(times), 'peak_bytes': peak}
+
+
+def measure_in_subprocess(name):
+    """名前が name の段階を新しいプロセスで計測した結果を返す関数"""
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', name],
+                               cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """基準値より遅く・大きくなった段階を (名前, 理由) のリストで返す関数"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        # 計測のばらつきは段階ごとに違うので、固定の秒数ではなく中央絶対偏差（なければ中央値の1割）で判断する
+        noise = NOISE_MADS * (base.get('mad', 0.1 * base['median']) + result['mad'])
+        delta = result['median'] - base['median']
+        if result['median'] > base['median'] * tolerance and delta > noise:
+            regressions.append((name, f"時間（中央値） {base['median'] * 1000:.1f} ms → {result['median'] * 1000:.1f} ms"))
+        if (result['peak_bytes'] > base['peak_bytes'] * tolerance
+                and result['peak_bytes'] - base['peak_bytes'] > MIN_MEMORY_DELTA):
+            regressions.append((name, f"ピークメモリ {base['peak_bytes'] / 1024 ** 2:.1f} MB → "
+                                      f"{result['peak_bytes'] / 1024 ** 2:.1f} MB"))
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    """保存済みの基準値を読み込む関数。なければ空の辞書を返す。"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """計測結果を基準値として保存する関数（既存の基準値のうち今回計測しなかった段階は残す）"""
+    merged = dict(load_baseline(path))
+    merged.update(results)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'machine': platform.platform(), 'python': platform.python_version(),
+                   'results': dict(sorted(merged.items()))}, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='デモアプリの計算部分のベンチマークを実行し、基準値と比較します。')
+    parser.add_argument('--only', nargs='+', default=None, help='名前にこの文字列を含む段階だけを計測する')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'基準値に対する許容倍率（既定: {DEFAULT_TOLERANCE}）')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基準値のファイル')
+    parser.add_argument('--save-baseline', action='store_true', help='今回の結果をこのマシンの基準値として保存する')
+    parser.add_argument('--check', action='store_true', help='基準値より退行した段階があれば終了コード1で終わる')
+    parser.add_argument('--import-profile', action='store_true',
+                        help='計測はせず、各ページの起動時のimportの内訳（-X importtime）を表示する')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)  # 計測し直すときに子プロセスで使う
+    args = parser.parse_args(argv)
+
+    if args.import_profile:
+        print_import_profile()
+        return 0
+    if args.measure:
+        warnings.filterwarnings('ignore', category=UserWarning, module='folium')
+        setup, repeat = next((setup, repeat) for name, setup, repeat in BENCHMARKS if name == args.measure)
+        print(json.dumps(measure(setup(), repeat)))
+        return 0
+
+    # タイルのAPIキーなど、計測に関係ない警告は表示しない
+    warnings.filterwarnings('ignore', category=UserWarning, module='folium')
+    baseline = load_baseline(args.baseline)
+    if args.check and not baseline:
+        print(f'基準値がありません: {args.baseline}（変更前に --save-baseline で作成してください）')
+        return 2
+    results = {}
+    print(f"{'段階':<32}{'中央値':>10}{'偏差':>9}{'最良':>10}{'ピーク':>10}{'基準比':>8}")
+    for name, setup, repeat in BENCHMARKS:
+        if args.only and not any(part in name for part in args.only):
+            continue
+        result = measure(setup(), repeat)
+        results[name] = result
+        ratio = f"{result['median'] / baseline[name]['median']:.2f}" if name in baseline else '-'
+        print(f"{name:<34}{result['median'] * 1000:9.1f}ms{result['mad'] * 1000:7.1f}ms{result['best'] * 1000:9.1f}ms"
+              f"{result['peak_bytes'] / 1024 ** 2:8.1f}MB{ratio:>8}")
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f'基準値を保存しました: {args.baseline}')
+        return 0
+    if not baseline:
+        print('基準値がありません（--save-baseline で作成できます）')
+        return 0
+
+    # 一時的な負荷やプロセスごとの差による誤検出を避けるため、退行に見えた段階だけ新しいプロセスで計測し直し、
+    # 一度でも基準値の範囲に収まれば退行とみなさない
+    suspects = {name for name, _ in find_regressions(results, baseline, args.tolerance)}
+    for name in sorted(suspects):
+        for _ in range(RECHECKS):
+            if not find_regressions({name: results[name]}, baseline, args.tolerance):
+                break
+            results[name] = measure_in_subprocess(name)
+    regressions = find_regressions({name: results[name] for name in suspects}, baseline, args.tolerance)
+    for name, reason in regressions:
+        print(f'退行: {name}: {reason}')
+    return 1 if regressions and args.check else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""表（DataFrame）をダウンロード用のファイル（CSV / gzip圧縮CSV / Parquet）に書き出す処理。各ダッシュボードで共通。
+
+download_section はファイル形式の選択とダウンロードボタンを表示する。ボタンにはファイルを作る関数を渡すので
+（st.download_button に関数を渡すと、クリックされたときに別スレッドで実行される）、表示のたびにはファイルを作らず、
+ページにも埋め込まない。表は CHUNK_ROWS 行ずつ一時ファイル（小さいうちはメモリ上）に書き出し、
+表全体のCSV文字列やそのエンコード済みのコピーを作らない（Streamlitに渡すのは出来上がったファイルの内容だけ）。
+複数年・市区町村単位の大きな表は、gzip圧縮CSVかParquet（pyarrowがあるとき）にするとファイルが小さくなる。
+"""
+import gzip
+import importlib.util
+import io
+import tempfile
+
+import streamlit as st
+
+# pyarrowは書き出すときに読み込む（ページの起動を遅くしない）。なければParquetは選べない
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# 1回に書き出す行数
+CHUNK_ROWS = 50000
+
+# これより大きくなったら一時ファイルをディスクに移す（バイト）
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# ファイル形式（表示名・拡張子・MIMEタイプ）
+FORMATS = {
+    'csv': {'label': 'CSV', 'extension': '.csv', 'mime': 'text/csv'},
+    'csv.gz': {'label': 'CSV（gzip圧縮）', 'extension': '.csv.gz', 'mime': 'application/gzip'},
+    'parquet': {'label': 'Parquet', 'extension': '.parquet', 'mime': 'application/vnd.apache.parquet'},
+}
+
+
+def available_formats():
+    """この環境で書き出せるファイル形式の名前のリストを返す関数"""
+    return [name for name in FORMATS if name != 'parquet' or HAS_PYARROW]
+
+
+def write_csv(frame, f, chunk_rows=CHUNK_ROWS):
+    """表を CSV（UTF-8）としてバイナリのファイル f に chunk_rows 行ずつ書き出す関数"""
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='', write_through=True)
+    try:
+        for start in range(0, max(len(frame), 1), chunk_rows):
+            frame.iloc[start:start + chunk_rows].to_csv(text, index=False, header=start == 0)
+    finally:
+        text.detach()  # f は閉じない
+
+
+def write_parquet(frame, f, chunk_rows=CHUNK_ROWS):
+    """表を Parquet としてファイル f に chunk_rows 行ずつ（行グループごとに）書き出す関数"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    with pq.ParquetWriter(f, schema, compression='zstd') as writer:
+        for start in range(0, len(frame), chunk_rows):
+            chunk = pa.Table.from_pandas(frame.iloc[start:start + chunk_rows], schema=schema, preserve_index=False)
+            writer.write_table(chunk)
+
+
+def export_file(frame, fmt, chunk_rows=CHUNK_ROWS):
+    """表を fmt の形式で書き出したファイルの内容（bytes）を返す関数"""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as f:
+        _write(frame, fmt, f, chunk_rows)
+        f.seek(0)
+        return f.read()
+
+
+def _write(frame, fmt, f, chunk_rows):
+    """形式ごとの書き出し処理で f に書き出す"""
+    if fmt == 'csv':
+        write_csv(frame, f, chunk_rows)
+    elif fmt == 'csv.gz':
+        # mtime=0 にして、同じ表からは同じバイト列ができるようにする
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=6, mtime=0) as gz:
+            write_csv(frame, gz, chunk_rows)
+    elif fmt == 'parquet':
+        if not HAS_PYARROW:
+            raise ValueError('Parquetの書き出しには pyarrow が必要です')
+        write_parquet(frame, f, chunk_rows)
+    else:
+        raise ValueError(f"未対応のファイル形式です: {fmt}")
+
+
+def export_callable(get_frame, fmt):
+    """ダウンロードボタンに渡す、ファイルを作る関数を返す関数。get_frame は表を返す引数なしの関数。"""
+    return lambda: export_file(get_frame(), fmt)
+
+
+def download_section(label, get_frame, file_stem, key):
+    """ファイル形式の選択とダウンロードボタンを表示する関数。
+
+    get_frame（表を返す引数なしの関数）はボタンが押されたときに初めて呼ばれる。
+    """
+    names = available_formats()
+    fmt = st.radio('ファイル形式', names, format_func=lambda name: FORMATS[name]['label'], horizontal=True,
+                   key=f'{key}_format')
+    st.download_button(
+        label=label,
+        data=export_callable(get_frame, fmt),
+        file_name=file_stem + FORMATS[fmt]['extension'],
+        mime=FORMATS[fmt]['mime'],
+        key=key,
+        on_click='ignore',  # ダウンロードしてもページは再実行しない
+    )
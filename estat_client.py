@@ -0,0 +1,115 @@
+"""政府統計の総合窓口 e-Stat の API（v3.0, JSON）を呼び出すクライアント（Streamlitに依存しない）。
+
+統計表のメタ情報（getMetaInfo）と統計データ（getStatsData）を取得する。統計データは1回の応答で
+返る件数に上限があるので、応答の NEXT_KEY を startPosition に渡して最後のページまで読み進める。
+通信エラーや 429 / 5xx の応答は、間隔を空けて自動的に再試行する。
+
+アプリケーションIDは https://www.e-stat.go.jp/api/ で利用登録すると発行される。
+"""
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = os.environ.get('ESTAT_API_URL', 'https://api.e-stat.go.jp/rest/3.0/app/json')
+
+# 1ページで取得する件数（APIの上限は100,000件）
+DEFAULT_PAGE_SIZE = 100000
+
+# 1回のリクエストのタイムアウト（秒）
+REQUEST_TIMEOUT = 60
+
+# 正常終了の STATUS（0: 正常, 1: 該当データなし, 2: 一部の条件が無効だが正常終了）
+OK_STATUSES = (0, 1, 2)
+
+
+class EStatError(Exception):
+    """e-Stat APIがエラーを返したときの例外"""
+
+    def __init__(self, status, message):
+        super().__init__(f"e-Stat APIエラー（STATUS={status}）: {message}")
+        self.status = status
+
+
+def make_session(retries=3, backoff_factor=1.0):
+    """リトライ設定を持つセッションを作る関数"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,  # 1秒, 2秒, 4秒... と間隔を空けて再試行
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=('GET',),
+        respect_retry_after_header=True,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def as_list(value):
+    """1件だけのときは辞書、複数のときはリストで返る項目をリストにそろえる関数"""
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def class_objects(class_inf):
+    """CLASS_INF を {分類ID: {'name': 分類名, 'classes': [{'code':, 'name':}, ...]}} に変換する関数"""
+    objects = {}
+    for obj in as_list(class_inf.get('CLASS_OBJ')):
+        objects[obj['@id']] = {
+            'name': obj.get('@name', ''),
+            'classes': [{'code': c['@code'], 'name': c.get('@name', ''), 'unit': c.get('@unit')}
+                        for c in as_list(obj.get('CLASS'))],
+        }
+    return objects
+
+
+class EStatClient:
+    """e-Stat APIのクライアント。base_url を変えるとモックサーバーなどにも接続できる。"""
+
+    def __init__(self, app_id, base_url=API_URL, session=None, page_size=DEFAULT_PAGE_SIZE,
+                 timeout=REQUEST_TIMEOUT):
+        self.app_id = app_id
+        self.base_url = base_url.rstrip('/')
+        self.session = session if session is not None else make_session()
+        self.page_size = page_size
+        self.timeout = timeout
+        self.requests = 0
+
+    def _get(self, endpoint, root_key, params):
+        """APIを呼び出し、応答の root_key 以下を返す"""
+        response = self.session.get(f'{self.base_url}/{endpoint}', params={'appId': self.app_id, **params},
+                                    timeout=self.timeout)
+        self.requests += 1
+        response.raise_for_status()
+        body = response.json()[root_key]
+        result = body['RESULT']
+        status = int(result['STATUS'])
+        if status not in OK_STATUSES:
+            raise EStatError(status, result.get('ERROR_MSG', ''))
+        return body
+
+    def get_meta_info(self, stats_data_id):
+        """統計表の分類（年齢・地域・時間軸など）を class_objects の形式で返す"""
+        body = self._get('getMetaInfo', 'GET_META_INFO', {'statsDataId': stats_data_id})
+        return class_objects(body['METADATA_INF']['CLASS_INF'])
+
+    def iter_values(self, stats_data_id, **filters):
+        """統計データの値（VALUE の各要素の辞書）を全ページ分順に返すジェネレーター。
+
+        filters には cdTime='2020000000,2021000000' などの絞り込み条件を渡す。
+        """
+        start = 1
+        while True:
+            params = {'statsDataId': stats_data_id, 'startPosition': start, 'limit': self.page_size,
+                      'metaGetFlg': 'N', 'cntGetFlg': 'N', **filters}
+            body = self._get('getStatsData', 'GET_STATS_DATA', params)
+            data = body.get('STATISTICAL_DATA', {})
+            yield from as_list(data.get('DATA_INF', {}).get('VALUE'))
+            next_key = data.get('RESULT_INF', {}).get('NEXT_KEY')
+            if not next_key:
+                return
+            start = int(next_key)
@@ -0,0 +1,130 @@
+"""e-Stat API（getMetaInfo / getStatsData）のローカルモックサーバー。動作確認用。
+
+与えたDataFrame（year, pref_code, 人数の4列）を、e-Statの人口の表と同じ形（男女 × 年齢3区分 × 地域 × 年、
+全国の値つき）で返す。startPosition / limit によるページ分割と NEXT_KEY、cdXxx による絞り込みに対応し、
+fail_every を指定すると、その回数ごとに 503 を返して再試行を確かめられる。
+
+    with MockEStatServer(frame) as server:
+        client = EStatClient('mock', base_url=server.url)
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from population_data import COUNT_COLUMNS, PREFECTURES
+
+# 年齢区分の分類（cat02）のコードと名前
+AGE_CLASSES = [('000', '総数'), ('001', '0～14歳'), ('002', '15～64歳'), ('003', '65歳以上')]
+
+# 男女の分類（cat01）のコードと名前
+SEX_CLASSES = [('000', '男女計'), ('001', '男'), ('002', '女')]
+
+
+class MockEStatServer:
+    """e-Stat APIのモックサーバー。with 文で起動・停止する。"""
+
+    def __init__(self, frame, stats_data_id='0000000001', page_size=1000, fail_every=0):
+        self.stats_data_id = stats_data_id
+        self.page_size = page_size
+        self.fail_every = fail_every
+        self.requests = []
+        self._frame = frame
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def class_inf(self):
+        """CLASS_INF（表章項目・男女・年齢・地域・時間軸）を返す"""
+        areas = [{'@code': '00000', '@name': '全国'}]
+        areas += [{'@code': f'{code}000', '@name': info['name']} for code, info in PREFECTURES.items()]
+        times = [{'@code': f'{year}000000', '@name': f'{year}年'} for year in sorted(self._frame['year'].unique())]
+        return {'CLASS_OBJ': [
+            {'@id': 'tab', '@name': '表章項目', 'CLASS': {'@code': '001', '@name': '人口', '@unit': '人'}},
+            {'@id': 'cat01', '@name': '男女別', 'CLASS': [{'@code': c, '@name': n} for c, n in SEX_CLASSES]},
+            {'@id': 'cat02', '@name': '年齢3区分', 'CLASS': [{'@code': c, '@name': n} for c, n in AGE_CLASSES]},
+            {'@id': 'area', '@name': '地域', 'CLASS': areas},
+            {'@id': 'time', '@name': '時間軸（年）', 'CLASS': times},
+        ]}
+
+    def values(self):
+        """全ての値（VALUE の要素）を返す。男・女は男女計を半分ずつに分けた値にする。"""
+        values = []
+        national = self._frame.groupby('year')[COUNT_COLUMNS].sum()
+        rows = [(year, '00000', national.loc[year]) for year in national.index]
+        rows += [(row.year, f'{row.pref_code}000', row) for row in self._frame.itertuples(index=False)]
+        for year, area, row in rows:
+            for (age_code, _), column in zip(AGE_CLASSES, COUNT_COLUMNS):
+                total = int(getattr(row, column))
+                for sex_code, value in zip(('000', '001', '002'), (total, total // 2, total - total // 2)):
+                    values.append({'@tab': '001', '@cat01': sex_code, '@cat02': age_code, '@area': area,
+                                   '@time': f'{year}000000', '@unit': '人', '$': str(value)})
+        return values
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                endpoint = parts.path.rsplit('/', 1)[-1]
+                params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+                server.requests.append((endpoint, params))
+                if server.fail_every and len(server.requests) % server.fail_every == 0:
+                    self._send(503, {'error': 'Service Unavailable'})
+                    return
+                self._send(200, server.respond(endpoint, params))
+
+            def _send(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def respond(self, endpoint, params):
+        """APIの応答（JSON）を作る"""
+        root_key = {'getMetaInfo': 'GET_META_INFO', 'getStatsData': 'GET_STATS_DATA'}.get(endpoint)
+        if root_key is None or not params.get('appId') or params.get('statsDataId') != self.stats_data_id:
+            return {root_key or 'ERROR': {'RESULT': {'STATUS': 100, 'ERROR_MSG': 'パラメータが不正です。'}}}
+        if endpoint == 'getMetaInfo':
+            return {root_key: {'RESULT': {'STATUS': 0, 'ERROR_MSG': '正常に終了しました。'},
+                               'METADATA_INF': {'CLASS_INF': self.class_inf()}}}
+
+        values = self.values()
+        for key, value in params.items():
+            if key.startswith('cd'):
+                dim_id = key[2].lower() + key[3:]
+                wanted = set(value.split(','))
+                values = [v for v in values if v.get(f'@{dim_id}') in wanted]
+        if not values:
+            return {root_key: {'RESULT': {'STATUS': 1, 'ERROR_MSG': '該当データはありません。'}}}
+
+        start = int(params.get('startPosition', 1))
+        limit = min(int(params.get('limit', self.page_size)), self.page_size)
+        page = values[start - 1:start - 1 + limit]
+        result_inf = {'TOTAL_NUMBER': len(values), 'FROM_NUMBER': start, 'TO_NUMBER': start + len(page) - 1}
+        if start - 1 + limit < len(values):
+            result_inf['NEXT_KEY'] = start + limit
+        return {root_key: {'RESULT': {'STATUS': 0, 'ERROR_MSG': '正常に終了しました。'},
+                           'STATISTICAL_DATA': {'RESULT_INF': result_inf, 'DATA_INF': {'VALUE': page}}}}
@@ -0,0 +1,123 @@
+"""Matplotlibのグラフを画像（PNG / SVG）にする処理と、描いた画像のキャッシュ（Streamlitに依存しない）。
+
+グラフを描く関数は pyplot を使わずに matplotlib.figure.Figure を作って返す。pyplotが管理する図の一覧に
+登録されないので、画像にした後の図は参照がなくなればメモリから消える（plt.close を忘れても溜まらない）。
+FigureRenderer.render は、描画関数と引数（DataFrameは内容のハッシュ）・形式・解像度が前回と同じなら
+描き直さずに前回の画像を返す。ヒット数・描画回数・描画時間の合計は stats で確認できる。
+
+    renderer = FigureRenderer()
+    png = renderer.render(plot_temperature, df, '東京', 2024, 7)
+"""
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# st.pyplot と同じ既定値（余白を詰め、高解像度ディスプレイでもにじまない解像度にする）
+DEFAULT_DPI = 200
+DEFAULT_FORMAT = 'png'
+
+# キャッシュに残す画像の数とバイト数の上限
+MAX_ENTRIES = 64
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def _update_hash(h, value):
+    """値の内容を h に足し込む（DataFrame・配列は中身、辞書・リストは要素ごと）"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update(type(value).__name__.encode())
+        h.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+        h.update(repr(list(value.dtypes) if isinstance(value, pd.DataFrame) else value.dtype).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(f'ndarray{value.dtype}{value.shape}'.encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(b'dict')
+        for key in sorted(value, key=repr):
+            _update_hash(h, key)
+            _update_hash(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(type(value).__name__.encode())
+        for item in value:
+            _update_hash(h, item)
+    else:
+        h.update(repr(value).encode())
+    h.update(b'|')
+
+
+def cache_key(draw, args, kwargs, fmt, dpi):
+    """描画関数・引数・形式・解像度からキャッシュのキー（16進文字列）を作る関数"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{draw.__module__}.{draw.__qualname__}'.encode())
+    _update_hash(h, args)
+    _update_hash(h, kwargs)
+    _update_hash(h, (fmt, dpi))
+    return h.hexdigest()
+
+
+def figure_to_bytes(fig, fmt=DEFAULT_FORMAT, dpi=DEFAULT_DPI):
+    """図を画像のバイト列にする関数"""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class FigureRenderer:
+    """グラフを画像にし、同じ入力の画像を使い回すキャッシュ（スレッドセーフ、古いものから消す）"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+
+    def render(self, draw, *args, fmt=DEFAULT_FORMAT, dpi=DEFAULT_DPI, **kwargs):
+        """draw(*args, **kwargs) が返す図を画像のバイト列にして返す。図がNoneならNoneを返す。"""
+        key = cache_key(draw, args, kwargs, fmt, dpi)
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return self._images[key]
+
+        start = time.perf_counter()
+        fig = draw(*args, **kwargs)
+        image = None if fig is None else figure_to_bytes(fig, fmt, dpi)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.renders += 1
+            self.render_seconds += elapsed
+            if image is not None and key not in self._images:
+                self._images[key] = image
+                self._bytes += len(image)
+                while self._images and (len(self._images) > self.max_entries or self._bytes > self.max_bytes):
+                    _, removed = self._images.popitem(last=False)
+                    self._bytes -= len(removed)
+        return image
+
+    def stats(self):
+        """キャッシュのヒット数・描画回数・描画時間の合計[秒]・保存している画像の数とバイト数を返す"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'renders': self.renders,
+                'render_seconds': self.render_seconds,
+                'entries': len(self._images),
+                'bytes': self._bytes,
+            }
+
+    def clear(self):
+        """保存している画像を全て消す（カウンターはそのまま）"""
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
@@ -0,0 +1,226 @@
+"""気象庁「日ごとの値」ページ（daily_s1.php）の表 table.data2_s を取り出すパーサー。
+
+lxmlがインストールされていれば、対象の表の部分だけをC実装のパーサーに渡し、
+ヘッダーの列位置を一度だけ決めてから1回の走査で必要な列だけを読む。
+結果は列ごとのNumPy配列（日: int16、気温: float64で欠損はNaN、天気: 文字列）で返す。
+
+lxmlがない環境、または backend='bs4' を指定した場合は、従来どおり
+BeautifulSoup(html.parser) でページ全体を解析する。どちらの経路でも結果は同じになる。
+"""
+import re
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    import lxml.html
+    HAS_LXML = True
+except ImportError:  # lxmlは任意の依存
+    HAS_LXML = False
+
+# ヘッダーから列が特定できない場合の列インデックス
+# （デバッグ出力から昼の天気は19番目、夜の天気は20番目とわかった）
+DEFAULT_COLUMNS = {'max_temp': 7, 'min_temp': 8, 'weather_day': 19, 'weather_night': 20}
+
+# 欠損値として扱う表記
+MISSING_MARKS = frozenset(['//', '--', ''])
+
+_DAY_PATTERN = re.compile(r'(\d+)')
+_TABLE_START = re.compile(r'<table[^>]*class="[^"]*\bdata2_s\b[^"]*"[^>]*>', re.IGNORECASE)
+
+
+class DailyTable(NamedTuple):
+    """日別データ表を列ごとに保持する入れ物"""
+    day: np.ndarray
+    max_temp: np.ndarray
+    min_temp: np.ndarray
+    weather_day: np.ndarray
+    weather_night: np.ndarray
+    diagnostics: dict
+
+
+def resolve_columns(first_headers, second_headers):
+    """2段組ヘッダーの文字列から、最高/最低気温と昼/夜の天気の列インデックスを決める関数"""
+    columns = dict(DEFAULT_COLUMNS)
+
+    # 列を特定（気温(℃)の列の下にある最高/最低）
+    temp_col_idx = next((i for i, h in enumerate(first_headers) if '気温' in h and '℃' in h), -1)
+    # 天気概況の列も特定
+    weather_col_idx = next((i for i, h in enumerate(first_headers) if '天気概況' in h), -1)
+
+    if temp_col_idx >= 0 and len(second_headers) > temp_col_idx:
+        # 温度カラムの下にある各項目を走査
+        for i in range(temp_col_idx, min(temp_col_idx + 10, len(second_headers))):
+            if '最高' in second_headers[i]:
+                columns['max_temp'] = i
+            if '最低' in second_headers[i]:
+                columns['min_temp'] = i
+
+    if weather_col_idx >= 0:
+        # 天気概況カラムの下にある項目を走査
+        for i in range(weather_col_idx, len(second_headers)):
+            if '昼' in second_headers[i]:
+                columns['weather_day'] = i
+            if '夜' in second_headers[i]:
+                columns['weather_night'] = i
+
+    return columns
+
+
+def _to_temperature(text, label, messages):
+    """セルの文字列を気温に変換する。欠損や変換できない値はNaN。"""
+    if text in MISSING_MARKS:
+        return np.nan
+    try:
+        return float(text)
+    except ValueError:
+        if messages is not None:
+            messages.append(f"{label}の変換エラー: '{text}'")
+        return np.nan
+
+
+def _extract(rows, text, debug):
+    """(ヘッダー行か, データ行か, ヘッダーのセル一覧を返す関数, データのセル一覧を返す関数) の並びから
+    列を組み立てる共通処理。セルの文字列化（text）は必要な列だけに行う。
+    """
+    messages = [] if debug else None
+    first_headers = second_headers = None
+    header_count = 0
+    columns = None
+
+    days, max_temps, min_temps, weather_days, weather_nights = [], [], [], [], []
+
+    for is_header, is_data, header_cells, data_cells in rows:
+        if is_header:
+            # 2段組ヘッダーの1段目と2段目だけを使う
+            header_count += 1
+            if header_count == 1:
+                first_headers = [text(c) for c in header_cells()]
+            elif header_count == 2:
+                second_headers = [text(c) for c in header_cells()]
+            continue
+        if not is_data:
+            continue
+
+        cells = data_cells()
+        if len(cells) < 5:  # 少なくともいくつかのセルがあること
+            continue
+
+        if columns is None:
+            # 最初のデータ行の時点で列位置を一度だけ決める
+            if second_headers is not None:
+                columns = resolve_columns(first_headers, second_headers)
+            else:
+                columns = dict(DEFAULT_COLUMNS)
+            max_idx, min_idx = columns['max_temp'], columns['min_temp']
+            day_idx, night_idx = columns['weather_day'], columns['weather_night']
+
+        # 日付を取得
+        day_text = text(cells[0])
+        if day_text.isdigit():
+            day = int(day_text)
+        else:
+            day_match = _DAY_PATTERN.search(day_text)
+            if not day_match:
+                continue
+            day = int(day_match.group(1))
+
+        n_cells = len(cells)
+        max_temp = _to_temperature(text(cells[max_idx]), '最高気温', messages) if n_cells > max_idx else np.nan
+        min_temp = _to_temperature(text(cells[min_idx]), '最低気温', messages) if n_cells > min_idx else np.nan
+
+        # どちらも欠損値ならスキップ
+        if max_temp != max_temp and min_temp != min_temp:
+            if debug:
+                messages.append(f"{day}日のデータ: 気温データなし")
+            continue
+
+        days.append(day)
+        max_temps.append(max_temp)
+        min_temps.append(min_temp)
+        weather_days.append(text(cells[day_idx]) if n_cells > day_idx else "")
+        weather_nights.append(text(cells[night_idx]) if n_cells > night_idx else "")
+
+        if debug and day == 1:  # 最初の日だけ全セルの内容を記録
+            messages.append(f"{day}日のデータ詳細: " + ", ".join(f"セル[{i}]: '{text(c)}'" for i, c in enumerate(cells)))
+
+    diagnostics = {
+        'columns': columns if columns is not None else dict(DEFAULT_COLUMNS),
+        'first_headers': first_headers or [],
+        'second_headers': second_headers or [],
+        'messages': messages or [],
+    }
+    return DailyTable(
+        day=np.array(days, dtype=np.int16),
+        max_temp=np.array(max_temps, dtype=np.float64),
+        min_temp=np.array(min_temps, dtype=np.float64),
+        weather_day=np.array(weather_days, dtype=object),
+        weather_night=np.array(weather_nights, dtype=object),
+        diagnostics=diagnostics,
+    )
+
+
+def _slice_table(html):
+    """HTML全体から table.data2_s の部分だけを切り出す。見つからなければNone。"""
+    match = _TABLE_START.search(html)
+    if match is None:
+        return None
+    end = html.find('</table>', match.end())
+    return html[match.start():end + len('</table>') if end >= 0 else len(html)]
+
+
+def _lxml_text(cell):
+    return cell.text_content().strip()
+
+
+def _bs4_text(cell):
+    return cell.text.strip()
+
+
+def _iter_rows_lxml(table):
+    for row in table.iter('tr'):
+        classes = row.get('class', '')
+        yield (
+            'header' in classes.split(),
+            'mtx' in classes,
+            lambda row=row: list(row.iter('th', 'td')),
+            lambda row=row: list(row.iter('td')),
+        )
+
+
+def _iter_rows_bs4(table):
+    for row in table.find_all('tr'):
+        classes = row.get('class', [])
+        yield (
+            'header' in classes,
+            'mtx' in str(classes),
+            lambda row=row: row.find_all(['th', 'td']),
+            lambda row=row: row.find_all('td'),
+        )
+
+
+def parse_daily_columns(html, backend=None, debug=False):
+    """日別データページのHTMLから列ごとのNumPy配列を取り出す関数。表が見つからなければNoneを返す。
+
+    backendは 'lxml' か 'bs4'。省略時はlxmlがあればlxml、なければBeautifulSoupを使う。
+    """
+    if backend is None:
+        backend = 'lxml' if HAS_LXML else 'bs4'
+
+    if backend == 'lxml':
+        fragment = _slice_table(html)
+        if fragment is None:
+            return None
+        table = lxml.html.fragment_fromstring(fragment)
+        result = _extract(_iter_rows_lxml(table), _lxml_text, debug)
+    elif backend == 'bs4':
+        from bs4 import BeautifulSoup
+        table = BeautifulSoup(html, 'html.parser').select_one('table.data2_s')
+        if table is None:
+            return None
+        result = _extract(_iter_rows_bs4(table), _bs4_text, debug)
+    else:
+        raise ValueError(f"未対応のbackendです: {backend}")
+
+    result.diagnostics['parser'] = backend
+    return result
@@ -0,0 +1,175 @@
+"""ジュリア集合アニメーションのフレーム列を保持するLRUキャッシュ。
+
+キーはスライダーの値（イテレーション数・分離パラメータ）と描画サイズなどの組で、
+値は全フレームを重ねた uint8 の配列（フレーム数 × 高さ × 幅）。
+Streamlitが画像に変換するときと同じ丸め方で uint8 にしてあるので、表示結果は変わらない
+（float64のまま持つと1セット約490MB、uint8なら約61MB）。
+
+- メモリ上では合計バイト数が上限を超えたら、最も長く使われていないフレーム列から捨てる
+- cache_dirを指定すると、圧縮した .npz としてディスクにも保存し、プロセスを再起動しても使い回す
+  （ディスク側も合計バイト数の上限を超えたら、更新の古いファイルから削除する）
+
+エンコード済みのアニメーション（WebP / GIF）は publish_animation で static/animations/ に1つのファイルとして書き出し、
+Streamlitの静的ファイル配信（static_files.static_url）からブラウザが読み込む。同じキーなら書き出し済みのファイルを使う。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from static_files import STATIC_DIR
+
+# ディスクキャッシュの保存先（環境変数で変更可能、空文字ならディスクには保存しない）
+DEFAULT_CACHE_DIR = os.environ.get(
+    'JULIA_FRAME_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'julia_frames')
+) or None
+
+# メモリ上に置くフレーム列の合計サイズの上限（バイト）
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+# ディスク上に置く圧縮ファイルの合計サイズの上限（バイト）
+DEFAULT_MAX_DISK_BYTES = 2 * 1024 ** 3
+
+# エンコード済みのアニメーションの保存先（Streamlitが app/static/animations/ で配信する）と、その合計サイズの上限（バイト）
+ANIMATION_DIR = os.path.join(STATIC_DIR, 'animations')
+DEFAULT_MAX_ANIMATION_BYTES = 256 * 1024 ** 2
+
+
+def frame_key(**params):
+    """描画パラメータからキャッシュキーを作る関数（浮動小数点の値は誤差で別キーにならないよう丸める）"""
+    return tuple(sorted(
+        (name, round(float(value), 6) if isinstance(value, float) else value)
+        for name, value in params.items()
+    ))
+
+
+def prune_directory(directory, suffix, max_bytes):
+    """directory 内の suffix のファイルの合計サイズが上限を超えていたら、更新の古いファイルから削除する関数"""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(suffix) and '.tmp.' not in entry.name:
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def publish_animation(key, fmt, palette, encode, directory=ANIMATION_DIR, max_bytes=DEFAULT_MAX_ANIMATION_BYTES):
+    """アニメーションを静的ファイルとして書き出し、そのファイルのパスを返す関数。
+
+    encode はエンコード済みのバイト列を返す引数なしの関数で、同じキー・形式・配色のファイルがまだないときだけ呼ぶ。
+    ブラウザから読むURLは static_files.static_path_url / static_url で作る。
+    """
+    name = hashlib.sha1(repr((key, palette)).encode('utf-8')).hexdigest() + '.' + fmt
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        os.utime(path)  # 使ったファイルは削除の順番を後ろに回す
+    else:
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp.{fmt}'
+        with open(tmp_path, 'wb') as f:
+            f.write(encode())
+        os.replace(tmp_path, path)
+        prune_directory(directory, '.' + fmt, max_bytes)
+    return path
+
+
+def to_uint8(image):
+    """0〜1の画像をStreamlitの変換と同じ方法（255倍して切り捨て）で uint8 にする関数"""
+    return (np.clip(image, 0.0, 1.0) * 255).astype(np.uint8)
+
+
+class FrameCache:
+    """フレーム列のLRUキャッシュ（メモリ＋任意でディスク）。スレッドセーフ。"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, cache_dir=DEFAULT_CACHE_DIR, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._frames = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._frames)
+
+    def _disk_path(self, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{name}.npz')
+
+    def get(self, key):
+        """フレーム列（読み取り専用の uint8 配列）を返す。なければNone。"""
+        with self._lock:
+            frames = self._frames.get(key)
+            if frames is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frames
+
+        frames = self._load(key)
+        with self._lock:
+            if frames is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, frames)
+        return frames
+
+    def put(self, key, frames):
+        """フレーム列を登録する（ディスクキャッシュが有効ならディスクにも書く）"""
+        frames = np.ascontiguousarray(frames, dtype=np.uint8)
+        frames.setflags(write=False)
+        with self._lock:
+            self._store(key, frames)
+        self._save(key, frames)
+
+    def _store(self, key, frames):
+        """メモリ上に登録して上限を超えた分を捨てる（ロックを取った状態で呼ぶ）"""
+        if frames.nbytes > self.max_bytes:
+            return
+        previous = self._frames.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes
+        self._frames[key] = frames
+        self._bytes += frames.nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._frames.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with np.load(path) as data:
+                frames = data['frames']
+            os.utime(path)  # 使ったファイルは削除の順番を後ろに回す
+        except (OSError, KeyError, ValueError):
+            return None
+        frames.setflags(write=False)
+        return frames
+
+    def _save(self, key, frames):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._disk_path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp.npz'
+        np.savez_compressed(tmp_path, frames=frames)
+        os.replace(tmp_path, path)
+        prune_directory(self.cache_dir, '.npz', self.max_disk_bytes)
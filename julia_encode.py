@@ -0,0 +1,78 @@
+"""ジュリア集合アニメーションのフレームを画像ファイルに変換する出力段。
+
+フレームは uint8 の画像（反復回数の段階だけの少ない階調）なので、パレット付きPNG（モード P）に
+一度だけ変換して st.image に渡す。PNGのバイト列はStreamlit側でそのまま配信されるので、
+サーバー側でのfloat→画像の変換（従来はフレームごとにJPEGへ再圧縮）がなくなり、送信量も小さくなる。
+
+全フレームをまとめた1つのアニメーション画像（WebP / GIF）にもでき、その場合は一度送るだけで
+ブラウザ側で再生される（フレームごとの描画・送信が発生しない）。
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+# パレットの選択肢（gray は従来の見た目、それ以外はMatplotlibのカラーマップ名）
+PALETTES = ('gray', 'magma', 'viridis', 'twilight')
+
+# アニメーション画像の形式
+ANIMATION_FORMATS = {'webp': 'image/webp', 'gif': 'image/gif'}
+
+# アニメーション画像の1フレームの表示時間（ミリ秒）
+DEFAULT_FRAME_DURATION = 50
+
+
+def make_palette(name='gray'):
+    """256色のパレット（R, G, B を並べた768バイト）を作る関数"""
+    if name == 'gray':
+        levels = np.arange(256, dtype=np.uint8)
+        return np.repeat(levels, 3).tobytes()
+    import matplotlib
+    colors = matplotlib.colormaps[name](np.linspace(0.0, 1.0, 256))[:, :3]
+    return (colors * 255).round().astype(np.uint8).tobytes()
+
+
+class FrameEncoder:
+    """uint8 のフレームをパレット付きPNGのバイト列に変換する。画像と出力のバッファを使い回す。
+
+    1つのエンコーダーを複数のスレッドから同時に使わないこと。
+    """
+
+    def __init__(self, width, height, palette='gray', compress_level=6):
+        self.compress_level = compress_level
+        # PILの画像はこの配列とメモリを共有しているので、配列に書き込むだけで画像が変わる
+        self._pixels = np.zeros((height, width), dtype=np.uint8)
+        self._image = Image.frombuffer('P', (width, height), self._pixels, 'raw', 'P', 0, 1)
+        self._image.putpalette(make_palette(palette))
+        self._buffer = io.BytesIO()
+
+    def encode(self, frame):
+        """1フレームをPNGのバイト列にする"""
+        np.copyto(self._pixels, frame)
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._image.save(self._buffer, format='PNG', compress_level=self.compress_level)
+        return self._buffer.getvalue()
+
+
+def encode_animation(frames, fmt='webp', palette='gray', duration=DEFAULT_FRAME_DURATION):
+    """フレーム列（フレーム数 × 高さ × 幅の uint8）を1つのアニメーション画像のバイト列にする関数"""
+    if fmt not in ANIMATION_FORMATS:
+        raise ValueError(f"未対応の形式です: {fmt}")
+    palette_bytes = make_palette(palette)
+    images = []
+    for frame in frames:
+        height, width = frame.shape
+        image = Image.frombytes('P', (width, height), np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        image.putpalette(palette_bytes)
+        images.append(image)
+
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        # 可逆圧縮。method=0 が最も速い（階調が少ないので圧縮率への影響は小さい）
+        images[0].save(buffer, format='WEBP', save_all=True, append_images=images[1:], duration=duration,
+                       loop=0, lossless=True, method=0)
+    else:
+        images[0].save(buffer, format='GIF', save_all=True, append_images=images[1:], duration=duration,
+                       loop=0, optimize=False)
+    return buffer.getvalue()
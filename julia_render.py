@@ -0,0 +1,552 @@
+"""ジュリア集合のフレームを計算する描画カーネル。
+
+julia_counts はまだ発散していない点だけを詰めた配列（生き残っている点のインデックスと値）を持ち、
+点が発散するたびに配列を縮めながら反復する。
+- 反復ごとの全画素に対するマスク付きの取り出し・書き戻しや np.abs をしない
+- 複素数の更新と |z|^2 > 4 の判定は out= 付きのユーフンクで、確保済みのバッファに書き込む
+- 定数 c はスカラーのまま足す（画素数分の配列を作らない）
+
+julia_counts_reference は animation_demo.py の元の実装で、結果の確認と速度比較のために残している。
+
+フレームどうしは独立しているので、render_frames は各フレームをプロセスプールで並列に計算し、
+先読みの数を抑えながら順番どおりに返す（表示側は計算済みのフレームから順に流すだけでよい）。
+
+    python julia_render.py --iterations 10 --frames 10
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import deque
+from contextlib import closing, contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+import numpy as np
+
+from julia_cache import to_uint8
+
+# animation_demo.py の描画サイズ（幅, 高さ, 拡大率）
+WIDTH, HEIGHT, SCALE = 960, 640, 400
+
+# タイル分割で計算するときのタイルの一辺（画素）
+DEFAULT_TILE = 16
+
+# |c| <= 2 のとき、2回の反復で発散しない点の集まり（|f(f(z))| <= 2）は、どのひとかたまりも
+# f(f(z)) の零点を中心とする半径 1/26 の円を含む（|f(f(z))'| <= 51 より）。タイルの一辺がこの直径より
+# 短ければ、外周がすべて最初の反復で発散したタイルの内側に、発散の遅い島だけがあることはない
+ESCAPED_TILE_MAX_SIDE = 2 / 26
+
+# プログレッシブ表示で先に見せるプレビューの縮小率（縦横 1/4）
+PREVIEW_STEP = 4
+
+# 連続的な反復回数で階調をつけるときの発散半径（大きいほど階調がなめらか）と、帯1つの行数
+SMOOTH_BAILOUT = 16.0
+DEFAULT_BAND_ROWS = 64
+
+# 周期軌道に入ったとみなす距離（complex64で数十ulp程度）
+PERIOD_TOLERANCE = 1e-6
+PERIOD_CHECK_INTERVAL = 8
+
+# ワーカーの起動を待つ時間の上限（秒）
+WORKER_START_TIMEOUT = 60
+
+
+def _default_workers():
+    """環境変数 JULIA_RENDER_WORKERS のワーカー数。未設定・正しくない値ならCPUコア数。"""
+    try:
+        workers = int(os.environ.get('JULIA_RENDER_WORKERS', ''))
+    except ValueError:
+        workers = 0
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+# フレームを並列に計算するワーカープロセス数（環境変数で変更可能、既定はCPUコア数）
+DEFAULT_WORKERS = _default_workers()
+
+
+def grid(width=WIDTH, height=HEIGHT, scale=SCALE):
+    """複素平面上の実部（横）と虚部（縦）の座標を1次元配列で返す関数"""
+    x = np.linspace(-width / scale, width / scale, num=width)
+    y = np.linspace(-height / scale, height / scale, num=height)
+    return x, y
+
+
+def julia_counts_reference(x, y, c, iterations):
+    """元の実装による反復回数の配列（float64、高さ × 幅）を返す関数"""
+    n, m = len(y), len(x)
+    Z = np.tile(x.reshape((1, m)), (n, 1)) + 1j * np.tile(y.reshape((n, 1)), (1, m))
+    C = np.full((n, m), c)
+    M = np.full((n, m), True, dtype=bool)
+    N = np.zeros((n, m))
+
+    for i in range(iterations):
+        Z[M] = Z[M] * Z[M] + C[M]
+        M[np.abs(Z) > 2] = False
+        N[M] = i
+    return N
+
+
+def escape_counts(z, c, iterations):
+    """複素数の1次元配列 z の各点を生き残っている点だけ反復し、反復回数の整数配列を返す関数。
+
+    値は julia_counts_reference と同じく「発散していなかった最後の反復番号」
+    （最初の反復で発散した点は0）。z は書き換えるので、呼び出し側で不要になった配列を渡すこと。
+    """
+    size = len(z)
+    counts = np.zeros(size, dtype=np.uint8 if iterations <= 256 else np.uint16)
+
+    # 生き残っている点の元の位置と z の値（発散した点は反復ごとに取り除く）
+    active = np.arange(size)
+
+    # 反復中に使い回すバッファ（点が減ったら先頭から必要な長さだけ使う）
+    magnitude = np.empty(size)
+    imag_sq = np.empty(size)
+    bounded = np.empty(size, dtype=bool)
+
+    for i in range(iterations):
+        k = len(z)
+        if k == 0:
+            break
+        np.multiply(z, z, out=z)
+        np.add(z, c, out=z)
+
+        # |z| > 2 の代わりに |z|^2 > 4 で判定する（平方根を取らない）
+        np.multiply(z.real, z.real, out=magnitude[:k])
+        np.multiply(z.imag, z.imag, out=imag_sq[:k])
+        np.add(magnitude[:k], imag_sq[:k], out=magnitude[:k])
+        np.less_equal(magnitude[:k], 4.0, out=bounded[:k])
+
+        alive = bounded[:k]
+        if np.count_nonzero(alive) < k:
+            # この反復で発散した点は、1つ前の反復番号で確定する
+            counts[active[~alive]] = max(i - 1, 0)
+            active = active[alive]
+            z = z[alive]
+
+    counts[active] = iterations - 1
+    return counts
+
+
+def julia_counts(x, y, c, iterations):
+    """全画素の反復回数の整数配列（高さ × 幅）を返す関数"""
+    n, m = len(y), len(x)
+    z = (x.reshape((1, m)) + 1j * y.reshape((n, 1))).ravel()
+    return escape_counts(z, c, iterations).reshape((n, m))
+
+
+@lru_cache(maxsize=8)
+def _tile_layout(height, width, tile):
+    """タイル分割の配置を返す（画面サイズとタイルの大きさごとに一度だけ作る）。
+
+    外周の画素と内側の画素それぞれについて、(平坦化した位置, 行, 列, タイル番号) の配列と、タイル数を返す。
+    """
+    rows, cols = np.arange(height), np.arange(width)
+    row_edge = (rows % tile == 0) | (rows % tile == tile - 1) | (rows == height - 1)
+    col_edge = (cols % tile == 0) | (cols % tile == tile - 1) | (cols == width - 1)
+    n_tile_cols = (width - 1) // tile + 1
+    tile_id = ((rows // tile)[:, None] * n_tile_cols + (cols // tile)[None, :]).ravel()
+    border = (row_edge[:, None] | col_edge[None, :]).ravel()
+
+    def points(mask):
+        index = np.flatnonzero(mask)
+        return index, index // width, index % width, tile_id[index]
+
+    return points(border), points(~border), ((height - 1) // tile + 1) * n_tile_cols
+
+
+def julia_counts_tiled(x, y, c, iterations, tile=DEFAULT_TILE):
+    """画面をタイルに分け、内側が外周と同じ値になるとわかるタイルは内側を反復せずに塗りつぶす関数。
+
+    まず全タイルの外周の画素だけを計算し、次のどちらかのタイルだけ内側を省く（それ以外は内側も計算する）。
+    - 外周がすべて最後まで発散しなかったタイル: 発散しない点の集まりには穴がない（最大値の原理）ので、内側も発散しない
+    - 外周がすべて最初の反復で発散したタイル（|c| <= 2 で、タイルが ESCAPED_TILE_MAX_SIDE より小さいときだけ）
+    外周が途中の同じ反復回数で発散したタイルは、ジュリア集合が連結でないとき内側に島があり得るので省かない。
+    """
+    n, m = len(y), len(x)
+    border, interior, n_tiles = _tile_layout(n, m, tile)
+    counts = np.empty(n * m, dtype=np.uint8 if iterations <= 256 else np.uint16)
+
+    index, rows, cols, tiles = border
+    border_counts = escape_counts(x[cols] + 1j * y[rows], c, iterations)
+    counts[index] = border_counts
+
+    # タイルごとの外周の最小値と最大値が同じなら一様
+    low = np.full(n_tiles, np.iinfo(counts.dtype).max, dtype=counts.dtype)
+    high = np.zeros(n_tiles, dtype=counts.dtype)
+    np.minimum.at(low, tiles, border_counts)
+    np.maximum.at(high, tiles, border_counts)
+
+    # 外周が一様で、内側も同じ値になるとわかるタイルだけ省く
+    skip = (low == high) & (high == iterations - 1)
+    side = tile * max(abs(x[-1] - x[0]) / max(m - 1, 1), abs(y[-1] - y[0]) / max(n - 1, 1))
+    if abs(c) <= 2 and side < ESCAPED_TILE_MAX_SIDE:
+        skip |= high == 0
+
+    # 内側はいったん外周の値で塗り、省けないタイルの画素だけ計算し直す
+    index, rows, cols, tiles = interior
+    counts[index] = low[tiles]
+    needed = ~skip[tiles]
+    counts[index[needed]] = escape_counts(x[cols[needed]] + 1j * y[rows[needed]], c, iterations)
+    return counts.reshape((n, m))
+
+
+def frame_image(counts):
+    """反復回数の配列を表示用の uint8 画像（発散しにくい点ほど暗い）にする関数"""
+    return to_uint8(1.0 - (counts / counts.max()))
+
+
+def _smooth_band(z, c, iterations, out):
+    """1つの帯（複素数の1次元配列）の連続的な反復回数を out（float32）に書き込む。最後まで発散しなかった点はinf。
+
+    2のべき乗回ごとに z を控えておき、控えた値に戻ってきた点（吸引的な周期軌道に入った点）は
+    発散しないとみなして反復をやめる（上限が大きいとき、集合の内側の点の反復がほとんど省ける）。
+    比較は PERIOD_CHECK_INTERVAL 回に1回だけ行う（周期 p の軌道は間隔の p 倍の時点で必ず見つかる）。
+    """
+    size = len(z)
+    out[:] = np.inf
+    active = np.arange(size)
+    magnitude = np.empty(size, dtype=np.float32)
+    imag_sq = np.empty(size, dtype=np.float32)
+    bounded = np.empty(size, dtype=bool)
+    diff = np.empty(size, dtype=np.complex64)
+    saved = z.copy()
+    save_at = 1
+
+    for i in range(iterations):
+        k = len(z)
+        if k == 0:
+            break
+        np.multiply(z, z, out=z)
+        np.add(z, c, out=z)
+        np.multiply(z.real, z.real, out=magnitude[:k])
+        np.multiply(z.imag, z.imag, out=imag_sq[:k])
+        np.add(magnitude[:k], imag_sq[:k], out=magnitude[:k])
+        np.less_equal(magnitude[:k], SMOOTH_BAILOUT ** 2, out=bounded[:k])
+
+        alive = bounded[:k]
+        if np.count_nonzero(alive) < k:
+            escaped = ~alive
+            # 連続的な反復回数 ν = i + 1 - log2(log|z|)
+            log_modulus = 0.5 * np.log(magnitude[:k][escaped])
+            out[active[escaped]] = np.maximum(i + 1 - np.log2(log_modulus), 0.0)
+            active = active[alive]
+            z = z[alive]
+            saved = saved[alive]
+            k = len(z)
+
+        if i + 1 == save_at:
+            saved[:] = z
+            save_at *= 2
+            continue
+        if (i + 1) % PERIOD_CHECK_INTERVAL:
+            continue
+        np.subtract(z, saved, out=diff[:k])
+        np.multiply(diff[:k].real, diff[:k].real, out=magnitude[:k])
+        np.multiply(diff[:k].imag, diff[:k].imag, out=imag_sq[:k])
+        np.add(magnitude[:k], imag_sq[:k], out=magnitude[:k])
+        np.greater_equal(magnitude[:k], PERIOD_TOLERANCE ** 2, out=bounded[:k])
+        moving = bounded[:k]
+        if np.count_nonzero(moving) < k:
+            active = active[moving]
+            z = z[moving]
+            saved = saved[moving]
+
+
+def smooth_counts(x, y, c, iterations, band_rows=DEFAULT_BAND_ROWS):
+    """反復回数の上限が大きい場合向けに、正規化した連続的な反復回数（float32、高さ × 幅、0〜1）を返す関数。
+
+    計算はcomplex64で、band_rows 行ずつの帯に分けて行う。作業用の配列は帯の大きさで済むので、
+    使用メモリは出力（float32）と1つの帯の分だけになり、反復回数の上限を増やしても増えない。
+    値はフレーム内で発散した点の最大値に対する log(1 + ν) の比で、最後まで発散しなかった点は1。
+    """
+    n, m = len(y), len(x)
+    values = np.empty((n, m), dtype=np.float32)
+    xs = x.astype(np.float32).reshape((1, m))
+    c = np.complex64(c)
+    for start in range(0, n, band_rows):
+        ys = y[start:start + band_rows].astype(np.float32).reshape((-1, 1))
+        band = (xs + np.complex64(1j) * ys).ravel()
+        _smooth_band(band, c, iterations, values[start:start + len(ys)].reshape(-1))
+
+    # 上限を大きくしても境界付近の階調がつぶれないよう、対数をとってフレームごとに正規化する
+    bounded = np.isinf(values)
+    np.log1p(values, out=values)
+    peak = values[~bounded].max(initial=0.0)
+    if peak > 0:
+        values /= peak
+    values[bounded] = 1.0
+    return values
+
+
+def render_frame(x, y, c, iterations, tiled=False, step=1, deep=False):
+    """1フレーム分の画像を計算する関数。
+
+    tiledがTrueならタイル単位で、内側が外周と同じ値になる部分を省略して計算する（結果は変わらない）。
+    stepが2以上なら縦横 1/step の解像度で計算し、元の大きさに引き伸ばす（プレビュー用）。
+    deepがTrueなら反復回数の上限が大きい場合向けに、帯ごとに連続的な反復回数で階調をつける。
+    """
+    n, m = len(y), len(x)
+    xs, ys = x[::step], y[::step]
+    if deep:
+        image = to_uint8(1.0 - smooth_counts(xs, ys, c, iterations))
+    elif tiled and step == 1:
+        image = frame_image(julia_counts_tiled(x, y, c, iterations))
+    else:
+        image = frame_image(julia_counts(xs, ys, c, iterations))
+    if step > 1:
+        image = np.repeat(np.repeat(image, step, axis=0), step, axis=1)[:n, :m]
+    return image
+
+
+@lru_cache(maxsize=4)
+def _cached_grid(width, height, scale):
+    return grid(width, height, scale)
+
+
+def _render_worker(c, iterations, width, height, scale, tiled, deep):
+    """ワーカープロセスで1フレームを計算する（座標はプロセスごとに一度だけ作る）"""
+    x, y = _cached_grid(width, height, scale)
+    return render_frame(x, y, c, iterations, tiled=tiled, deep=deep)
+
+
+# ワーカーを起動する間だけ __main__ として見せる空のモジュール（ファイルがないので子プロセスは何も実行しない）
+_WORKER_MAIN = types.ModuleType('__main__')
+
+
+@contextmanager
+def _main_script_hidden():
+    """ワーカーの起動中、__main__ を空のモジュールに差し替える。
+
+    Streamlitは実行中のページを __main__（__file__ 付き）として登録するので、そのままforkserver/spawnで
+    起動するとワーカーがページ全体を再実行してしまう。ワーカーの関数はこのモジュールにあるので、
+    子プロセスは julia_render を読み込むだけでよい（このファイルを直接実行したときは差し替えない）。
+    差し替えはプールを作るとき（_start_pool）に、全ワーカーを起動する間だけ行う。
+    """
+    main = sys.modules.get('__main__')
+    hide = _render_worker.__module__ != '__main__' and getattr(main, '__file__', None) is not None
+    if hide:
+        sys.modules['__main__'] = _WORKER_MAIN
+    try:
+        yield
+    finally:
+        # 起動中に別のスレッドが __main__ を入れ替えていたら、そちらを残す
+        if hide and sys.modules.get('__main__') is _WORKER_MAIN:
+            sys.modules['__main__'] = main
+
+
+def _mp_context():
+    """ワーカーの起動方法（forkserverが使えればforkserver、なければspawn）のコンテキストを返す関数。
+
+    Streamlitのサーバーは多数のスレッドを動かしているので、forkで複製すると他のスレッドが持っていたロックで
+    子プロセスが止まることがある。forkserver/spawnなら、子プロセスはこのモジュールだけを読み込んで始まる。
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _wait_for_workers(barrier):
+    """ワーカーの初期化関数。全ワーカーが起動するまで待つ。"""
+    barrier.wait(WORKER_START_TIMEOUT)
+
+
+def _start_pool(max_workers):
+    """プロセスプールを作り、全ワーカーをこの場で起動してから返す関数。
+
+    forkserver/spawnのプールはタスクを投入したときに必要な分だけワーカーを起動するので、そのままだと
+    後の描画中にも __main__ の差し替えが必要になる。全ワーカーが初期化関数で待っている間は空きの
+    ワーカーがないため、max_workers 個のタスクを投入すると投入ごとに1つずつ起動され、以降は起動しない。
+    """
+    context = _mp_context()
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_wait_for_workers,
+                               initargs=(context.Barrier(max_workers),))
+    with _main_script_hidden():
+        started = [pool.submit(os.getpid) for _ in range(max_workers)]
+    try:
+        for future in started:
+            future.result()
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    return pool
+
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool(max_workers=DEFAULT_WORKERS):
+    """フレーム計算用の共有プロセスプールを返す関数。
+
+    ワーカーはforkserver（なければspawn）で起動する（_mp_context）。プールはプロセス内で1つだけ、
+    このロックの中で作り、全ワーカーの起動もそこで済ませる（_start_pool）。
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = _start_pool(max_workers)
+            _pool_workers = max_workers
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _ordered_futures(pool, cs, args, lookahead):
+    """cs の各フレームをプールに投入し、(c, future) をフレーム順に返すジェネレーター。
+
+    投入済みで未表示のフレームは lookahead 枚までに抑え、1枚取り出すたびに次のフレームを投入する
+    （表示中もワーカーを休ませない）。途中で閉じられたら未着手のフレームを取り消す。
+    """
+    remaining = iter(cs)
+    pending = deque((c, pool.submit(_render_worker, c, *args)) for c in itertools.islice(remaining, lookahead))
+    try:
+        while pending:
+            item = pending.popleft()
+            for c in itertools.islice(remaining, 1):
+                pending.append((c, pool.submit(_render_worker, c, *args)))
+            yield item
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def render_frames(cs, iterations, width=WIDTH, height=HEIGHT, scale=SCALE, tiled=False, deep=False,
+                  max_workers=DEFAULT_WORKERS, lookahead=None):
+    """cs（各フレームの定数c）のフレームを並列に計算し、順番どおりに返すジェネレーター。
+
+    計算中・計算済みで未表示のフレームは lookahead 枚（既定はワーカー数の2倍）程度までに抑え、
+    表示が追いつかなくてもフレームが溜まり続けないようにする。
+    途中で閉じられた（Streamlitの再実行で止まった）場合は、未着手のフレームを取り消す。
+    max_workers が1以下なら、このプロセスで順に計算する。
+    """
+    for frame, _ in _render_frames(cs, iterations, width, height, scale, tiled, deep, max_workers, lookahead, None):
+        yield frame
+
+
+def render_frames_progressive(cs, iterations, width=WIDTH, height=HEIGHT, scale=SCALE, tiled=False, deep=False,
+                              max_workers=DEFAULT_WORKERS, lookahead=None, preview_step=PREVIEW_STEP):
+    """render_frames と同じ順にフレームを返すが、完成版が間に合っていないフレームは先に
+    縦横 1/preview_step の解像度のプレビューを返すジェネレーター。
+
+    返す値は (画像, 完成版か)。プレビューはこのプロセスで計算する（画素数が少ないのですぐ終わる）。
+    preview_step にNoneを渡すとプレビューは返さない。
+    """
+    return _render_frames(cs, iterations, width, height, scale, tiled, deep, max_workers, lookahead, preview_step)
+
+
+def _render_frames(cs, iterations, width, height, scale, tiled, deep, max_workers, lookahead, preview_step):
+    x, y = _cached_grid(width, height, scale)
+    if max_workers <= 1:
+        for c in cs:
+            if preview_step:
+                yield render_frame(x, y, c, iterations, step=preview_step, deep=deep), False
+            yield render_frame(x, y, c, iterations, tiled=tiled, deep=deep), True
+        return
+
+    pool = get_process_pool(max_workers)
+    args = (iterations, width, height, scale, tiled, deep)
+    try:
+        with closing(_ordered_futures(pool, cs, args, lookahead or 2 * max_workers)) as futures:
+            for c, future in futures:
+                if preview_step and not future.done():
+                    yield render_frame(x, y, c, iterations, step=preview_step, deep=deep), False
+                yield future.result(), True
+    except BrokenProcessPool:
+        # ワーカーが異常終了したプールは次回作り直す
+        _discard_pool(pool)
+        raise
+
+
+def _benchmark(kernel, x, y, cs, iterations):
+    """各フレームの計算時間（秒）を返す"""
+    times = []
+    for c in cs:
+        start = time.perf_counter()
+        kernel(x, y, c, iterations)
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ジュリア集合の描画カーネルを元の実装と比較します。')
+    parser.add_argument('--iterations', type=int, default=10, help='反復回数（既定: 10）')
+    parser.add_argument('--separation', type=float, default=0.7885, help='分離パラメータ（既定: 0.7885）')
+    parser.add_argument('--frames', type=int, default=10, help='計測するフレーム数（既定: 10）')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'並列描画のワーカー数（既定: CPUコア数 = {DEFAULT_WORKERS}）')
+    parser.add_argument('--deep-iterations', type=int, nargs='+', default=[100, 1000],
+                        help='反復回数の上限を増やした場合の計測に使う上限（既定: 100 1000）')
+    args = parser.parse_args(argv)
+
+    x, y = grid()
+    cs = args.separation * np.exp(1j * np.linspace(0.0, 4 * np.pi, args.frames))
+
+    # 結果が元の実装と同じ画像になることを確認する
+    mismatches = sum(
+        np.count_nonzero(frame_image(julia_counts(x, y, c, args.iterations))
+                         != to_uint8(1.0 - (n / n.max())))
+        for c in cs for n in [julia_counts_reference(x, y, c, args.iterations)]
+    )
+
+    tiled_mismatches = sum(
+        np.count_nonzero(julia_counts_tiled(x, y, c, args.iterations) != julia_counts(x, y, c, args.iterations))
+        for c in cs
+    )
+
+    reference = _benchmark(julia_counts_reference, x, y, cs, args.iterations)
+    compacted = _benchmark(julia_counts, x, y, cs, args.iterations)
+    tiled = _benchmark(julia_counts_tiled, x, y, cs, args.iterations)
+    preview = _benchmark(lambda x, y, c, iterations: julia_counts(x[::PREVIEW_STEP], y[::PREVIEW_STEP], c, iterations),
+                         x, y, cs, args.iterations)
+    print(f'{WIDTH}x{HEIGHT}, 反復 {args.iterations} 回, {args.frames} フレーム（1フレームあたりの中央値）')
+    print(f'  元の実装:       {np.median(reference) * 1000:8.1f} ms')
+    print(f'  点を詰める実装: {np.median(compacted) * 1000:8.1f} ms  ({np.median(reference) / np.median(compacted):.1f}倍)')
+    print(f'  タイル分割:     {np.median(tiled) * 1000:8.1f} ms  ({np.median(reference) / np.median(tiled):.1f}倍)')
+    print(f'  プレビュー(1/{PREVIEW_STEP}): {np.median(preview) * 1000:6.1f} ms')
+    print(f'  画像の不一致画素数: {mismatches}（タイル分割と点を詰める実装の差: {tiled_mismatches}）')
+
+    # 反復回数の上限を増やしたときの時間とピークメモリ（NumPyの確保量）
+    print('反復回数の上限を増やした場合（1フレーム目、ピークメモリはtracemallocで計測）')
+    for limit in args.deep_iterations:
+        for label, kernel in (('全画素 complex128', julia_counts), ('帯ごと complex64', smooth_counts)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            kernel(x, y, cs[0], limit)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'  上限 {limit:5d} 回, {label}: {elapsed * 1000:8.1f} ms, ピーク {peak / 1024 ** 2:6.1f} MB')
+
+    # 全フレームを順に計算した場合と、プロセスプールで並列に計算した場合の所要時間
+    start = time.perf_counter()
+    for _ in render_frames(cs, args.iterations, max_workers=1):
+        pass
+    sequential = time.perf_counter() - start
+    # ワーカーの起動時間は含めない
+    list(render_frames(cs[:args.workers], args.iterations, max_workers=args.workers))
+    start = time.perf_counter()
+    for _ in render_frames(cs, args.iterations, max_workers=args.workers):
+        pass
+    parallel = time.perf_counter() - start
+    print(f'{args.frames} フレーム全体: 順に計算 {sequential:.2f} 秒, '
+          f'{args.workers} プロセスで並列 {parallel:.2f} 秒 ({sequential / parallel:.1f}倍)')
+
+
+if __name__ == '__main__':
+    main()
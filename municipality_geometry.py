@@ -0,0 +1,243 @@
+"""市区町村の境界データを詳細度ごとに簡略化し、格子状のチャンクに分けて保存・読み込みする処理。
+
+元データは国土数値情報の行政区域データ（N03、GeoJSON）。全国分は数百MBあるので、ダウンロードはせず
+手元のファイルから作る。市区町村コード（N03_007）ごとに1つの地物にまとめ、都道府県と同じく隣との
+境界線を共有したまま簡略化する。簡略化した地物は、詳細度ごとの大きさの格子のマス目に分けて保存する。
+マス目と地物の対応は geopandas の空間インデックス（STRtree）で作成時に一度だけ求める。
+
+ブラウザは地図に表示している範囲のマス目のファイルだけを読み込み（拡大率に合った詳細度を使う）、
+静的ファイル配信が無効なときは、サーバーが選んだ都道府県の範囲のマス目を読んで地図に埋め込む。
+
+    python municipality_geometry.py --source N03-20240101.geojson
+
+出力の構成（GEOMETRY_VERSION を上げると別のディレクトリに作り直す）:
+
+    static/municipalities/v1/manifest.json        詳細度ごとの設定・マス目の一覧・都道府県ごとの範囲
+    static/municipalities/v1/municipalities.csv   市区町村の一覧（code, name, pref_code, area）
+    static/municipalities/v1/low/69_17.geojson    詳細度 low のマス目（経度・緯度をマス目の大きさで割った番号）
+
+各地物の属性は id（5桁の市区町村コード）、name（市区町村名）、pref（2桁の都道府県コード）だけにする。
+geopandas と shapely は作成するときだけ読み込む（ダッシュボードが作成済みのファイルを読むだけなら読み込まない）。
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from functools import lru_cache
+
+import pandas as pd
+
+from static_files import STATIC_DIR, static_path_url
+
+# 境界データの保存先（環境変数で変更可能）
+DEFAULT_GEOMETRY_PATH = os.environ.get('MUNICIPALITY_GEOMETRY_PATH', os.path.join(STATIC_DIR, 'municipalities'))
+
+# 簡略化の方法や属性、マス目の分け方を変えたら上げる（古いファイルは読まれなくなる）
+GEOMETRY_VERSION = 1
+
+# 詳細度ごとの設定（max_zoom: この拡大率まで使う, tolerance: 簡略化の許容誤差[度], decimals: 座標の小数桁数,
+# cell: マス目の大きさ[度]）。詳細なほどマス目を小さくして、1画面で読み込む量をそろえる
+LEVELS = {
+    'low': {'max_zoom': 8, 'tolerance': 0.002, 'decimals': 4, 'cell': 2.0},
+    'medium': {'max_zoom': 10, 'tolerance': 0.0005, 'decimals': 4, 'cell': 0.5},
+    'full': {'max_zoom': None, 'tolerance': 0.0, 'decimals': 5, 'cell': 0.25},
+}
+
+# 面積の計算に使う正積図法（EASE-Grid 2.0）
+AREA_CRS = 'EPSG:6933'
+
+
+def version_dir(root=DEFAULT_GEOMETRY_PATH):
+    return os.path.join(root, f'v{GEOMETRY_VERSION}')
+
+
+def chunk_path(level, key, root=DEFAULT_GEOMETRY_PATH):
+    return os.path.join(version_dir(root), level, f'{key}.geojson')
+
+
+def chunk_url(root=DEFAULT_GEOMETRY_PATH):
+    """マス目のファイルを静的ファイル配信で読むときのURLの先頭（app/static/...）を返す関数。
+
+    保存先が static/ の下になければNoneを返す。
+    """
+    return static_path_url(version_dir(root))
+
+
+def choose_level(zoom):
+    """地図の拡大率に合った詳細度の名前を返す関数"""
+    for name, settings in LEVELS.items():
+        if settings['max_zoom'] is None or zoom is None or zoom <= settings['max_zoom']:
+            return name
+    return name
+
+
+def cell_keys(bounds, cell):
+    """範囲 (西, 南, 東, 北) にかかるマス目の番号（"経度方向_緯度方向"）を返す関数"""
+    west, south, east, north = bounds
+    return [f'{ix}_{iy}'
+            for ix in range(math.floor(west / cell), math.floor(east / cell) + 1)
+            for iy in range(math.floor(south / cell), math.floor(north / cell) + 1)]
+
+
+def _municipality_name(row):
+    """政令指定都市の区は「市名＋区名」、それ以外は市区町村名にする（郡名は付けない）"""
+    parts = [row.get('N03_004'), row.get('N03_005')]
+    city = row.get('N03_003')
+    if isinstance(city, str) and city.endswith('市'):
+        parts.insert(0, city)
+    return ''.join(part for part in parts if isinstance(part, str))
+
+
+def read_source(source_path):
+    """N03のGeoJSONを市区町村ごとに1つにまとめた GeoDataFrame（code, name, pref_code, geometry）を返す関数"""
+    import geopandas as gpd
+    import shapely
+
+    source = gpd.read_file(source_path)
+    # 所属未定地など、市区町村コードのない地物は使わない
+    source = source[source['N03_007'].notna()].copy()
+    source['code'] = source['N03_007'].astype(str).str.zfill(5)
+    source['name'] = [_municipality_name(row) for row in source.to_dict('records')]
+    municipalities = source[['code', 'name', 'geometry']].dissolve(by='code', aggfunc='first').reset_index()
+    municipalities['pref_code'] = municipalities['code'].str[:2]
+    municipalities['geometry'] = shapely.make_valid(municipalities.geometry.to_numpy())
+    return municipalities.set_crs(source.crs or 'EPSG:4326', allow_override=True).to_crs('EPSG:4326')
+
+
+def build_levels(source_path, root=DEFAULT_GEOMETRY_PATH):
+    """元データから詳細度ごとのマス目のファイルと、市区町村の一覧・manifest.json を作る関数。manifestの内容を返す。"""
+    import geopandas as gpd
+    import shapely
+    from shapely.geometry import box, mapping
+
+    municipalities = read_source(source_path)
+    out_dir = version_dir(root)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 市区町村の一覧（面積は正積図法で測る）
+    table = municipalities[['code', 'name', 'pref_code']].copy()
+    table['area'] = (municipalities.to_crs(AREA_CRS).area / 1e6).round(2)
+    table.to_csv(os.path.join(out_dir, 'municipalities.csv'), index=False)
+
+    prefecture_bounds = municipalities.dissolve(by='pref_code').bounds.round(4)
+    manifest = {
+        'version': GEOMETRY_VERSION,
+        'source': os.path.basename(source_path),
+        'municipalities': len(municipalities),
+        'prefecture_bounds': {code: list(row) for code, row in zip(prefecture_bounds.index, prefecture_bounds.values)},
+        'levels': {},
+    }
+    geometries = municipalities.geometry.to_numpy()
+    for name, settings in LEVELS.items():
+        simplified = geometries
+        if settings['tolerance'] > 0:
+            # 境界線を隣の市区町村と共有したまま簡略化する（すき間や重なりができない）
+            simplified = shapely.coverage_simplify(geometries, settings['tolerance'])
+        simplified = shapely.set_precision(simplified, 10.0 ** -settings['decimals'])
+        frame = gpd.GeoDataFrame(municipalities[['code', 'name', 'pref_code']], geometry=simplified, crs='EPSG:4326')
+
+        # 地物がかかりうるマス目だけを調べ、空間インデックスでマス目ごとの地物を選ぶ
+        keys = set()
+        for bounds in frame.bounds.to_numpy():
+            keys.update(cell_keys(bounds, settings['cell']))
+        level_dir = os.path.join(out_dir, name)
+        os.makedirs(level_dir, exist_ok=True)
+        chunks, total_bytes = [], 0
+        for key in sorted(keys):
+            ix, iy = (int(part) for part in key.split('_'))
+            cell = settings['cell']
+            indices = frame.sindex.query(box(ix * cell, iy * cell, (ix + 1) * cell, (iy + 1) * cell),
+                                         predicate='intersects')
+            if len(indices) == 0:
+                continue
+            rows = frame.iloc[sorted(indices)]
+            collection = {
+                'type': 'FeatureCollection',
+                'features': [{'type': 'Feature',
+                              'properties': {'id': code, 'name': label, 'pref': pref_code},
+                              'geometry': mapping(geometry)}
+                             for code, label, pref_code, geometry
+                             in zip(rows['code'], rows['name'], rows['pref_code'], rows.geometry)],
+            }
+            path = chunk_path(name, key, root)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(collection, f, ensure_ascii=False, separators=(',', ':'))
+            chunks.append(key)
+            total_bytes += os.path.getsize(path)
+        manifest['levels'][name] = {
+            **settings,
+            'chunks': chunks,
+            'bytes': total_bytes,
+            'vertices': int(shapely.get_num_coordinates(simplified).sum()),
+        }
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    return manifest
+
+
+def available(root=DEFAULT_GEOMETRY_PATH):
+    """市区町村の境界データが作成済みかどうかを返す関数"""
+    return os.path.exists(os.path.join(version_dir(root), 'manifest.json'))
+
+
+@lru_cache(maxsize=None)
+def load_manifest(root=DEFAULT_GEOMETRY_PATH):
+    """manifest.json を読み込む関数。返す辞書は共有されるので、書き換えないこと。"""
+    with open(os.path.join(version_dir(root), 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def load_municipalities(root=DEFAULT_GEOMETRY_PATH):
+    """市区町村の一覧（code, name, pref_code, area、市区町村コード順）を読み込む関数"""
+    return pd.read_csv(os.path.join(version_dir(root), 'municipalities.csv'),
+                       dtype={'code': str, 'pref_code': str})
+
+
+@lru_cache(maxsize=256)
+def load_chunk(level, key, root=DEFAULT_GEOMETRY_PATH):
+    """マス目1つ分のGeoJSONを読み込む関数。返す辞書は共有されるので、書き換えないこと。"""
+    with open(chunk_path(level, key, root), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_features(level, bounds, pref_code=None, root=DEFAULT_GEOMETRY_PATH):
+    """範囲 (西, 南, 東, 北) にかかるマス目の地物を集めたGeoJSONを返す関数。
+
+    pref_code を渡すとその都道府県の市区町村だけにする。複数のマス目にかかる地物は1回だけ入れる。
+    """
+    settings = load_manifest(root)['levels'][level]
+    stored = set(settings['chunks'])
+    features, seen = [], set()
+    for key in cell_keys(bounds, settings['cell']):
+        if key not in stored:
+            continue
+        for feature in load_chunk(level, key, root)['features']:
+            props = feature['properties']
+            if props['id'] in seen or (pref_code is not None and props['pref'] != pref_code):
+                continue
+            seen.add(props['id'])
+            features.append(feature)
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='市区町村の境界データを詳細度ごとに簡略化し、マス目に分けて保存します。')
+    parser.add_argument('--source', required=True, help='国土数値情報の行政区域データ（N03）のGeoJSONファイル')
+    parser.add_argument('--root', default=DEFAULT_GEOMETRY_PATH, help=f'保存先（既定: {DEFAULT_GEOMETRY_PATH}）')
+    args = parser.parse_args(argv)
+
+    manifest = build_levels(args.source, args.root)
+    print(f"市区町村: {manifest['municipalities']:,d}")
+    for name, info in manifest['levels'].items():
+        print(f"  {name:<7} {info['bytes'] / 1024:8.0f} KB, {info['vertices']:8,d} 頂点, "
+              f"マス目 {len(info['chunks']):4d} 個（{info['cell']}度）")
+    print(f'保存先: {version_dir(args.root)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""人口データのグラフ（Matplotlib）。
+
+pyplotを使わずに Figure を作って返す。画像にするのは figure_render.FigureRenderer（同じデータなら描き直さない）。
+"""
+import matplotlib
+import numpy as np
+from matplotlib.figure import Figure
+
+# 英語表記に切り替えるためのコード追加
+matplotlib.rcParams['font.family'] = 'DejaVu Sans'
+
+
+def plot_region_population(region_data):
+    """地域別の年齢層別人口の棒グラフを作る関数。region_data は PopulationCube.regions の戻り値。"""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    x = np.arange(len(region_data))
+    width = 0.25
+
+    ax.bar(x - width, region_data['population_0_14'] / 10000, width, label='0-14 y.o.')
+    ax.bar(x, region_data['population_15_64'] / 10000, width, label='15-64 y.o.')
+    ax.bar(x + width, region_data['population_65plus'] / 10000, width, label='65+ y.o.')
+
+    ax.set_ylabel('Population (10,000 people)')
+    ax.set_title('Population Distribution by Region')
+    ax.set_xticks(x)
+    ax.set_xticklabels(region_data['region_en'])  # 英語の地域名を使用
+    ax.legend()
+    return fig
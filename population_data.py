@@ -0,0 +1,256 @@
+"""都道府県別の人口データを作るデータ層（Streamlitに依存しない）。
+
+都道府県マスタ（名前・面積・地域）と、年ごとの人口データ（現在はサンプルデータ）を扱う。
+市区町村別の人口は、都道府県の人数を市区町村に配分したサンプルデータ（sample_municipality_frame）を使う。
+全年・全指標のデータは PopulationCube に一度だけまとめ、画面の各表示（年ごとの表・上位N件・地域別集計）は
+作成時に計算済みのものを取り出すだけにする。
+"""
+import random
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# 地域名を英語に変更するマッピング
+REGION_NAMES_EN = {
+    '北海道': 'Hokkaido',
+    '東北': 'Tohoku',
+    '関東': 'Kanto',
+    '中部': 'Chubu',
+    '近畿': 'Kinki',
+    '中国': 'Chugoku',
+    '四国': 'Shikoku',
+    '九州': 'Kyushu',
+    '沖縄': 'Okinawa'
+}
+
+# 都道府県コードとその基本情報
+PREFECTURES = {
+    '01': {'name': '北海道', 'area': 83424, 'region': '北海道'},
+    '02': {'name': '青森県', 'area': 9646, 'region': '東北'},
+    '03': {'name': '岩手県', 'area': 15275, 'region': '東北'},
+    '04': {'name': '宮城県', 'area': 7282, 'region': '東北'},
+    '05': {'name': '秋田県', 'area': 11638, 'region': '東北'},
+    '06': {'name': '山形県', 'area': 9323, 'region': '東北'},
+    '07': {'name': '福島県', 'area': 13784, 'region': '東北'},
+    '08': {'name': '茨城県', 'area': 6097, 'region': '関東'},
+    '09': {'name': '栃木県', 'area': 6408, 'region': '関東'},
+    '10': {'name': '群馬県', 'area': 6362, 'region': '関東'},
+    '11': {'name': '埼玉県', 'area': 3798, 'region': '関東'},
+    '12': {'name': '千葉県', 'area': 5157, 'region': '関東'},
+    '13': {'name': '東京都', 'area': 2194, 'region': '関東'},
+    '14': {'name': '神奈川県', 'area': 2416, 'region': '関東'},
+    '15': {'name': '新潟県', 'area': 12584, 'region': '中部'},
+    '16': {'name': '富山県', 'area': 4248, 'region': '中部'},
+    '17': {'name': '石川県', 'area': 4186, 'region': '中部'},
+    '18': {'name': '福井県', 'area': 4190, 'region': '中部'},
+    '19': {'name': '山梨県', 'area': 4465, 'region': '中部'},
+    '20': {'name': '長野県', 'area': 13562, 'region': '中部'},
+    '21': {'name': '岐阜県', 'area': 10621, 'region': '中部'},
+    '22': {'name': '静岡県', 'area': 7777, 'region': '中部'},
+    '23': {'name': '愛知県', 'area': 5172, 'region': '中部'},
+    '24': {'name': '三重県', 'area': 5774, 'region': '近畿'},
+    '25': {'name': '滋賀県', 'area': 4017, 'region': '近畿'},
+    '26': {'name': '京都府', 'area': 4612, 'region': '近畿'},
+    '27': {'name': '大阪府', 'area': 1905, 'region': '近畿'},
+    '28': {'name': '兵庫県', 'area': 8401, 'region': '近畿'},
+    '29': {'name': '奈良県', 'area': 3691, 'region': '近畿'},
+    '30': {'name': '和歌山県', 'area': 4725, 'region': '近畿'},
+    '31': {'name': '鳥取県', 'area': 3507, 'region': '中国'},
+    '32': {'name': '島根県', 'area': 6708, 'region': '中国'},
+    '33': {'name': '岡山県', 'area': 7114, 'region': '中国'},
+    '34': {'name': '広島県', 'area': 8479, 'region': '中国'},
+    '35': {'name': '山口県', 'area': 6112, 'region': '中国'},
+    '36': {'name': '徳島県', 'area': 4147, 'region': '四国'},
+    '37': {'name': '香川県', 'area': 1876, 'region': '四国'},
+    '38': {'name': '愛媛県', 'area': 5676, 'region': '四国'},
+    '39': {'name': '高知県', 'area': 7104, 'region': '四国'},
+    '40': {'name': '福岡県', 'area': 4986, 'region': '九州'},
+    '41': {'name': '佐賀県', 'area': 2441, 'region': '九州'},
+    '42': {'name': '長崎県', 'area': 4130, 'region': '九州'},
+    '43': {'name': '熊本県', 'area': 7409, 'region': '九州'},
+    '44': {'name': '大分県', 'area': 6341, 'region': '九州'},
+    '45': {'name': '宮崎県', 'area': 7735, 'region': '九州'},
+    '46': {'name': '鹿児島県', 'area': 9187, 'region': '九州'},
+    '47': {'name': '沖縄県', 'area': 2281, 'region': '沖縄'},
+}
+
+# サンプルデータを用意している年
+YEARS = list(range(2015, 2022))
+
+# 人数の指標（年齢層の3つを足すと総人口）
+COUNT_COLUMNS = ['total_population', 'population_0_14', 'population_15_64', 'population_65plus']
+AGE_COLUMNS = COUNT_COLUMNS[1:]
+
+# サンプルデータで実際の比率に近い値を直接与えている都道府県（総人口, 0-14歳, 15-64歳, 65歳以上）
+SAMPLE_FIXED = {
+    '01': (5250000, 550000, 3100000, 1600000),  # 北海道
+    '13': (14000000, 1600000, 9000000, 3400000),  # 東京
+    '23': (7550000, 1050000, 4800000, 1700000),  # 愛知
+    '27': (8800000, 1150000, 5500000, 2150000),  # 大阪
+}
+
+
+def load_prefecture_data():
+    """都道府県マスタデータを返す関数"""
+    return PREFECTURES
+
+
+def _uniform(a, b, u):
+    """random.uniform と同じ式で、[0, 1) の乱数 u を a〜b の値にする"""
+    return a + (b - a) * u
+
+
+def sample_population_frame(years=YEARS):
+    """サンプルの人口データ（全年・全都道府県）を1つのDataFrameにまとめて作る関数。
+
+    年ごとに random.seed(年) から同じ順で乱数を引くので、以前の年ごとの生成処理と同じ値になる。
+    乱数を引く以外の計算は、年×都道府県の配列でまとめて行う。
+    """
+    years = np.asarray(list(years))
+    codes = list(PREFECTURES)
+    area = np.array([PREFECTURES[code]['area'] for code in codes], dtype=np.float64)
+    urban = np.array([PREFECTURES[code]['region'] in ['関東', '近畿', '中部'] for code in codes])
+    fixed = np.array([code in SAMPLE_FIXED for code in codes])
+    n_generated = int((~fixed).sum())
+
+    # 年ごとの乱数列: 生成する都道府県ごとに3つ（規模・年少人口・高齢人口の比率）、続いて全都道府県の増減率
+    draws = np.empty((len(years), 3 * n_generated + len(codes)))
+    for row, year in enumerate(years):
+        rnd = random.Random(int(year))
+        draws[row] = [rnd.random() for _ in range(draws.shape[1])]
+    scale, children_rate, elderly_rate = draws[:, :3 * n_generated].reshape(len(years), n_generated, 3).transpose(2, 0, 1)
+    change = draws[:, 3 * n_generated:]
+
+    # 面積と地域特性でおおよその人口を推定
+    base = _uniform(0.8, 1.2, scale)
+    generated_area = area[~fixed]
+    base_population = np.where(urban[~fixed],
+                               np.minimum(3000000 + generated_area * 50 * base, 8000000),
+                               np.minimum(800000 + generated_area * 20 * base, 2500000))
+    counts = np.empty((4, len(years), len(codes)), dtype=np.int64)
+    total = np.trunc(base_population)
+    children = np.trunc(total * _uniform(0.1, 0.15, children_rate))
+    elderly = np.trunc(total * _uniform(0.2, 0.35, elderly_rate))
+    counts[:, :, ~fixed] = [total, children, total - children - elderly, elderly]
+    counts[:, :, fixed] = np.array([SAMPLE_FIXED[code] for code in codes if code in SAMPLE_FIXED]).T[:, None, :]
+
+    # 年度ごとに少しずつ変化を加える（2015年基準）
+    change_factor = 1.0 + (years - 2015)[:, None] * _uniform(-0.01, 0.02, change)
+    total = np.trunc(counts[0] * change_factor).astype(np.int64)
+    children = np.trunc(counts[1] * np.maximum(0.95, change_factor * 0.97)).astype(np.int64)
+    elderly = np.trunc(counts[3] * np.minimum(1.1, change_factor * 1.03)).astype(np.int64)
+
+    return pd.DataFrame({
+        'year': np.repeat(years, len(codes)),
+        'pref_code': np.tile(codes, len(years)),
+        'total_population': total.ravel(),
+        'population_0_14': children.ravel(),
+        'population_15_64': (total - children - elderly).ravel(),
+        'population_65plus': elderly.ravel(),
+    })
+
+
+class PopulationCube:
+    """年×都道府県の人口データ（全指標）と、表示に使う集計を作成時にまとめて計算しておく入れ物。
+
+    frame には year, pref_code と COUNT_COLUMNS の列が必要。都道府県名・地域・面積・人口密度はここで付ける。
+    取り出したDataFrameは共有されるので、書き換えずに使うこと（必要ならコピーする）。
+    """
+
+    def __init__(self, frame):
+        codes = list(PREFECTURES)
+        frame = frame.sort_values(['year', 'pref_code'], kind='stable').reset_index(drop=True)
+        info = pd.DataFrame.from_dict(PREFECTURES, orient='index').reindex(frame['pref_code'])
+        regions = pd.CategoricalDtype(list(REGION_NAMES_EN))
+        self.frame = pd.DataFrame({
+            'pref_code': frame['pref_code'].to_numpy(),
+            'prefecture': pd.Categorical(info['name'].to_numpy(), categories=[PREFECTURES[c]['name'] for c in codes]),
+            'region': pd.Categorical(info['region'].to_numpy(), dtype=regions),
+            'area': info['area'].to_numpy(dtype=np.float64),
+            **{column: frame[column].to_numpy(dtype=np.int64) for column in COUNT_COLUMNS},
+        })
+        self.frame['density'] = self.frame['total_population'] / self.frame['area']
+        self.frame['year'] = frame['year'].to_numpy(dtype=np.int64)
+        self.frame.index = pd.MultiIndex.from_arrays([self.frame['year'], self.frame['pref_code']],
+                                                     names=['year', 'pref_code'])
+        self.years = sorted(self.frame['year'].unique().tolist())
+
+        # 年ごとの表（都道府県コード順・都道府県名順）
+        self._by_year = {}
+        self._by_name = {}
+        self._regions = {}
+        self._series = {}
+        for year, year_frame in self.frame.groupby(level='year', sort=True):
+            year_frame = year_frame.reset_index(drop=True)
+            self._by_year[year] = year_frame
+            self._by_name[year] = year_frame.sort_values('prefecture', key=lambda s: s.astype(str)).reset_index(drop=True)
+            # 地域別の集計（人口密度は地域の総人口 / 総面積）
+            regions_frame = (year_frame.groupby('region', observed=True, sort=False)[COUNT_COLUMNS + ['area']].sum()
+                             .sort_index(key=lambda index: index.astype(str)).reset_index())
+            regions_frame['region'] = regions_frame['region'].astype(str)
+            regions_frame['density'] = regions_frame['total_population'] / regions_frame['area']
+            regions_frame['region_en'] = regions_frame['region'].map(REGION_NAMES_EN)
+            self._regions[year] = regions_frame
+
+    def year(self, year):
+        """指定した年の全都道府県のデータ（都道府県コード順）を返す"""
+        return self._by_year[year]
+
+    def by_name(self, year):
+        """指定した年の全都道府県のデータ（都道府県名順）を返す"""
+        return self._by_name[year]
+
+    def top(self, year, column, n=5):
+        """指定した年・指標の上位n件を返す（nにNoneを渡すと全件を降順で返す）。
+
+        全件を並べ替えずに、上位n件だけを選んでから並べる（同じ値は都道府県コード順）。
+        """
+        year_frame = self._by_year[year]
+        negated = -year_frame[column].to_numpy()
+        if n is None or n >= len(negated):
+            return year_frame.iloc[np.argsort(negated, kind='stable')]
+        # n番目の値以上の行（同じ値の行も含む）だけを候補にして並べる
+        kth = np.partition(negated, n - 1)[n - 1]
+        candidates = np.flatnonzero(negated <= kth)
+        return year_frame.iloc[candidates[np.argsort(negated[candidates], kind='stable')[:n]]]
+
+    def regions(self, year):
+        """指定した年の地域別の集計（地域名順、英語の地域名つき）を返す"""
+        return self._regions[year]
+
+    def series(self, column):
+        """指標の全年の値を、都道府県コード × 年の表（行: 都道府県コード順, 列: 年）で返す"""
+        if column not in self._series:
+            self._series[column] = self.frame[column].unstack('year')
+        return self._series[column]
+
+
+@lru_cache(maxsize=1)
+def load_population_cube():
+    """全年の人口データキューブを返す関数。プロセスごとに1回だけ作る。"""
+    return PopulationCube(sample_population_frame(YEARS))
+
+
+def fetch_population_data(year):
+    """指定した年の人口データを取得する関数"""
+    return load_population_cube().year(year).copy()
+
+
+def sample_municipality_frame(municipalities, prefecture_frame, seed=0):
+    """都道府県の人数を市区町村に配分したサンプルの人口データを作る関数。
+
+    municipalities は code, name, pref_code, area の表、prefecture_frame は1年分の都道府県の表。
+    市区町村の重みは面積と乱数の種 seed から毎回同じ値で決める（年が変わっても配分の比率は同じ）。
+    """
+    rng = np.random.default_rng(seed)
+    weights = pd.Series(np.sqrt(municipalities['area'].to_numpy()) * rng.lognormal(0.0, 1.0, len(municipalities)))
+    shares = (weights / weights.groupby(municipalities['pref_code'].to_numpy()).transform('sum')).to_numpy()
+    prefectures = prefecture_frame.set_index('pref_code').reindex(municipalities['pref_code'])
+
+    frame = municipalities[['code', 'name', 'pref_code', 'area']].reset_index(drop=True)
+    for column in AGE_COLUMNS:
+        frame[column] = np.round(prefectures[column].to_numpy() * shares).astype(np.int64)
+    frame['total_population'] = frame[AGE_COLUMNS].sum(axis=1)
+    frame['density'] = frame['total_population'] / frame['area']
+    return frame[['code', 'name', 'pref_code'] + COUNT_COLUMNS + ['area', 'density']]
@@ -1,34 +1,15 @@
 import streamlit as st
-import pandas as pd
-import folium
-import geopandas as gpd
-import matplotlib.pyplot as plt
-from folium.plugins import MarkerCluster
-from streamlit_folium import st_folium
-import json
-import requests
-from io import BytesIO
-import numpy as np
-import matplotlib.cm as cm
-from matplotlib.colors import LinearSegmentedColormap
-import base64
-
-# 英語表記に切り替えるためのコード追加
-import matplotlib
-matplotlib.rcParams['font.family'] = 'DejaVu Sans'
-
-# 地域名を英語に変更するマッピング
-region_mapping = {
-    '北海道': 'Hokkaido',
-    '東北': 'Tohoku',
-    '関東': 'Kanto',
-    '中部': 'Chubu',
-    '近畿': 'Kinki',
-    '中国': 'Chugoku',
-    '四国': 'Shikoku',
-    '九州': 'Kyushu',
-    '沖縄': 'Okinawa'
-}
+import population_data
+import population_store
+import municipality_geometry
+import prefecture_geometry
+from population_maps import (DEFAULT_LOCATION, DEFAULT_ZOOM, create_animation_layer, create_base_map,
+                             create_municipality_map, create_style_layer)
+from data_export import download_section
+from figure_render import FigureRenderer
+from population_tables import column_config, page_count, page_rows, style_table
+from prefecture_geometry import choose_level
+from static_files import static_url
 
 # アプリケーションタイトル設定
 st.title('日本の都道府県別人口統計マップ')
@@ -37,8 +18,37 @@ st.write('人口データを地図上で視覚的に確認できるダッシュ
 # サイドバー設定
 st.sidebar.header('表示オプション')
 
-# 年代選択（サンプルデータ用、実際のAPIでは年が選択できるようにする）
-year = st.sidebar.selectbox('年を選択', [2015, 2016, 2017, 2018, 2019, 2020, 2021])
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_population_cube():
+    """全年の人口データキューブと取り込み元の情報を返す関数（プロセス内で共有し、表示ごとに作り直さない）。
+
+    e-Statから取り込んだ保存データ（population_store.py で作成）を読む。APIは呼ばない。
+    """
+    return population_store.load_cube()
+
+population_cube, population_source = get_population_cube()
+
+# 年代選択（保存データにある年から選ぶ）
+year = st.sidebar.selectbox('年を選択', population_cube.years)
+
+# 地図の単位（市区町村は境界データを作成済みのときだけ選べる）
+map_unit = '都道府県'
+if municipality_geometry.available():
+    map_unit = st.sidebar.radio('地図の単位', ['都道府県', '市区町村'])
+else:
+    st.sidebar.caption('市区町村別の地図は `python municipality_geometry.py --source N03.geojson` で境界データを作ると使えます')
+
+# 市区町村の地図で表示する都道府県
+if map_unit == '市区町村':
+    prefectures = population_data.load_prefecture_data()
+    selected_pref = st.sidebar.selectbox('都道府県を選択', list(prefectures),
+                                         format_func=lambda code: prefectures[code]['name'], index=12)
+
+# 全年の変化を地図上で再生（年の切り替えはブラウザ内で行い、再実行しない）
+first_year, last_year = population_cube.years[0], population_cube.years[-1]
+playback = False
+if map_unit == '都道府県':
+    playback = st.sidebar.checkbox(f'{first_year}〜{last_year}年の変化を再生')
 
 # 表示モード選択
 display_mode = st.sidebar.radio(
@@ -54,303 +64,256 @@ if display_mode == '年齢層別人口':
     )
 
 # データキャッシュ用デコレータ
-@st.cache_data(ttl=3600)
-def load_japan_map_data():
-    """日本の地図データ（GeoJSON）を読み込む関数"""
-    try:
-        # 国土地理院などが提供する日本の県境GeoJSONデータをダウンロード
-        url = "https://raw.githubusercontent.com/dataofjapan/land/master/japan.geojson"
-        response = requests.get(url)
-        return json.loads(response.content)
-    except Exception as e:
-        st.error(f"地図データの読み込みに失敗しました: {e}")
-        return None
+@st.cache_resource(show_spinner=False)
+def load_japan_map_data(level):
+    """日本の地図データ（詳細度ごとに簡略化したGeoJSON）を読み込む関数。
 
-@st.cache_data(ttl=3600)
-def load_prefecture_data():
-    """都道府県マスタデータを読み込む関数"""
-    # 都道府県コードとその基本情報
-    pref_data = {
-        '01': {'name': '北海道', 'area': 83424, 'region': '北海道'},
-        '02': {'name': '青森県', 'area': 9646, 'region': '東北'},
-        '03': {'name': '岩手県', 'area': 15275, 'region': '東北'},
-        '04': {'name': '宮城県', 'area': 7282, 'region': '東北'},
-        '05': {'name': '秋田県', 'area': 11638, 'region': '東北'},
-        '06': {'name': '山形県', 'area': 9323, 'region': '東北'},
-        '07': {'name': '福島県', 'area': 13784, 'region': '東北'},
-        '08': {'name': '茨城県', 'area': 6097, 'region': '関東'},
-        '09': {'name': '栃木県', 'area': 6408, 'region': '関東'},
-        '10': {'name': '群馬県', 'area': 6362, 'region': '関東'},
-        '11': {'name': '埼玉県', 'area': 3798, 'region': '関東'},
-        '12': {'name': '千葉県', 'area': 5157, 'region': '関東'},
-        '13': {'name': '東京都', 'area': 2194, 'region': '関東'},
-        '14': {'name': '神奈川県', 'area': 2416, 'region': '関東'},
-        '15': {'name': '新潟県', 'area': 12584, 'region': '中部'},
-        '16': {'name': '富山県', 'area': 4248, 'region': '中部'},
-        '17': {'name': '石川県', 'area': 4186, 'region': '中部'},
-        '18': {'name': '福井県', 'area': 4190, 'region': '中部'},
-        '19': {'name': '山梨県', 'area': 4465, 'region': '中部'},
-        '20': {'name': '長野県', 'area': 13562, 'region': '中部'},
-        '21': {'name': '岐阜県', 'area': 10621, 'region': '中部'},
-        '22': {'name': '静岡県', 'area': 7777, 'region': '中部'},
-        '23': {'name': '愛知県', 'area': 5172, 'region': '中部'},
-        '24': {'name': '三重県', 'area': 5774, 'region': '近畿'},
-        '25': {'name': '滋賀県', 'area': 4017, 'region': '近畿'},
-        '26': {'name': '京都府', 'area': 4612, 'region': '近畿'},
-        '27': {'name': '大阪府', 'area': 1905, 'region': '近畿'},
-        '28': {'name': '兵庫県', 'area': 8401, 'region': '近畿'},
-        '29': {'name': '奈良県', 'area': 3691, 'region': '近畿'},
-        '30': {'name': '和歌山県', 'area': 4725, 'region': '近畿'},
-        '31': {'name': '鳥取県', 'area': 3507, 'region': '中国'},
-        '32': {'name': '島根県', 'area': 6708, 'region': '中国'},
-        '33': {'name': '岡山県', 'area': 7114, 'region': '中国'},
-        '34': {'name': '広島県', 'area': 8479, 'region': '中国'},
-        '35': {'name': '山口県', 'area': 6112, 'region': '中国'},
-        '36': {'name': '徳島県', 'area': 4147, 'region': '四国'},
-        '37': {'name': '香川県', 'area': 1876, 'region': '四国'},
-        '38': {'name': '愛媛県', 'area': 5676, 'region': '四国'},
-        '39': {'name': '高知県', 'area': 7104, 'region': '四国'},
-        '40': {'name': '福岡県', 'area': 4986, 'region': '九州'},
-        '41': {'name': '佐賀県', 'area': 2441, 'region': '九州'},
-        '42': {'name': '長崎県', 'area': 4130, 'region': '九州'},
-        '43': {'name': '熊本県', 'area': 7409, 'region': '九州'},
-        '44': {'name': '大分県', 'area': 6341, 'region': '九州'},
-        '45': {'name': '宮崎県', 'area': 7735, 'region': '九州'},
-        '46': {'name': '鹿児島県', 'area': 9187, 'region': '九州'},
-        '47': {'name': '沖縄県', 'area': 2281, 'region': '沖縄'},
-    }
-    return pref_data
+    ローカルの static/geometry/ から読み、プロセス内で共有する（セッションごとに複製しない）。
+    """
+    return prefecture_geometry.load_level(level)
+
+@st.cache_resource(show_spinner=False)
+def get_geometry_url(level):
+    """ブラウザが地図データを直接読み込むURLを返す関数（静的ファイル配信が無効ならNone）"""
+    return static_url(prefecture_geometry.level_url(level))
+
+@st.cache_resource(show_spinner=False)
+def get_municipality_levels(pref_code):
+    """市区町村の境界データの詳細度ごとの設定と、都道府県の範囲にかかるマス目の一覧を返す関数"""
+    manifest = municipality_geometry.load_manifest()
+    bounds = manifest['prefecture_bounds'][pref_code]
+    levels = []
+    for name, info in manifest['levels'].items():
+        stored = set(info['chunks'])
+        chunks = [key for key in municipality_geometry.cell_keys(bounds, info['cell']) if key in stored]
+        levels.append({'name': name, 'max_zoom': info['max_zoom'], 'cell': info['cell'], 'chunks': chunks})
+    return bounds, levels
+
+@st.cache_resource(show_spinner=False)
+def load_municipality_features(level, pref_code):
+    """都道府県の市区町村の境界データを読み込む関数（静的ファイル配信が無効なとき、地図に埋め込む）"""
+    bounds = municipality_geometry.load_manifest()['prefecture_bounds'][pref_code]
+    return municipality_geometry.load_features(level, bounds, pref_code)
 
 @st.cache_data(ttl=3600)
-def fetch_population_data(year):
-    """指定した年の人口データを取得する関数"""
-    # APIからデータを取得する代わりに、今回はサンプルデータを生成
-    pref_data = load_prefecture_data()
-    
-    # 実際のデータ比率に近い形でサンプル人口を生成
-    population_data = {
-        '01': {'total': 5250000, '0-14': 550000, '15-64': 3100000, '65+': 1600000},  # 北海道
-        '13': {'total': 14000000, '0-14': 1600000, '15-64': 9000000, '65+': 3400000},  # 東京
-        '23': {'total': 7550000, '0-14': 1050000, '15-64': 4800000, '65+': 1700000},  # 愛知
-        '27': {'total': 8800000, '0-14': 1150000, '15-64': 5500000, '65+': 2150000},  # 大阪
-    }
-    
-    # その他の都道府県にもサンプルデータを割り当て
-    import random
-    random.seed(year)  # 同じ年なら同じデータを生成
-    
-    population_df = []
-    for pref_code, info in pref_data.items():
-        # まだデータがなければサンプルデータを生成
-        if pref_code not in population_data:
-            area = info['area']
-            # 面積と地域特性でおおよその人口を推定
-            base = random.uniform(0.8, 1.2)
-            if info['region'] in ['関東', '近畿', '中部']:
-                base_population = min(3000000 + area * 50 * base, 8000000)
-            else:
-                base_population = min(800000 + area * 20 * base, 2500000)
-                
-            total = int(base_population)
-            children = int(total * random.uniform(0.1, 0.15))
-            elderly = int(total * random.uniform(0.2, 0.35))
-            working = total - children - elderly
-            
-            population_data[pref_code] = {
-                'total': total,
-                '0-14': children,
-                '15-64': working,
-                '65+': elderly
-            }
-            
-        # データフレーム用のデータ準備    
-        data = {
-            'pref_code': pref_code,
-            'prefecture': info['name'],
-            'region': info['region'],
-            'area': info['area'],
-            'total_population': population_data[pref_code]['total'],
-            'population_0_14': population_data[pref_code]['0-14'],
-            'population_15_64': population_data[pref_code]['15-64'],
-            'population_65plus': population_data[pref_code]['65+'],
-            'density': population_data[pref_code]['total'] / info['area'],
-            'year': year
-        }
-        population_df.append(data)
-        
-    # 年度ごとに少しずつ変化を加える（2015年基準）
-    year_diff = year - 2015
-    for data in population_df:
-        change_factor = 1.0 + (year_diff * random.uniform(-0.01, 0.02))
-        data['total_population'] = int(data['total_population'] * change_factor)
-        data['population_0_14'] = int(data['population_0_14'] * max(0.95, change_factor * 0.97))
-        data['population_65plus'] = int(data['population_65plus'] * min(1.1, change_factor * 1.03))
-        data['population_15_64'] = data['total_population'] - data['population_0_14'] - data['population_65plus']
-        data['density'] = data['total_population'] / data['area']
-        
-    return pd.DataFrame(population_df)
-
-# コロプレス図関数の修正版
-
-def create_choropleth_map(geo_data, data, column, title, colormap='YlOrRd'):
-    """コロプレス図（色分け地図）を作成する関数"""
-    # 地図の初期設定
-    m = folium.Map(
-        location=[36.2048, 138.2529],  # 日本の中心あたりに設定
-        zoom_start=5,
-        tiles='cartodbpositron'
-    )
-    
-    # コロプレス図作成
-    choropleth = folium.Choropleth(
-        geo_data=geo_data,
-        name='choropleth',
-        data=data,
-        columns=['pref_code', column],
-        key_on='feature.properties.id',
-        fill_color=colormap,
-        fill_opacity=0.7,
-        line_opacity=0.5,
-        legend_name=title,
-        highlight=True,
-        bins=8,  # 階級区分の数
-    ).add_to(m)
-    
-    # ここ重要！！！なんか複雑な処理するより、シンプルにツールチップ一つだけでいいわ！
-    # データをさらに紐付けとかせずに、基本的なホバー情報だけ表示する
-    folium.features.GeoJsonTooltip(
-        fields=['nam_ja'],
-        aliases=['都道府県:'],
-        localize=True,
-        sticky=True
-    ).add_to(choropleth.geojson)
-    
-    return m
+def get_municipality_population(prefecture_frame):
+    """市区町村別の人口データ（都道府県の人数を配分したサンプル）を返す関数。
+
+    1年分の都道府県の表を引数で受け取るので、保存データが更新されれば（表の内容が変われば）作り直す。
+    """
+    return population_data.sample_municipality_frame(municipality_geometry.load_municipalities(), prefecture_frame)
+
+@st.cache_resource
+def get_figure_renderer():
+    """プロセス内で共有するグラフ画像のキャッシュを返す関数"""
+    return FigureRenderer()
+
+# 地図の表示範囲（拡大率・中心）。拡大率に合わせて境界データの詳細度を選ぶ
+if 'map_view' not in st.session_state:
+    st.session_state.map_view = {'zoom': DEFAULT_ZOOM, 'center': DEFAULT_LOCATION}
+map_view = st.session_state.map_view
+geometry_level = choose_level(map_view['zoom'])
 
 # 地図データとサンプルデータを読み込み
+# 都道府県の境界データは作成済みのファイルを使う。なければ初回だけ別スレッドで作成し、その間は地図以外を表示する
+prefecture_map, geometry_error = prefecture_geometry.ensure_levels()
 with st.spinner('データ読み込み中...'):
-    geo_data = load_japan_map_data()
-    prefecture_data = load_prefecture_data()
-    population_df = fetch_population_data(year)
-
-    if geo_data is None:
-        st.error("地図データの読み込みに失敗しました。")
-        st.stop()
+    geometry_url, geo_data = None, None
+    if prefecture_map:
+        try:
+            # 静的ファイル配信が有効ならブラウザが読み込む（一度読めばブラウザにキャッシュされる）
+            geometry_url = get_geometry_url(geometry_level)
+            geo_data = None if geometry_url else load_japan_map_data(geometry_level)
+        except Exception as e:
+            st.error(f"地図データの読み込みに失敗しました: {e}")
+            st.stop()
+    population_df = population_cube.year(year)
 
 # 表示するデータ列とタイトルを決定
+year_label = f'{first_year}〜{last_year}年' if playback else f'{year}年'
+if map_unit == '市区町村':
+    year_label += f" {prefectures[selected_pref]['name']}"
 if display_mode == '人口総数':
     column = 'total_population'
-    title = f'{year}年 都道府県別人口総数'
+    title = f'{year_label} {map_unit}別人口総数'
     map_title = '総人口（人）'
 elif display_mode == '人口密度':
     column = 'density'
-    title = f'{year}年 都道府県別人口密度'
+    title = f'{year_label} {map_unit}別人口密度'
     map_title = '人口密度（人/km²）'
 else:  # 年齢層別人口
     if age_group == '0-14歳':
         column = 'population_0_14'
-        title = f'{year}年 都道府県別年少人口（0-14歳）'
+        title = f'{year_label} {map_unit}別年少人口（0-14歳）'
     elif age_group == '15-64歳':
         column = 'population_15_64'
-        title = f'{year}年 都道府県別生産年齢人口（15-64歳）'
+        title = f'{year_label} {map_unit}別生産年齢人口（15-64歳）'
     else:  # '65歳以上'
         column = 'population_65plus'
-        title = f'{year}年 都道府県別高齢者人口（65歳以上）'
+        title = f'{year_label} {map_unit}別高齢者人口（65歳以上）'
     map_title = '人口（人）'
 
 # 地図表示
 st.subheader(title)
-map_fig = create_choropleth_map(geo_data, population_df, column, map_title)
-st_folium(map_fig, width=700, height=500)
+# 境界データの地図は表示範囲と詳細度が同じなら毎回同じ内容なので、ブラウザ側では作り直されない。
+# 年や表示モードを変えたときは、都道府県ごとの色と凡例を塗り直す小さな層だけが送られる
+if map_unit == '市区町村':
+    # 市区町村の境界は、ブラウザが表示範囲のマス目のファイルだけを読み込む（移動・拡大のたびに追加で読む）
+    bounds, levels = get_municipality_levels(selected_pref)
+    chunk_url = static_url(municipality_geometry.chunk_url())
+    # 埋め込みのときは、詳細度を切り替えて描き直しても表示範囲が変わらないように、前回の範囲を使う
+    municipality_view = st.session_state.get('municipality_view', {})
+    if municipality_view.get('pref') != selected_pref:
+        municipality_view = {}
+    municipality_level = municipality_geometry.choose_level(municipality_view.get('zoom'))
+    base_map = create_municipality_map(
+        bounds, chunk_url=chunk_url, levels=levels if chunk_url else None,
+        geo_data=None if chunk_url else load_municipality_features(municipality_level, selected_pref),
+        pref_code=selected_pref, location=municipality_view.get('center'), zoom_start=municipality_view.get('zoom'))
+    municipality_df = get_municipality_population(population_cube.year(year))
+    municipality_df = municipality_df[municipality_df['pref_code'] == selected_pref]
+    style_layer = create_style_layer(municipality_df, column, map_title, key='code', target='municipality_layer')
+elif not prefecture_map:
+    base_map = style_layer = None
+    if geometry_error is not None:
+        st.warning(f'都道府県の境界データを作成できませんでした（{geometry_error}）。'
+                   '`python prefecture_geometry.py` で作成すると地図を表示できます')
+    else:
+        st.info('都道府県の境界データを作成しています（初回のみ）。できあがると地図を表示します')
+
+        @st.fragment(run_every=2)
+        def wait_for_geometry():
+            """境界データができあがったら、ページ全体を再実行して地図を表示する"""
+            if prefecture_geometry.available():
+                st.rerun()
+
+        wait_for_geometry()
+else:
+    base_map = create_base_map(geometry_url, geo_data, location=map_view['center'], zoom_start=map_view['zoom'])
+    if playback:
+        # 全年の階級（全年共通の区分）を一度に送り、再生・スライダーの操作はブラウザだけで行う
+        style_layer = create_animation_layer(population_cube.series(column), map_title, start_year=year,
+                                             decimals=1 if column == 'density' else 0)
+    else:
+        style_layer = create_style_layer(population_df, column, map_title)
+map_state = None
+if base_map is not None:
+    # streamlit_folium は読み込みが重いので、地図を表示するときに読み込む
+    from streamlit_folium import st_folium
+    map_state = st_folium(base_map, width=700, height=500, returned_objects=['zoom', 'center'],
+                          feature_group_to_add=style_layer)
+
+# 拡大・縮小で必要な詳細度が変わったら、今の表示範囲のまま境界データを差し替えて描き直す
+if map_unit == '市区町村':
+    # 静的ファイル配信が有効ならブラウザが詳細度を切り替えるので、再実行するのは埋め込みのときだけ
+    if (map_state and map_state.get('zoom') is not None and not chunk_url
+            and municipality_geometry.choose_level(map_state['zoom']) != municipality_level):
+        st.session_state.municipality_view = {'pref': selected_pref, 'zoom': map_state['zoom'],
+                                              'center': [map_state['center']['lat'], map_state['center']['lng']]}
+        st.rerun()
+elif map_state and map_state.get('zoom') is not None and choose_level(map_state['zoom']) != geometry_level:
+    st.session_state.map_view = {'zoom': map_state['zoom'],
+                                 'center': [map_state['center']['lat'], map_state['center']['lng']]}
+    st.rerun()
 
 # データテーブル表示（トップ5と詳細表示オプション）
 st.subheader("データテーブル")
 
+# 表は数値のまま渡し、桁区切りなどは表示形式（Styler / column_config）で付ける。
+# 折りたたまれている間は中身を作らない（開いたときに再実行される）
+top_label = f"{map_title}上位5都道府県"
 if display_mode == '人口密度':
-    sorted_df = population_df.sort_values(by=column, ascending=False)
-    with st.expander("人口密度上位5都道府県"):
-        top5 = sorted_df.head(5)
-        formatted_top5 = top5.copy()
-        formatted_top5['density'] = formatted_top5['density'].apply(lambda x: f"{x:.1f}")
-        formatted_top5['total_population'] = formatted_top5['total_population'].apply(lambda x: f"{int(x):,}")
-        st.table(formatted_top5[['prefecture', 'density', 'total_population']])
+    top_label = "人口密度上位5都道府県"
+    top_columns = ['prefecture', 'density', 'total_population']
+elif column == 'total_population':
+    # カラム名の重複を避けるため、一つの列だけ表示
+    top_columns = ['prefecture', 'total_population']
 else:
-    sorted_df = population_df.sort_values(by=column, ascending=False)
-    with st.expander(f"{map_title}上位5都道府県"):
-        top5 = sorted_df.head(5)
-        formatted_top5 = top5.copy()
-        for col in ['total_population', 'population_0_14', 'population_15_64', 'population_65plus']:
-            formatted_top5[col] = formatted_top5[col].apply(lambda x: f"{int(x):,}")
-        
-        # ここ！カラム名が重複してるから修正！
-        if column == 'total_population':
-            # 重複を避けるため、一つの列だけ表示
-            st.table(formatted_top5[['prefecture', 'total_population']])
-        else:
-            # 重複しない場合は元のまま
-            st.table(formatted_top5[['prefecture', column, 'total_population']])
+    top_columns = ['prefecture', column, 'total_population']
+
+with st.expander(top_label, key='top_table', on_change='rerun') as top_expander:
+    if top_expander.open:
+        top5 = population_cube.top(year, column, 5)
+        st.table(style_table(top5[top_columns]))
 
 # 詳細データ表示オプション
-with st.expander("全都道府県データ表示"):
-    # 表示列を決定
-    display_cols = ['prefecture', 'region', 'total_population', 'density']
-    if display_mode == '年齢層別人口':
-        display_cols.append(column)
-    
-    # データをテーブル表示
-    formatted_df = population_df.copy()
-    formatted_df['density'] = formatted_df['density'].apply(lambda x: f"{x:.1f}")
-    for col in ['total_population', 'population_0_14', 'population_15_64', 'population_65plus']:
-        formatted_df[col] = formatted_df[col].apply(lambda x: f"{int(x):,}")
-    
-    st.dataframe(
-        formatted_df[display_cols].sort_values(by='prefecture'),
-        use_container_width=True
-    )
+with st.expander("全都道府県データ表示", key='full_table', on_change='rerun') as full_expander:
+    if full_expander.open:
+        # 表示列を決定
+        display_cols = ['prefecture', 'region', 'total_population', 'density']
+        if display_mode == '年齢層別人口':
+            display_cols.append(column)
+
+        # 行が多いときはページに分けて、表示中のページだけを送る
+        table_df = population_cube.by_name(year)
+        pages = page_count(len(table_df))
+        page = 1
+        if pages > 1:
+            page = st.number_input(f'ページ（全{pages}ページ, {len(table_df):,}行）', min_value=1, max_value=pages,
+                                   value=1, key='table_page')
+        st.dataframe(
+            page_rows(table_df, page)[display_cols],
+            column_config=column_config(display_cols),
+            width='stretch'
+        )
+
+# 市区町村のデータ（市区町村の地図のときだけ）
+if map_unit == '市区町村':
+    with st.expander(f"{prefectures[selected_pref]['name']}の市区町村データ表示", key='municipality_table',
+                     on_change='rerun') as municipality_expander:
+        if municipality_expander.open:
+            municipality_cols = ['name', 'total_population', 'density']
+            if display_mode == '年齢層別人口':
+                municipality_cols.append(column)
+            pages = page_count(len(municipality_df))
+            page = 1
+            if pages > 1:
+                page = st.number_input(f'ページ（全{pages}ページ, {len(municipality_df):,}行）', min_value=1,
+                                       max_value=pages, value=1, key='municipality_page')
+            st.dataframe(
+                page_rows(municipality_df, page)[municipality_cols],
+                column_config=column_config(municipality_cols),
+                width='stretch'
+            )
 
 # グラフ分析
 st.subheader("データ分析")
 
 # 地域別集計
-with st.expander("地域別人口分布"):
-    region_data = population_df.groupby('region').agg({
-        'total_population': 'sum',
-        'population_0_14': 'sum',
-        'population_15_64': 'sum',
-        'population_65plus': 'sum'
-    }).reset_index()
-    
-    # 英語の地域名に変換
-    region_data['region_en'] = region_data['region'].map(region_mapping)
-    
-    fig, ax = plt.subplots(figsize=(10, 6))
-    x = np.arange(len(region_data))
-    width = 0.25
-    
-    ax.bar(x - width, region_data['population_0_14'] / 10000, width, label='0-14 y.o.')
-    ax.bar(x, region_data['population_15_64'] / 10000, width, label='15-64 y.o.')
-    ax.bar(x + width, region_data['population_65plus'] / 10000, width, label='65+ y.o.')
-    
-    ax.set_ylabel('Population (10,000 people)')
-    ax.set_title('Population Distribution by Region')
-    ax.set_xticks(x)
-    ax.set_xticklabels(region_data['region_en'])  # 英語の地域名を使用
-    ax.legend()
-    
-    st.pyplot(fig)
+with st.expander("地域別人口分布", key='region_chart', on_change='rerun') as region_expander:
+    if region_expander.open:
+        # matplotlibはグラフを開いたときに初めて読み込む
+        from population_charts import plot_region_population
+        # 地域別の集計（英語の地域名つき）はキューブの作成時に計算済み
+        region_data = population_cube.regions(year)
+        # 同じ年のグラフは描き直さず、前回の画像を使う
+        region_columns = ['region_en', 'population_0_14', 'population_15_64', 'population_65plus']
+        st.image(get_figure_renderer().render(plot_region_population, region_data[region_columns]),
+                 width='stretch')
 
 # ダウンロード機能
 st.subheader("データダウンロード")
 
-def create_download_link(df):
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="population_data_{year}.csv">人口データCSVをダウンロード</a>'
-    return href
-
-st.markdown(create_download_link(population_df), unsafe_allow_html=True)
+# ファイルはボタンが押されたときに作る（ページには埋め込まない）
+export_scopes = [f'{year}年', f'全年（{first_year}〜{last_year}年）']
+if municipality_geometry.available():
+    export_scopes.append(f'{year}年の全市区町村')
+export_scope = st.radio("範囲", export_scopes, horizontal=True, key='export_scope')
+if export_scope == export_scopes[0]:
+    get_export_frame, export_stem = (lambda: population_df), f'population_data_{year}'
+elif export_scope == export_scopes[1]:
+    get_export_frame = lambda: population_cube.frame.reset_index(drop=True)
+    export_stem = f'population_data_{first_year}-{last_year}'
+else:
+    municipality_export = get_municipality_population(population_cube.year(year))
+    get_export_frame, export_stem = (lambda: municipality_export), f'municipality_population_{year}'
+download_section("人口データをダウンロード", get_export_frame, export_stem, key='population_download')
 
 # フッター
 st.markdown("---")
-st.markdown("データソース: サンプルデータ（実運用時はe-Stat APIから取得）")
+if population_source.get('source') == 'e-Stat':
+    st.markdown(f"データソース: 政府統計の総合窓口（e-Stat） 統計表ID {population_source['stats_data_id']}"
+                f"（取り込み日時: {population_source['synced_at']}）")
+else:
+    st.markdown("データソース: サンプルデータ（`python population_store.py` でe-Statから取り込むと実データを表示）")
 st.markdown("© 2025 Demo Applications")
\ No newline at end of file
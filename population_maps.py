@@ -0,0 +1,459 @@
+"""人口データを地図に描く処理（Folium）。
+
+create_choropleth_map は境界データと色分けを1つの地図にまとめて作る（表示のたびに境界データ全体を送る）。
+create_base_map と create_style_layer は、境界データの層（一度だけ送る）と、都道府県ごとの色・凡例を
+塗り直すだけの小さな層に分けて作る。st_folium の feature_group_to_add に後者を渡すと、年や表示モードを
+変えたときにブラウザ側の地図は作り直されず、色だけが更新される。
+create_municipality_map は市区町村の境界データを表示範囲のマス目ごとに読み込む地図を作る（色は同じく
+create_style_layer の層で塗る）。
+create_animation_layer は全年の階級を一度に送り、年の切り替え（再生・スライダー）をブラウザの中だけで行う層を作る。
+"""
+import folium
+import numpy as np
+from branca.element import MacroElement, Template
+from branca.utilities import color_brewer
+
+# 地図の初期表示（日本の中心あたり）
+DEFAULT_LOCATION = [36.2048, 138.2529]
+DEFAULT_ZOOM = 5
+
+# 境界線の表示設定（Choroplethの fill_opacity / line_opacity と同じ）
+FILL_OPACITY = 0.7
+LINE_OPACITY = 0.5
+
+# 境界線の太さ（市区町村は数が多いので細くする）。塗り直す層は対象の層の options.lineWeight を使う
+PREFECTURE_LINE_WEIGHT = 1
+MUNICIPALITY_LINE_WEIGHT = 0.5
+
+# 値のない都道府県の色
+NAN_FILL_COLOR = 'black'
+
+
+def create_choropleth_map(geo_data, data, column, title, colormap='YlOrRd', location=None, zoom_start=DEFAULT_ZOOM):
+    """コロプレス図（色分け地図）を作成する関数"""
+    # 地図の初期設定
+    m = folium.Map(
+        location=location or DEFAULT_LOCATION,
+        zoom_start=zoom_start,
+        tiles='cartodbpositron'
+    )
+
+    # コロプレス図作成
+    choropleth = folium.Choropleth(
+        geo_data=geo_data,
+        name='choropleth',
+        data=data,
+        columns=['pref_code', column],
+        key_on='feature.properties.id',  # 2桁の都道府県コード（pref_code と同じ文字列）
+        fill_color=colormap,
+        fill_opacity=0.7,
+        line_opacity=0.5,
+        legend_name=title,
+        highlight=True,
+        bins=8,  # 階級区分の数
+    ).add_to(m)
+
+    # ここ重要！！！なんか複雑な処理するより、シンプルにツールチップ一つだけでいいわ！
+    # データをさらに紐付けとかせずに、基本的なホバー情報だけ表示する
+    folium.features.GeoJsonTooltip(
+        fields=['nam_ja'],
+        aliases=['都道府県:'],
+        localize=True,
+        sticky=True
+    ).add_to(choropleth.geojson)
+
+    return m
+
+
+class PrefectureLayer(MacroElement):
+    """都道府県の境界データの層。色は create_style_layer の層が後から塗る。
+
+    url を渡すとブラウザがそのURLから境界データを読み込み（ブラウザのキャッシュが効く）、
+    data を渡すとGeoJSONを地図のスクリプトに埋め込む。
+    """
+
+    _template = Template('''
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(null, {
+            lineWeight: {{ this.line_weight }},
+            style: {color: 'black', weight: {{ this.line_weight }}, opacity: {{ this.line_opacity }},
+                    fillColor: '#cccccc', fillOpacity: {{ this.fill_opacity }}},
+            onEachFeature: function(feature, layer) {
+                layer.bindTooltip('都道府県: ' + feature.properties.nam_ja, {sticky: true});
+                layer.on({
+                    mouseover: function(e) { e.target.setStyle({weight: 3, fillOpacity: 0.9}); },
+                    mouseout: function(e) { {{ this.get_name() }}.resetStyle(e.target); }
+                });
+            }
+        }).addTo({{ this._parent.get_name() }});
+        window.prefecture_layer = {{ this.get_name() }};
+        {% if this.url %}
+        fetch({{ this.url|tojson }})
+            .then(function(response) { return response.json(); })
+            .then(function(data) { {{ this.get_name() }}.addData(data); });
+        {% else %}
+        {{ this.get_name() }}.addData({{ this.data|tojson }});
+        {% endif %}
+        {% endmacro %}
+    ''')
+
+    def __init__(self, url=None, data=None):
+        super().__init__()
+        self._name = 'PrefectureLayer'
+        self.url = url
+        self.data = data
+        self.fill_opacity = FILL_OPACITY
+        self.line_opacity = LINE_OPACITY
+        self.line_weight = PREFECTURE_LINE_WEIGHT
+
+
+class MunicipalityLayer(MacroElement):
+    """市区町村の境界データの層（window.municipality_layer）。色は create_style_layer の層が後から塗る。
+
+    levels（詳細度ごとの max_zoom・マス目の大きさ・読み込めるマス目の一覧）と url を渡すと、ブラウザが
+    地図の拡大率に合った詳細度の、表示範囲にかかるマス目のファイルだけを読み込む（移動・拡大のたびに追加で読む）。
+    data を渡すとGeoJSONを地図のスクリプトに埋め込む。pref_code を渡すとその都道府県の市区町村だけを表示する。
+    """
+
+    _template = Template('''
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(null, {
+            lineWeight: {{ this.line_weight }},
+            style: {color: 'black', weight: {{ this.line_weight }}, opacity: {{ this.line_opacity }},
+                    fillColor: '#cccccc', fillOpacity: {{ this.fill_opacity }}},
+            onEachFeature: function(feature, layer) {
+                layer.bindTooltip('市区町村: ' + feature.properties.name, {sticky: true});
+                layer.on({
+                    mouseover: function(e) { e.target.setStyle({weight: 2, fillOpacity: 0.9}); },
+                    mouseout: function(e) { {{ this.get_name() }}.resetStyle(e.target); }
+                });
+            }
+        }).addTo({{ this._parent.get_name() }});
+        window.municipality_layer = {{ this.get_name() }};
+        {% if this.levels %}
+        (function(layer, map) {
+            var levels = {{ this.levels|tojson }};
+            var base = {{ this.url|tojson }};
+            var pref = {{ this.pref_code|tojson }};
+            levels.forEach(function(level) {
+                level.available = {};
+                level.chunks.forEach(function(key) { level.available[key] = true; });
+            });
+            var state = {level: null, requested: {}, ids: {}};
+
+            var load = function() {
+                var zoom = map.getZoom();
+                var level = levels[levels.length - 1];
+                for (var i = 0; i < levels.length; i++) {
+                    if (levels[i].max_zoom === null || zoom <= levels[i].max_zoom) { level = levels[i]; break; }
+                }
+                // 詳細度が変わったら、読み込んだ地物を捨てて表示範囲のマス目から読み直す
+                if (state.level !== level.name) {
+                    layer.clearLayers();
+                    state = {level: level.name, requested: {}, ids: {}};
+                }
+                var current = state;
+                var bounds = map.getBounds();
+                var cell = level.cell;
+                for (var ix = Math.floor(bounds.getWest() / cell); ix <= Math.floor(bounds.getEast() / cell); ix++) {
+                    for (var iy = Math.floor(bounds.getSouth() / cell); iy <= Math.floor(bounds.getNorth() / cell); iy++) {
+                        var key = ix + '_' + iy;
+                        if (!level.available[key] || current.requested[key]) { continue; }
+                        current.requested[key] = true;
+                        fetch(base + '/' + level.name + '/' + key + '.geojson')
+                            .then(function(response) { return response.json(); })
+                            .then(function(data) {
+                                if (state !== current) { return; }
+                                // 複数のマス目にかかる地物は最初の1回だけ追加する
+                                data.features = data.features.filter(function(feature) {
+                                    var props = feature.properties;
+                                    if ((pref && props.pref !== pref) || current.ids[props.id]) { return false; }
+                                    current.ids[props.id] = true;
+                                    return true;
+                                });
+                                layer.addData(data);
+                            });
+                    }
+                }
+            };
+            map.on('moveend', load);
+            // 地図の範囲（fitBounds）が決まってから最初の読み込みをする
+            setTimeout(load, 0);
+        })({{ this.get_name() }}, {{ this._parent.get_name() }});
+        {% else %}
+        {{ this.get_name() }}.addData({{ this.data|tojson }});
+        {% endif %}
+        {% endmacro %}
+    ''')
+
+    def __init__(self, url=None, levels=None, data=None, pref_code=None):
+        super().__init__()
+        self._name = 'MunicipalityLayer'
+        self.url = url
+        self.levels = levels
+        self.data = data
+        self.pref_code = pref_code
+        self.fill_opacity = FILL_OPACITY
+        self.line_opacity = LINE_OPACITY
+        self.line_weight = MUNICIPALITY_LINE_WEIGHT
+
+
+class PrefectureStyle(MacroElement):
+    """都道府県の層（window.prefecture_layer）を塗り直し、凡例を差し替える層。
+
+    target に 'municipality_layer' を渡すと市区町村の層（MunicipalityLayer）を塗り直す。
+    """
+
+    _template = Template('''
+        {% macro script(this, kwargs) %}
+        (function() {
+            if (window.prefecture_animation) { window.prefecture_animation.remove(); }
+            var colors = {{ this.colors|tojson }};
+            var layer = window[{{ this.target|tojson }}];
+            // 線の太さは塗り直す層のもの（都道府県と市区町村で違う）をそのまま使う
+            var weight = layer.options.lineWeight;
+            var style = function(feature) {
+                return {color: 'black', weight: weight, opacity: {{ this.line_opacity }},
+                        fillColor: colors[feature.properties.id] || {{ this.nan_color|tojson }},
+                        fillOpacity: {{ this.fill_opacity }}};
+            };
+            // 後から読み込まれる境界データにも同じ色がつくように options.style も差し替える
+            layer.options.style = style;
+            layer.setStyle(style);
+
+            if (window.prefecture_legend) { window.prefecture_legend.remove(); }
+            var legend = L.control({position: 'topright'});
+            legend.onAdd = function() {
+                var div = L.DomUtil.create('div');
+                div.style.cssText = 'background: white; padding: 6px 8px; font-size: 12px; line-height: 18px;';
+                div.innerHTML = {{ this.legend_html|tojson }};
+                return div;
+            };
+            legend.addTo(layer._map);
+            window.prefecture_legend = legend;
+        })();
+        {% endmacro %}
+    ''')
+
+    def __init__(self, colors, legend_html, target='prefecture_layer'):
+        super().__init__()
+        self._name = 'PrefectureStyle'
+        self.colors = colors
+        self.legend_html = legend_html
+        self.target = target
+        self.nan_color = NAN_FILL_COLOR
+        self.fill_opacity = FILL_OPACITY
+        self.line_opacity = LINE_OPACITY
+
+
+class PrefectureAnimation(MacroElement):
+    """都道府県の層（window.prefecture_layer）を年ごとに塗り替える層。再生ボタンと年のスライダーつき。
+
+    全年の階級番号と値を配列で一度に送るので、年を切り替えてもサーバーとの通信は起きない。
+    """
+
+    _template = Template('''
+        {% macro script(this, kwargs) %}
+        (function() {
+            if (window.prefecture_animation) { window.prefecture_animation.remove(); }
+            var data = {{ this.data|tojson }};
+            var layer = window.prefecture_layer;
+            var map = layer._map;
+            var rows = {};
+            data.codes.forEach(function(code, i) { rows[code] = i; });
+            var current = data.start;
+            var timer = null;
+
+            var style = function(feature) {
+                var row = rows[feature.properties.id];
+                var index = row === undefined ? -1 : data.classes[current][row];
+                return {color: 'black', weight: layer.options.lineWeight, opacity: {{ this.line_opacity }},
+                        fillColor: index < 0 ? {{ this.nan_color|tojson }} : data.palette[index],
+                        fillOpacity: {{ this.fill_opacity }}};
+            };
+            var tooltip = function(feature) {
+                var row = rows[feature.properties.id];
+                var text = '都道府県: ' + feature.properties.nam_ja;
+                if (row !== undefined && data.values[current][row] !== null) {
+                    text += '<br>' + data.years[current] + '年: ' + data.values[current][row].toLocaleString();
+                }
+                return text;
+            };
+
+            // 操作パネル（再生・停止ボタン、年のスライダー、表示中の年）
+            var panel = L.control({position: 'bottomleft'});
+            var button, slider, label;
+            panel.onAdd = function() {
+                var div = L.DomUtil.create('div');
+                div.style.cssText = 'background: white; padding: 6px 8px; font-size: 14px;';
+                button = L.DomUtil.create('button', '', div);
+                slider = L.DomUtil.create('input', '', div);
+                slider.type = 'range';
+                slider.min = 0;
+                slider.max = data.years.length - 1;
+                slider.style.cssText = 'vertical-align: middle; margin: 0 8px;';
+                label = L.DomUtil.create('b', '', div);
+                L.DomEvent.disableClickPropagation(div);
+                L.DomEvent.on(button, 'click', function() { timer ? stop() : play(); });
+                L.DomEvent.on(slider, 'input', function() { stop(); show(parseInt(slider.value, 10)); });
+                return div;
+            };
+
+            var show = function(index) {
+                current = index;
+                layer.setStyle(style);
+                layer.eachLayer(function(l) { l.setTooltipContent(tooltip(l.feature)); });
+                slider.value = index;
+                label.textContent = data.years[index] + '年';
+            };
+            var play = function() {
+                button.textContent = '⏸';
+                timer = setInterval(function() { show((current + 1) % data.years.length); }, {{ this.interval }});
+            };
+            var stop = function() {
+                button.textContent = '▶';
+                clearInterval(timer);
+                timer = null;
+            };
+
+            var legend = L.control({position: 'topright'});
+            legend.onAdd = function() {
+                var div = L.DomUtil.create('div');
+                div.style.cssText = 'background: white; padding: 6px 8px; font-size: 12px; line-height: 18px;';
+                div.innerHTML = {{ this.legend_html|tojson }};
+                return div;
+            };
+            if (window.prefecture_legend) { window.prefecture_legend.remove(); }
+            legend.addTo(map);
+            window.prefecture_legend = legend;
+            panel.addTo(map);
+
+            // 後から読み込まれる境界データにも今の年の色とツールチップがつくようにする
+            layer.options.style = style;
+            var onAdd = function(e) { e.layer.setTooltipContent(tooltip(e.layer.feature)); };
+            layer.on('layeradd', onAdd);
+            show(current);
+            if (data.autoplay) { play(); }
+
+            window.prefecture_animation = {
+                remove: function() {
+                    stop();
+                    panel.remove();
+                    layer.off('layeradd', onAdd);
+                    layer.eachLayer(function(l) {
+                        l.setTooltipContent('都道府県: ' + l.feature.properties.nam_ja);
+                    });
+                    window.prefecture_animation = null;
+                }
+            };
+        })();
+        {% endmacro %}
+    ''')
+
+    def __init__(self, data, legend_html, interval=1000):
+        super().__init__()
+        self._name = 'PrefectureAnimation'
+        self.data = data
+        self.legend_html = legend_html
+        self.interval = int(interval)
+        self.nan_color = NAN_FILL_COLOR
+        self.fill_opacity = FILL_OPACITY
+        self.line_opacity = LINE_OPACITY
+
+
+def classify(values, bins=8, colormap='YlOrRd'):
+    """値を等間隔の階級に分け、各値の色と階級の境界・色を返す関数（folium.Choropleth と同じ分け方）"""
+    values = np.asarray(values, dtype=float)
+    _, edges = np.histogram(values[~np.isnan(values)], bins=bins)
+    palette = color_brewer(colormap, n=len(edges) - 1)
+    indices = class_indices(values, edges)
+    colors = [NAN_FILL_COLOR if index < 0 else palette[index] for index in indices]
+    return colors, edges, palette
+
+
+def class_indices(values, edges):
+    """各値が入る階級の番号（0から）を返す関数。値がないときは -1。"""
+    values = np.asarray(values, dtype=float)
+    # 最大値が最後の階級に入るように、右端をわずかに広げる
+    upper = edges.copy()
+    upper[-1] = np.nextafter(upper[-1], np.inf)
+    indices = np.clip(np.digitize(values, upper) - 1, 0, len(edges) - 2)
+    return np.where(np.isnan(values), -1, indices)
+
+
+def _legend_html(title, edges, palette):
+    """凡例のHTMLを作る"""
+    number_format = '{:,.1f}' if edges[-1] < 1000 else '{:,.0f}'
+    rows = [f'<b>{title}</b>']
+    for low, high, color in zip(edges[:-1], edges[1:], palette):
+        rows.append(f'<i style="display: inline-block; width: 14px; height: 14px; vertical-align: middle; '
+                    f'background: {color}; opacity: {FILL_OPACITY};"></i> '
+                    f'{number_format.format(low)} – {number_format.format(high)}')
+    return '<br>'.join(rows)
+
+
+def create_base_map(geometry_url=None, geo_data=None, location=None, zoom_start=DEFAULT_ZOOM):
+    """境界データの層だけを持つ地図を作成する関数（色は create_style_layer で塗る）"""
+    m = folium.Map(
+        location=location or DEFAULT_LOCATION,
+        zoom_start=zoom_start,
+        tiles='cartodbpositron'
+    )
+    PrefectureLayer(url=geometry_url, data=geo_data).add_to(m)
+    return m
+
+
+def create_municipality_map(bounds, chunk_url=None, levels=None, geo_data=None, pref_code=None, location=None,
+                            zoom_start=None):
+    """市区町村の境界データの層だけを持つ地図を作成する関数。
+
+    location と zoom_start を省略すると、範囲 bounds (西, 南, 東, 北) が収まるように表示する。
+    """
+    west, south, east, north = bounds
+    m = folium.Map(
+        location=location or [(south + north) / 2, (west + east) / 2],
+        zoom_start=zoom_start or DEFAULT_ZOOM,
+        tiles='cartodbpositron'
+    )
+    MunicipalityLayer(url=chunk_url, levels=levels, data=geo_data, pref_code=pref_code).add_to(m)
+    if location is None or zoom_start is None:
+        m.fit_bounds([[south, west], [north, east]])
+    return m
+
+
+def create_style_layer(data, column, title, colormap='YlOrRd', bins=8, key='pref_code', target='prefecture_layer'):
+    """都道府県ごとの色と凡例を更新する層（FeatureGroup）を作成する関数。
+
+    市区町村の地図では key='code', target='municipality_layer' を渡す。
+    """
+    colors, edges, palette = classify(data[column].to_numpy(), bins=bins, colormap=colormap)
+    layer = folium.FeatureGroup(name='style', control=False)
+    PrefectureStyle(dict(zip(data[key], colors)), _legend_html(title, edges, palette), target=target).add_to(layer)
+    return layer
+
+
+def create_animation_layer(series, title, colormap='YlOrRd', bins=8, start_year=None, autoplay=True,
+                           interval=1000, decimals=0):
+    """全年の色分けを再生する層（FeatureGroup）を作成する関数。
+
+    series は都道府県コード × 年の表（PopulationCube.series の戻り値）。階級は全年の値をまとめて分けるので、
+    年が変わっても同じ色は同じ値の範囲を表す。
+    """
+    values = series.to_numpy(dtype=float).T  # 年 × 都道府県
+    _, edges, palette = classify(values.ravel(), bins=bins, colormap=colormap)
+    classes = class_indices(values, edges)
+    years = [int(year) for year in series.columns]
+    rounded = np.round(values, decimals)
+    data = {
+        'codes': [str(code) for code in series.index],
+        'years': years,
+        'palette': palette,
+        'classes': classes.tolist(),
+        # 値がないところは null にする（ツールチップに出さない）
+        'values': [[None if np.isnan(v) else (int(v) if decimals == 0 else float(v)) for v in row] for row in rounded],
+        'start': years.index(start_year) if start_year in years else 0,
+        'autoplay': autoplay,
+    }
+    layer = folium.FeatureGroup(name='animation', control=False)
+    PrefectureAnimation(data, _legend_html(title, edges, palette), interval=interval).add_to(layer)
+    return layer
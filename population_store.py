@@ -0,0 +1,242 @@
+"""都道府県別人口（e-Stat）のローカル保存データと、その差分取り込みツール。
+
+ダッシュボード（population_map_dashboard.py）はここに保存したデータだけを読み、表示中にAPIを呼ばない。
+保存データがまだなければサンプルデータを表示する。
+
+コマンドラインから実行する（Streamlitは不要）:
+
+    ESTAT_APP_ID=... python population_store.py --stats-data-id 0003xxxxxx
+    python population_store.py --mock   # ローカルのモックサーバー（estat_mock.py）から取り込む動作確認
+
+取り込む統計表は「都道府県 × 年齢3区分（0～14歳, 15～64歳, 65歳以上）× 年」の人口の表（人口推計など）。
+分類は名前で判別し、年齢以外の分類（男女・国籍など）は「総数」「男女計」にあたる項目だけを使う。
+保存済みの年はAPIに問い合わせず、統計表に新しく加わった年だけを取得して追記する。
+
+保存先:
+
+    data/population/population.parquet   （year, pref_code, 人数の4列。取り込み元はメタデータに記録）
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+from estat_client import EStatClient, make_session
+from population_data import COUNT_COLUMNS, PREFECTURES, YEARS, PopulationCube, sample_population_frame
+
+# pyarrowは保存データを読み書きするときに読み込む（ページの起動を遅くしない）。なければ保存データは使わない
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# 保存先（環境変数で変更可能）
+DEFAULT_STORE_PATH = os.environ.get(
+    'POPULATION_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'population', 'population.parquet')
+)
+
+# 年齢区分の分類名と列名の対応（表記の揺れは _normalize でそろえる）
+AGE_CLASSES = {
+    '総数': 'total_population',
+    '0～14歳': 'population_0_14',
+    '15～64歳': 'population_15_64',
+    '65歳以上': 'population_65plus',
+}
+
+# 年齢以外の分類で「合計」にあたる項目の名前
+TOTAL_CLASS_NAMES = ('総数', '男女計', '総人口', '計')
+
+# 単位ごとの倍率（人口推計の表は千人単位）
+UNIT_SCALES = {'人': 1, '千人': 1000, '万人': 10000}
+
+# 都道府県の地域コード（5桁）
+PREFECTURE_AREA_CODES = {f'{code}000': code for code in PREFECTURES}
+
+
+def _normalize(name):
+    """分類名の表記の揺れ（波ダッシュ・ハイフン・空白）をそろえる"""
+    return name.replace('〜', '～').replace('~', '～').replace('-', '～').replace(' ', '').replace('　', '')
+
+
+def time_years(objects):
+    """時間軸の分類から {時間軸コード: 年} を返す関数（2020000000 → 2020）"""
+    return {c['code']: int(c['code'][:4]) for c in objects.get('time', {}).get('classes', [])}
+
+
+def resolve_classes(objects):
+    """分類を判別する関数。
+
+    戻り値は (年齢区分の分類ID, {コード: 列名}, {年齢以外の分類ID: 合計にあたるコード})。
+    """
+    age_id, age_codes, fixed = None, {}, {}
+    for dim_id, obj in objects.items():
+        if dim_id in ('area', 'time'):
+            continue
+        names = {_normalize(c['name']): c['code'] for c in obj['classes']}
+        matched = {names[name]: column for name, column in AGE_CLASSES.items() if name in names}
+        if age_id is None and len(matched) >= 3:
+            age_id, age_codes = dim_id, matched
+            continue
+        if len(obj['classes']) == 1:
+            fixed[dim_id] = obj['classes'][0]['code']
+            continue
+        totals = [names[name] for name in TOTAL_CLASS_NAMES if name in names]
+        if not totals:
+            raise ValueError(f"分類「{obj['name']}」の合計にあたる項目が見つかりません")
+        fixed[dim_id] = totals[0]
+    if age_id is None:
+        raise ValueError('年齢3区分（0～14歳, 15～64歳, 65歳以上）の分類が見つかりません')
+    return age_id, age_codes, fixed
+
+
+def filter_param(dim_id):
+    """分類IDを絞り込みのパラメータ名にする（cat01 → cdCat01, time → cdTime）"""
+    return 'cd' + dim_id[0].upper() + dim_id[1:]
+
+
+def values_to_frame(values, objects):
+    """統計データの値を year, pref_code, 人数の4列のDataFrameにする関数"""
+    age_id, age_codes, fixed = resolve_classes(objects)
+    years = time_years(objects)
+    records = []
+    for value in values:
+        if any(value.get(f'@{dim_id}') != code for dim_id, code in fixed.items()):
+            continue
+        column = age_codes.get(value.get(f'@{age_id}'))
+        pref_code = PREFECTURE_AREA_CODES.get(value.get('@area'))
+        if column is None or pref_code is None:
+            continue
+        try:
+            number = float(value['$'])
+        except (KeyError, ValueError):  # "-" や "***" などの秘匿・欠測
+            continue
+        records.append((years[value['@time']], pref_code, column, number * UNIT_SCALES.get(value.get('@unit'), 1)))
+
+    long = pd.DataFrame(records, columns=['year', 'pref_code', 'column', 'value'])
+    wide = long.pivot_table(index=['year', 'pref_code'], columns='column', values='value', aggfunc='first')
+    wide = wide.reindex(columns=COUNT_COLUMNS)
+    # 総数がない表では3区分の合計を総人口にする
+    wide['total_population'] = wide['total_population'].fillna(wide[COUNT_COLUMNS[1:]].sum(axis=1, min_count=3))
+    wide = wide.dropna()
+    frame = wide.round().astype('int64').reset_index()
+    frame.columns.name = None
+    return frame
+
+
+def read_store(path=DEFAULT_STORE_PATH):
+    """保存データを読む関数。戻り値は (DataFrame, メタデータの辞書)。なければ (None, {})。"""
+    if not HAS_PYARROW or not os.path.exists(path):
+        return None, {}
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    metadata = {key.decode(): value.decode() for key, value in (table.schema.metadata or {}).items()
+                if not key.startswith(b'pandas')}
+    return table.to_pandas(), metadata
+
+
+def write_store(frame, metadata, path=DEFAULT_STORE_PATH):
+    """保存データを書く関数。途中で止まっても壊れたファイルが残らないように置き換えで書く。"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    frame = frame.sort_values(['year', 'pref_code']).reset_index(drop=True)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        **{key.encode(): str(value).encode() for key, value in metadata.items()},
+    })
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def sync(client, stats_data_id, path=DEFAULT_STORE_PATH, force=False, log=print):
+    """統計表のうち保存データにない年だけを取得して追記する関数。取り込んだ年のリストを返す。"""
+    objects = client.get_meta_info(stats_data_id)
+    available = time_years(objects)
+    stored, metadata = read_store(path)
+    if stored is not None and (force or metadata.get('stats_data_id') != stats_data_id):
+        # 取り込み直し、または別の統計表に切り替えたときは全年を取り直す
+        stored = None
+    have = set(stored['year']) if stored is not None else set()
+    codes = [code for code, year in sorted(available.items(), key=lambda item: item[1]) if year not in have]
+    if not codes:
+        if not have:
+            log(f'統計表 {stats_data_id} に取り込める年がありません（時間軸の分類がないか、対象の年がありません）')
+        else:
+            log(f'新しい年はありません（保存済み: {min(have)}〜{max(have)}年）')
+        return []
+
+    # 年齢以外の分類と地域も絞り込んで、必要な値だけを取得する
+    _, _, fixed = resolve_classes(objects)
+    filters = {filter_param(dim_id): code for dim_id, code in fixed.items()}
+    filters['cdArea'] = ','.join(PREFECTURE_AREA_CODES)
+    filters['cdTime'] = ','.join(codes)
+    log(f"取得する年: {', '.join(str(available[code]) for code in codes)}")
+    fetched = values_to_frame(client.iter_values(stats_data_id, **filters), objects)
+
+    frames = [frame for frame in (stored, fetched) if frame is not None]
+    merged = pd.concat(frames, ignore_index=True).drop_duplicates(['year', 'pref_code'], keep='last')
+    write_store(merged, {
+        'source': 'e-Stat',
+        'stats_data_id': stats_data_id,
+        'synced_at': datetime.now().isoformat(timespec='seconds'),
+    }, path)
+    new_years = sorted(fetched['year'].unique().tolist())
+    log(f'{len(fetched)}件（{len(new_years)}年分）を取り込みました（APIリクエスト {client.requests}回）: {path}')
+    return new_years
+
+
+def load_cube(path=DEFAULT_STORE_PATH):
+    """保存データから人口データキューブを作る関数。保存データがなければサンプルデータを使う。
+
+    ネットワークには接続しない。戻り値は (PopulationCube, 取り込み元のメタデータ)。
+    """
+    stored, metadata = read_store(path)
+    # 47都道府県がそろっている年だけを使う
+    if stored is not None:
+        complete = stored.groupby('year')['pref_code'].transform('size') == len(PREFECTURES)
+        stored = stored[complete]
+    if stored is None or stored.empty:
+        return PopulationCube(sample_population_frame(YEARS)), {'source': 'sample'}
+    return PopulationCube(stored), metadata
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='e-Statの都道府県別人口をローカルの保存データに取り込みます')
+    parser.add_argument('--app-id', default=os.environ.get('ESTAT_APP_ID'),
+                        help='e-StatのアプリケーションID（省略時は環境変数 ESTAT_APP_ID）')
+    parser.add_argument('--stats-data-id', default=os.environ.get('ESTAT_STATS_DATA_ID'),
+                        help='統計表ID（省略時は環境変数 ESTAT_STATS_DATA_ID）')
+    parser.add_argument('--store', default=None, help=f'保存先（既定: {DEFAULT_STORE_PATH}）')
+    parser.add_argument('--force', action='store_true', help='保存済みの年も取り込み直す')
+    parser.add_argument('--mock', action='store_true',
+                        help='ローカルのモックサーバーから取り込む（--store を省略すると一時ファイルに保存）')
+    args = parser.parse_args(argv)
+
+    if not HAS_PYARROW:
+        parser.error('保存データの作成には pyarrow が必要です（pip install pyarrow）')
+
+    if args.mock:
+        from estat_mock import MockEStatServer
+        store = args.store or os.path.join(tempfile.mkdtemp(prefix='population'), 'population.parquet')
+        with MockEStatServer(sample_population_frame(YEARS), page_size=500, fail_every=4) as server:
+            session = make_session(backoff_factor=0.1)
+            client = EStatClient('mock', base_url=server.url, session=session, page_size=server.page_size)
+            sync(client, server.stats_data_id, store, force=args.force)
+            # 2回目は新しい年がないので、メタ情報を確認するだけで終わる
+            sync(EStatClient('mock', base_url=server.url, session=session), server.stats_data_id, store)
+        return 0
+
+    if not args.app_id or not args.stats_data_id:
+        parser.error('--app-id と --stats-data-id（または環境変数 ESTAT_APP_ID / ESTAT_STATS_DATA_ID）が必要です')
+    sync(EStatClient(args.app_id), args.stats_data_id, args.store or DEFAULT_STORE_PATH, force=args.force)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
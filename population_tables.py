@@ -0,0 +1,50 @@
+"""人口データの表を表示するための設定とページ分割。
+
+数値の列は数値のまま渡し、桁区切りなどの表示形式は st.dataframe の column_config（全件の表）か
+pandas の Styler（st.table で出す上位N件の表）で付ける。文字列に変換しないので、コピーも要らず、
+st.dataframe で列を並べ替えたときも数値の順になる。
+全件の表は PAGE_SIZE 行ずつ切り出して送る（市区町村単位の約1,700行になっても、表示のたびに全件は送らない）。
+"""
+import math
+
+import streamlit as st
+
+from population_data import COUNT_COLUMNS
+
+# 1ページに表示する行数
+PAGE_SIZE = 100
+
+# Styler 用の表示形式（str.format）
+STYLE_FORMATS = {
+    **{column: '{:,.0f}' for column in COUNT_COLUMNS},
+    'density': '{:.1f}',
+}
+
+# column_config 用の表示形式（printf 形式、"," は桁区切り）
+COLUMN_FORMATS = {
+    **{column: '%,d' for column in COUNT_COLUMNS},
+    'density': '%.1f',
+}
+
+
+def style_table(frame):
+    """数値の列に桁区切りなどの表示形式を付けた Styler を返す関数（値は数値のまま）"""
+    formats = {column: fmt for column, fmt in STYLE_FORMATS.items() if column in frame.columns}
+    return frame.style.format(formats)
+
+
+def column_config(columns):
+    """st.dataframe の column_config を返す関数"""
+    return {column: st.column_config.NumberColumn(format=COLUMN_FORMATS[column])
+            for column in columns if column in COLUMN_FORMATS}
+
+
+def page_count(n_rows, page_size=PAGE_SIZE):
+    """ページ数を返す関数（0行でも1ページ）"""
+    return max(1, math.ceil(n_rows / page_size))
+
+
+def page_rows(frame, page, page_size=PAGE_SIZE):
+    """page ページ目（1から）の行を返す関数"""
+    start = (page - 1) * page_size
+    return frame.iloc[start:start + page_size]
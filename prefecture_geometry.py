@@ -0,0 +1,222 @@
+"""都道府県の境界データ（GeoJSON）を詳細度ごとに簡略化して保存・読み込みする処理。
+
+元データ（dataofjapan/land の japan.geojson）から、隣り合う都道府県の境界線を共有したまま簡略化
+（shapely.coverage_simplify）し、座標を詳細度に合った桁数に丸めたGeoJSONを詳細度ごとに作る。
+ダッシュボードは表示のたびにGitHubから取得せず、ここで作ったファイルを使う（デプロイ時などに一度だけ下のコマンドで作っておく。
+ファイルがなければ、初回の表示のときに ensure_levels が別スレッドでダウンロードして作る）。Streamlitの静的ファイル配信
+（.streamlit/config.toml の server.enableStaticServing）が有効なら、ブラウザが level_url のURLから直接読み込み、
+無効ならサーバーがファイルを読んで（プロセスごとに1回だけ）地図に埋め込む。
+
+    python prefecture_geometry.py                         # 元データをダウンロードして作成
+    python prefecture_geometry.py --source japan.geojson  # 手元の元データから作成
+
+出力の構成（GEOMETRY_VERSION を上げると別のディレクトリに作り直す）:
+
+    static/geometry/v1/manifest.json
+    static/geometry/v1/prefectures_low.geojson
+
+各地物の属性は nam_ja（都道府県名）と id（2桁の都道府県コード、人口データの pref_code と同じ文字列）だけにする。
+shapely は作成するときだけ読み込む（ダッシュボードが作成済みのファイルを読むだけなら読み込まない）。
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+
+from static_files import STATIC_DIR, static_path_url
+
+# 境界データの保存先（環境変数で変更可能）
+DEFAULT_GEOMETRY_PATH = os.environ.get('PREFECTURE_GEOMETRY_PATH', os.path.join(STATIC_DIR, 'geometry'))
+
+# 簡略化の方法や属性を変えたら上げる（古いファイルは読まれなくなる）
+GEOMETRY_VERSION = 1
+
+SOURCE_URL = 'https://raw.githubusercontent.com/dataofjapan/land/master/japan.geojson'
+SOURCE_TIMEOUT = 60
+
+# 初回の表示での作成に失敗したとき、やり直すまでの秒数
+BUILD_RETRY_SECONDS = 300
+
+# 詳細度ごとの設定（max_zoom: この拡大率まで使う, tolerance: 簡略化の許容誤差[度], decimals: 座標の小数桁数）
+# 許容誤差は、その拡大率での1画素（ズーム5で約0.04度）より十分小さくしている
+LEVELS = {
+    'low': {'max_zoom': 5, 'tolerance': 0.01, 'decimals': 3},
+    'medium': {'max_zoom': 7, 'tolerance': 0.003, 'decimals': 4},
+    'high': {'max_zoom': 9, 'tolerance': 0.0008, 'decimals': 4},
+    'full': {'max_zoom': None, 'tolerance': 0.0, 'decimals': 5},
+}
+
+def version_dir(root=DEFAULT_GEOMETRY_PATH):
+    return os.path.join(root, f'v{GEOMETRY_VERSION}')
+
+
+def level_path(level, root=DEFAULT_GEOMETRY_PATH):
+    return os.path.join(version_dir(root), f'prefectures_{level}.geojson')
+
+
+def level_url(level, root=DEFAULT_GEOMETRY_PATH):
+    """詳細度 level のファイルを静的ファイル配信で読むときのURL（app/static/...）を返す関数。
+
+    保存先が static/ の下になければNoneを返す。
+    """
+    return static_path_url(level_path(level, root))
+
+
+def choose_level(zoom):
+    """地図の拡大率に合った詳細度の名前を返す関数"""
+    for name, settings in LEVELS.items():
+        if settings['max_zoom'] is None or zoom is None or zoom <= settings['max_zoom']:
+            return name
+    return name
+
+
+def download_source(url=SOURCE_URL, timeout=SOURCE_TIMEOUT):
+    """元データ（japan.geojson）をダウンロードしてバイト列で返す関数"""
+    import requests
+
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+def _feature_props(props):
+    """元データの属性から、残す属性（都道府県名と2桁の都道府県コード）を作る"""
+    return {'nam_ja': props['nam_ja'], 'id': f"{int(props['id']):02d}"}
+
+
+def build_levels(source_bytes, root=DEFAULT_GEOMETRY_PATH):
+    """元データから詳細度ごとのGeoJSONとmanifest.jsonを作る関数。manifestの内容を返す。"""
+    import shapely
+    from shapely.geometry import mapping
+
+    source = json.loads(source_bytes)
+    features = sorted(source['features'], key=lambda feature: int(feature['properties']['id']))
+    props = [_feature_props(feature['properties']) for feature in features]
+    geometries = shapely.make_valid(shapely.from_geojson(
+        [json.dumps(feature['geometry']) for feature in features]))
+
+    out_dir = version_dir(root)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {
+        'version': GEOMETRY_VERSION,
+        'source_sha1': hashlib.sha1(source_bytes).hexdigest(),
+        'source_bytes': len(source_bytes),
+        'source_vertices': int(shapely.get_num_coordinates(geometries).sum()),
+        'levels': {},
+    }
+    for name, settings in LEVELS.items():
+        simplified = geometries
+        if settings['tolerance'] > 0:
+            # 境界線を隣の都道府県と共有したまま簡略化する（すき間や重なりができない）
+            simplified = shapely.coverage_simplify(geometries, settings['tolerance'])
+        # 座標を格子に丸める（共有している頂点は同じ値に丸まる）
+        simplified = shapely.set_precision(simplified, 10.0 ** -settings['decimals'])
+        collection = {
+            'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'properties': prop, 'geometry': mapping(geometry)}
+                         for prop, geometry in zip(props, simplified)],
+        }
+        path = level_path(name, root)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(collection, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        manifest['levels'][name] = {
+            **settings,
+            'file': os.path.basename(path),
+            'bytes': os.path.getsize(path),
+            'vertices': int(shapely.get_num_coordinates(simplified).sum()),
+        }
+
+    # manifest.json を最後に置き換える（available は全ての詳細度が揃ってから True になる）
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    tmp_path = f'{manifest_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def available(root=DEFAULT_GEOMETRY_PATH):
+    """都道府県の境界データが作成済みかどうかを返す関数"""
+    return os.path.exists(os.path.join(version_dir(root), 'manifest.json'))
+
+
+# 初回の表示での作成の状態（保存先ごと。プロセス内のセッションで共有する）
+_build_lock = threading.Lock()
+_builds = {}
+
+
+def _build_in_background(root):
+    try:
+        build_levels(download_source(), root)
+        error = None
+    except Exception as e:
+        error = e
+    with _build_lock:
+        _builds[root] = {'thread': None, 'error': error, 'finished': time.monotonic()}
+
+
+def ensure_levels(root=DEFAULT_GEOMETRY_PATH):
+    """境界データが作成済みか確かめ、なければ別スレッドで作成を始める関数。
+
+    (作成済みかどうか, 直近の作成に失敗したときの例外) を返す。作成はプロセスごとに1つのスレッドだけで行い、
+    失敗したときは BUILD_RETRY_SECONDS 秒たってから呼ばれたときにやり直す。
+    """
+    if available(root):
+        return True, None
+    with _build_lock:
+        build = _builds.get(root)
+        if build is None or (build['thread'] is None and build['error'] is not None
+                             and time.monotonic() - build['finished'] >= BUILD_RETRY_SECONDS):
+            thread = threading.Thread(target=_build_in_background, args=(root,), daemon=True,
+                                      name='prefecture-geometry-build')
+            build = _builds[root] = {'thread': thread, 'error': None, 'finished': None}
+            thread.start()
+    return available(root), build['error']
+
+
+@lru_cache(maxsize=None)
+def load_level(level, root=DEFAULT_GEOMETRY_PATH):
+    """詳細度 level の境界データ（GeoJSONの辞書）を読み込む関数。プロセスごとに1回だけ読む。
+
+    返す辞書は共有されるので、書き換えないこと。
+    """
+    if level not in LEVELS:
+        raise ValueError(f"未対応の詳細度です: {level}")
+    if not available(root):
+        raise FileNotFoundError(f'都道府県の境界データがありません（{version_dir(root)}）。'
+                                f'先に python prefecture_geometry.py で作成してください')
+    with open(level_path(level, root), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='都道府県の境界データを詳細度ごとに簡略化して保存します。')
+    parser.add_argument('--source', default=None, help='元データのGeoJSONファイル（省略時はダウンロード）')
+    parser.add_argument('--root', default=DEFAULT_GEOMETRY_PATH, help=f'保存先（既定: {DEFAULT_GEOMETRY_PATH}）')
+    args = parser.parse_args(argv)
+
+    if args.source:
+        with open(args.source, 'rb') as f:
+            source_bytes = f.read()
+    else:
+        print(f'ダウンロード中: {SOURCE_URL}')
+        source_bytes = download_source()
+
+    manifest = build_levels(source_bytes, args.root)
+    print(f"元データ: {manifest['source_bytes'] / 1024:8.0f} KB, {manifest['source_vertices']:8,d} 頂点")
+    for name, info in manifest['levels'].items():
+        print(f"  {name:<7} {info['bytes'] / 1024:8.0f} KB, {info['vertices']:8,d} 頂点 "
+              f"(許容誤差 {info['tolerance']}度, 小数 {info['decimals']} 桁)")
+    print(f'保存先: {version_dir(args.root)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
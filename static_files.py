@@ -0,0 +1,33 @@
+"""Streamlitの静的ファイル配信（アプリと同じ場所の static/ を app/static/ で配信）のパスとURL。
+
+配信されるのは .streamlit/config.toml の server.enableStaticServing が有効なときだけ。
+static_path_url はStreamlitに依存しないので、境界データの作成ツールなどからも使える。
+"""
+import os
+
+# Streamlitが静的ファイルとして配信するディレクトリ
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+
+def static_path_url(path):
+    """static/ の下のファイル・ディレクトリを配信するパス（app/static/...）を返す関数。
+
+    static/ の下になければNoneを返す。
+    """
+    relative = os.path.relpath(path, STATIC_DIR)
+    if relative.startswith(os.pardir):
+        return None
+    return 'app/static/' + relative.replace(os.sep, '/')
+
+
+def static_url(url):
+    """app/static/... のパスを、ブラウザから読めるURL（server.baseUrlPath 付き）にする関数。
+
+    静的ファイル配信が無効なとき、または url がNoneのときはNoneを返す。
+    """
+    import streamlit as st
+
+    if url is None or not st.get_option('server.enableStaticServing'):
+        return None
+    base_path = st.get_option('server.baseUrlPath').strip('/')
+    return '/' + (base_path + '/' if base_path else '') + url
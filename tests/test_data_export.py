@@ -0,0 +1,49 @@
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_export import HAS_PYARROW, export_file
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 1003
+    return pd.DataFrame({
+        'code': [f'{i:05d}' for i in range(n)],
+        'name': [f'市区町村{i}, "第{i % 7}"' if i % 5 else '改行\nを含む' for i in range(n)],
+        'population': rng.integers(0, 10 ** 7, n),
+        'density': np.where(np.arange(n) % 11 == 0, np.nan, rng.random(n) * 1000),
+        'year': 2020,
+    })
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, 1000, 50000])
+def test_csv_is_identical_to_to_csv(frame, chunk_rows):
+    """行ごとに分けて書き出しても、to_csv と同じバイト列になる"""
+    expected = frame.to_csv(index=False).encode('utf-8')
+    assert export_file(frame, 'csv', chunk_rows=chunk_rows) == expected
+    assert gzip.decompress(export_file(frame, 'csv.gz', chunk_rows=chunk_rows)) == expected
+
+
+def test_csv_gzip_is_deterministic(frame):
+    assert export_file(frame, 'csv.gz') == export_file(frame, 'csv.gz')
+
+
+def test_empty_frame_writes_header(frame):
+    empty = frame.iloc[:0]
+    assert export_file(empty, 'csv') == empty.to_csv(index=False).encode('utf-8')
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason='pyarrowがない')
+def test_parquet_round_trip(frame):
+    restored = pd.read_parquet(io.BytesIO(export_file(frame, 'parquet', chunk_rows=100)))
+    pd.testing.assert_frame_equal(restored, frame)
+
+
+def test_unknown_format(frame):
+    with pytest.raises(ValueError):
+        export_file(frame, 'xlsx')
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from figure_render import FigureRenderer, cache_key
+
+calls = []
+
+
+def draw_line(df, title, color='C0'):
+    """呼ばれた回数を記録して、DataFrame の折れ線の図を返す"""
+    calls.append(title)
+    fig = Figure(figsize=(2, 1))
+    ax = fig.add_subplot()
+    ax.plot(df['x'], df['y'], color=color)
+    ax.set_title(title)
+    return fig
+
+
+def frame(scale=1.0):
+    x = np.arange(10)
+    return pd.DataFrame({'x': x, 'y': x * scale})
+
+
+def render(renderer, df, title, **kwargs):
+    return renderer.render(draw_line, df, title, dpi=20, **kwargs)
+
+
+def test_identical_inputs_hit_the_cache():
+    """内容が同じなら別のDataFrameでも描き直さずに同じ画像を返す"""
+    calls.clear()
+    renderer = FigureRenderer()
+    image = render(renderer, frame(), 'a')
+    assert image.startswith(b'\x89PNG')
+    assert render(renderer, frame(), 'a') is image
+    assert calls == ['a']
+    stats = renderer.stats()
+    assert (stats['hits'], stats['renders'], stats['entries'], stats['bytes']) == (1, 1, 1, len(image))
+
+
+def test_changed_inputs_miss_the_cache():
+    """データ・引数・形式が変われば描き直す"""
+    calls.clear()
+    renderer = FigureRenderer()
+    render(renderer, frame(), 'a')
+    render(renderer, frame(2.0), 'a')
+    render(renderer, frame().astype({'y': 'float32'}), 'a')
+    render(renderer, frame(), 'b')
+    render(renderer, frame(), 'a', color='C1')
+    svg = renderer.render(draw_line, frame(), 'a', fmt='svg', dpi=20)
+    assert b'<svg' in svg
+    assert len(calls) == 6
+    assert renderer.stats()['hits'] == 0
+
+
+def test_cache_key_ignores_keyword_order():
+    """キーワード引数の順番はキーに影響しない"""
+    assert (cache_key(draw_line, (frame(),), {'a': 1, 'b': 2}, 'png', 20)
+            == cache_key(draw_line, (frame(),), {'b': 2, 'a': 1}, 'png', 20))
+
+
+def test_evicts_least_recently_used_by_entries():
+    """画像の数が上限を超えたら、最も長く使われていないものから消す"""
+    calls.clear()
+    renderer = FigureRenderer(max_entries=2)
+    render(renderer, frame(), 'a')
+    render(renderer, frame(), 'b')
+    render(renderer, frame(), 'a')  # a を最近使ったものにする
+    render(renderer, frame(), 'c')  # b が消える
+    assert renderer.stats()['entries'] == 2
+    render(renderer, frame(), 'a')
+    render(renderer, frame(), 'b')
+    assert calls == ['a', 'b', 'c', 'b']
+
+
+def test_evicts_by_bytes():
+    """バイト数が上限を超えたら古いものから消し、上限より大きい画像は保存しない"""
+    calls.clear()
+    size = len(render(FigureRenderer(), frame(), 'size'))
+    renderer = FigureRenderer(max_bytes=int(size * 2.5))
+    for title in ['a', 'b', 'c']:
+        render(renderer, frame(), title)
+    stats = renderer.stats()
+    assert stats['entries'] == 2 and stats['bytes'] <= renderer.max_bytes
+    render(renderer, frame(), 'a')
+    assert calls.count('a') == 2
+
+    tiny = FigureRenderer(max_bytes=size // 2)
+    render(tiny, frame(), 'a')
+    assert tiny.stats()['entries'] == 0 and tiny.stats()['bytes'] == 0
+
+
+def test_none_figure_is_not_cached():
+    """描画関数がNoneを返したら保存しない"""
+    renderer = FigureRenderer()
+    assert renderer.render(lambda: None) is None
+    assert renderer.render(lambda: None) is None
+    assert renderer.stats()['renders'] == 2 and renderer.stats()['entries'] == 0
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from benchmarks.fixtures import make_jma_page
+from jma_table_parser import DEFAULT_COLUMNS, HAS_LXML, parse_daily_columns
+
+BACKENDS = ['bs4'] + (['lxml'] if HAS_LXML else [])
+
+# make_jma_page の見出しから決まる列の位置
+HEADER_COLUMNS = {'max_temp': 7, 'min_temp': 8, 'weather_day': 20, 'weather_night': 21}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_columns_from_header_rows(backend):
+    """2段組の見出し行から最高/最低気温と昼/夜の天気の列を決める"""
+    result = parse_daily_columns(make_jma_page(2023, 7), backend=backend)
+    assert result.diagnostics['columns'] == HEADER_COLUMNS
+    assert result.diagnostics['first_headers'][3] == '気温(℃)'
+    assert len(result.day) == 31
+    # 天気の列は見出しで決めた位置から読む（既定の位置には数値の列がある）
+    assert set(result.weather_day) - {'1'} == set(result.weather_day)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_default_columns_without_header_rows(backend):
+    """見出し行が検出できなければ既定の列の位置を使う"""
+    result = parse_daily_columns(make_jma_page(2023, 7, header_class='mtx'), backend=backend)
+    assert result.diagnostics['columns'] == DEFAULT_COLUMNS
+    assert len(result.day) == 31
+
+
+@pytest.mark.skipif(not HAS_LXML, reason='lxmlがない')
+@pytest.mark.parametrize('month', [2, 7, 12])
+def test_backends_agree(month):
+    """lxmlとBeautifulSoupで同じ結果になる"""
+    html = make_jma_page(2020, month)
+    fast, slow = parse_daily_columns(html, backend='lxml'), parse_daily_columns(html, backend='bs4')
+    for field in ('day', 'max_temp', 'min_temp', 'weather_day', 'weather_night'):
+        np.testing.assert_array_equal(getattr(fast, field), getattr(slow, field))
+
+
+def test_missing_table():
+    assert parse_daily_columns('<html><body></body></html>') is None
@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pytest
+
+from julia_cache import ANIMATION_DIR, FrameCache, frame_key, prune_directory, publish_animation, to_uint8
+from static_files import static_path_url
+
+
+def frames(value, n=4, size=(8, 16)):
+    return np.full((n,) + size, value, dtype=np.uint8)
+
+
+def test_frame_key_ignores_float_noise_and_order():
+    assert frame_key(iterations=10, separation=0.7885) == frame_key(separation=0.7885000000001, iterations=10)
+    assert frame_key(iterations=10, separation=0.7885) != frame_key(iterations=10, separation=0.79)
+
+
+def test_to_uint8_truncates_like_streamlit():
+    np.testing.assert_array_equal(to_uint8(np.array([-0.5, 0.0, 0.5, 0.999, 1.0, 2.0])), [0, 0, 127, 254, 255, 255])
+
+
+def test_memory_lru_evicts_by_bytes():
+    """合計バイト数が上限を超えたら、最も長く使われていないフレーム列から捨てる"""
+    size = frames(0).nbytes
+    cache = FrameCache(max_bytes=3 * size, cache_dir=None)
+    for key in 'abc':
+        cache.put(key, frames(ord(key)))
+    assert len(cache) == 3 and cache.nbytes == 3 * size
+
+    assert cache.get('a') is not None  # a を最近使ったものにする
+    cache.put('d', frames(1))
+    assert cache.get('b') is None
+    assert [cache.get(key)[0, 0, 0] for key in 'acd'] == [ord('a'), ord('c'), 1]
+    assert cache.nbytes == 3 * size
+
+    # 大きなフレーム列は2つ分の場所を空けて入る
+    cache.put('e', frames(2, n=8))
+    assert len(cache) == 2 and cache.nbytes == 3 * size
+    assert cache.get('a') is None and cache.get('c') is None
+    assert (cache.hits, cache.misses) == (4, 3)
+
+
+def test_oversized_sequence_is_not_kept_in_memory():
+    cache = FrameCache(max_bytes=frames(0).nbytes - 1, cache_dir=None)
+    cache.put('a', frames(0))
+    assert len(cache) == 0 and cache.get('a') is None
+
+
+def test_put_replaces_and_frames_are_read_only():
+    cache = FrameCache(cache_dir=None)
+    cache.put('a', frames(1))
+    cache.put('a', frames(2, n=2))
+    stored = cache.get('a')
+    assert stored.shape[0] == 2 and cache.nbytes == stored.nbytes
+    with pytest.raises(ValueError):
+        stored[0, 0, 0] = 0
+
+
+def test_disk_cache_survives_new_instance(tmp_path):
+    first = FrameCache(cache_dir=str(tmp_path))
+    first.put('a', frames(7))
+    second = FrameCache(cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(second.get('a'), frames(7))
+    assert (second.disk_hits, second.misses) == (1, 0)
+    assert second.get('a') is not None and second.hits == 1
+    assert second.get('b') is None and second.misses == 1
+
+
+def test_disk_cache_prunes_oldest_files(tmp_path):
+    """ディスク側も合計バイト数の上限を超えたら、更新の古いファイルから削除する"""
+    rng = np.random.default_rng(0)
+    noisy = [rng.integers(0, 256, (4, 64, 64), dtype=np.uint8) for _ in range(4)]
+    cache = FrameCache(cache_dir=str(tmp_path), max_disk_bytes=10 ** 9)
+    cache.put('probe', noisy[0])
+    file_size = os.path.getsize(cache._disk_path('probe'))
+    os.remove(cache._disk_path('probe'))
+
+    cache = FrameCache(max_bytes=0, cache_dir=str(tmp_path), max_disk_bytes=int(file_size * 2.5))
+    for i, key in enumerate('abc'):
+        cache.put(key, noisy[i])
+        os.utime(cache._disk_path(key), (1000 + i, 1000 + i))
+    assert not os.path.exists(cache._disk_path('a'))
+    assert os.path.exists(cache._disk_path('b')) and os.path.exists(cache._disk_path('c'))
+
+    # 読み込んだファイルは新しい扱いになり、次に消えるのは読んでいない方
+    assert cache.get('b') is not None
+    cache.put('d', noisy[3])
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(cache._disk_path(key)) for key in 'bd')
+
+
+def test_prune_directory_ignores_other_files(tmp_path):
+    for i, name in enumerate(['a.npz', 'b.npz', 'keep.txt', 'c.123.tmp.npz']):
+        path = tmp_path / name
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (1000 + i, 1000 + i))
+    prune_directory(str(tmp_path), '.npz', 150)
+    assert sorted(os.listdir(tmp_path)) == ['b.npz', 'c.123.tmp.npz', 'keep.txt']
+
+
+def test_publish_animation_writes_once(tmp_path):
+    """同じキー・形式・配色のアニメーションは一度だけエンコードし、既存のファイルを使い回す"""
+    calls = []
+
+    def encode():
+        calls.append(1)
+        return b'GIF89a' + bytes(100)
+
+    path = publish_animation(('a', 1), 'gif', 'gray', encode, directory=str(tmp_path))
+    assert os.path.dirname(path) == str(tmp_path) and path.endswith('.gif')
+    assert publish_animation(('a', 1), 'gif', 'gray', encode, directory=str(tmp_path)) == path
+    assert len(calls) == 1
+    assert publish_animation(('a', 1), 'gif', 'magma', encode, directory=str(tmp_path)) != path
+    assert len(os.listdir(tmp_path)) == 2  # 書き込み途中の一時ファイルは残らない
+
+
+def test_animation_dir_is_served_as_static():
+    assert static_path_url(os.path.join(ANIMATION_DIR, 'x.webp')) == 'app/static/animations/x.webp'
+    assert static_path_url(os.path.dirname(ANIMATION_DIR) + '_other') is None
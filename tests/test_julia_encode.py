@@ -0,0 +1,49 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+from julia_encode import ANIMATION_FORMATS, PALETTES, FrameEncoder, encode_animation, make_palette
+
+
+def frame_sequence(n=5, height=24, width=40, seed=0):
+    # 反復回数の段階と同じく、少ない階調のフレーム
+    rng = np.random.default_rng(seed)
+    return (rng.integers(0, 11, (n, height, width)) * 25).astype(np.uint8)
+
+
+@pytest.mark.parametrize('palette', PALETTES)
+def test_palette_png_round_trip(palette):
+    """パレット付きPNGは元の値（パレットの番号）とパレットをそのまま復元できる"""
+    frames = frame_sequence()
+    encoder = FrameEncoder(40, 24, palette)
+    for frame in frames:  # バッファを使い回しても前のフレームが残らない
+        image = Image.open(io.BytesIO(encoder.encode(frame)))
+        assert image.format == 'PNG' and image.mode == 'P' and image.size == (40, 24)
+        np.testing.assert_array_equal(np.asarray(image), frame)
+        assert bytes(image.getpalette()[:768]) == make_palette(palette)
+
+
+def test_gray_palette_matches_grayscale():
+    frame = frame_sequence(n=1)[0]
+    image = Image.open(io.BytesIO(FrameEncoder(40, 24).encode(frame)))
+    np.testing.assert_array_equal(np.asarray(image.convert('L')), frame)
+
+
+@pytest.mark.parametrize('fmt', list(ANIMATION_FORMATS))
+def test_animation_keeps_every_frame(fmt):
+    """アニメーション画像は全フレームを順に持ち、ループ再生する"""
+    frames = frame_sequence(n=7)
+    image = Image.open(io.BytesIO(encode_animation(frames, fmt, palette='gray', duration=40)))
+    assert image.format == fmt.upper()
+    assert image.n_frames == len(frames)
+    assert image.info.get('loop') == 0
+    for decoded, frame in zip(ImageSequence.Iterator(image), frames):
+        # WebPは可逆圧縮、GIFはパレットのまま保存するので、灰色のパレットなら値が戻る
+        np.testing.assert_array_equal(np.asarray(decoded.convert('L')), frame)
+
+
+def test_animation_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        encode_animation(frame_sequence(), 'apng')
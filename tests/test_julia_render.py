@@ -0,0 +1,102 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import julia_render
+from julia_cache import to_uint8
+from julia_render import (SMOOTH_BAILOUT, frame_image, grid, julia_counts, julia_counts_reference, julia_counts_tiled,
+                          render_frames, smooth_counts)
+
+# 小さな画像で、アニメーションと同じ c の軌道上の数点（集合の内側に周期軌道を持つ c も含む）を調べる
+X, Y = grid(96, 64, 40)
+CS = 0.7885 * np.exp(1j * np.linspace(0.0, 2 * np.pi, 8, endpoint=False))
+
+
+def smooth_counts_plain(x, y, c, iterations):
+    """帯に分けず、周期軌道の検出もしない smooth_counts と同じ計算（complex64）"""
+    z = x.astype(np.float32)[None, :] + np.complex64(1j) * y.astype(np.float32)[:, None]
+    c = np.complex64(c)
+    nu = np.full(z.shape, np.inf, dtype=np.float32)
+    alive = np.ones(z.shape, dtype=bool)
+    for i in range(iterations):
+        z[alive] = z[alive] * z[alive] + c
+        magnitude = z.real * z.real + z.imag * z.imag
+        escaped = alive & (magnitude > SMOOTH_BAILOUT ** 2)
+        nu[escaped] = np.maximum(i + 1 - np.log2(0.5 * np.log(magnitude[escaped])), 0.0)
+        alive &= ~escaped
+    bounded = np.isinf(nu)
+    values = np.log1p(nu)
+    peak = values[~bounded].max(initial=0.0)
+    if peak > 0:
+        values /= peak
+    values[bounded] = 1.0
+    return values
+
+
+@pytest.mark.parametrize('iterations', [2, 10, 20, 300])
+def test_compacted_matches_reference(iterations):
+    """点を詰める実装は元の実装と同じ反復回数・同じ画像になる"""
+    for c in CS:
+        reference = julia_counts_reference(X, Y, c, iterations)
+        counts = julia_counts(X, Y, c, iterations)
+        np.testing.assert_array_equal(counts, reference)
+        np.testing.assert_array_equal(frame_image(counts), to_uint8(1.0 - reference / reference.max()))
+
+
+@pytest.mark.parametrize('iterations', [2, 10, 20])
+@pytest.mark.parametrize('separation', [0.7, 0.7885, 1.3, 2.0])
+def test_tiled_matches_compacted(iterations, separation):
+    """タイル分割の実装は全画素を計算した場合と同じ反復回数になる"""
+    for c in separation * np.exp(1j * np.linspace(0.0, 2 * np.pi, 5, endpoint=False)):
+        np.testing.assert_array_equal(julia_counts_tiled(X, Y, c, iterations), julia_counts(X, Y, c, iterations))
+
+
+@pytest.mark.parametrize('tile', [4, 32, 48])
+def test_tiled_keeps_islands_in_large_tiles(tile):
+    """外周が途中の同じ反復回数で発散した大きなタイルでも、内側の島を取りこぼさない"""
+    for separation in [0.7885, 1.0, 1.3, 2.0]:
+        for c in separation * np.exp(1j * np.linspace(0.0, 2 * np.pi, 12, endpoint=False)):
+            for iterations in [3, 10, 20]:
+                np.testing.assert_array_equal(julia_counts_tiled(X, Y, c, iterations, tile=tile),
+                                              julia_counts(X, Y, c, iterations))
+
+
+@pytest.mark.parametrize('iterations', [50, 1000])
+def test_smooth_matches_plain(iterations):
+    """帯ごとの計算と周期軌道での打ち切りは、連続的な反復回数を変えない"""
+    for c in CS:
+        np.testing.assert_allclose(smooth_counts(X, Y, c, iterations, band_rows=16),
+                                   smooth_counts_plain(X, Y, c, iterations), rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('value, expected', [('3', 3), ('abc', None), ('-2', None), ('', None)])
+def test_default_workers_from_environment(monkeypatch, value, expected):
+    """正しくない JULIA_RENDER_WORKERS はCPUコア数にする（importで失敗しない）"""
+    monkeypatch.setenv('JULIA_RENDER_WORKERS', value)
+    assert julia_render._default_workers() == (expected or os.cpu_count() or 1)
+
+
+def test_pool_workers_do_not_run_the_page(tmp_path, monkeypatch):
+    """Streamlitのページ（__file__ 付きの __main__）から使っても、ワーカーはページを実行しない"""
+    marker = tmp_path / 'page_ran'
+    script = tmp_path / 'page.py'
+    script.write_text(f'open({str(marker)!r}, "w").close()\n')
+    page = types.ModuleType('__main__')
+    page.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, '__main__', page)
+
+    cs = CS[:4]
+    try:
+        frames = list(render_frames(cs, 10, 96, 64, 40, max_workers=2))
+        pool = julia_render.get_process_pool(2)
+        # ワーカーはプールの作成時に全て起動済み（描画中に追加で起動しない）
+        assert len(pool._processes) == 2
+    finally:
+        julia_render._discard_pool(julia_render.get_process_pool(2))
+    assert not marker.exists()
+    assert sys.modules['__main__'] is page
+    for frame, expected in zip(frames, render_frames(cs, 10, 96, 64, 40, max_workers=1)):
+        np.testing.assert_array_equal(frame, expected)
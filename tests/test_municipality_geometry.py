@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import municipality_geometry
+from benchmarks.fixtures import write_municipality_geojson
+from population_data import PREFECTURES
+
+pytest.importorskip('geopandas')
+shapely = pytest.importorskip('shapely')
+from shapely.geometry import box, shape  # noqa: E402
+
+PER_SIDE = 3
+
+
+@pytest.fixture(scope='module')
+def built(tmp_path_factory):
+    """都道府県ごとに 3 × 3 の市区町村を並べた元データから作った境界データ"""
+    tmp = tmp_path_factory.mktemp('municipalities')
+    source = write_municipality_geojson(str(tmp / 'N03.geojson'), per_side=PER_SIDE, points_per_edge=8)
+    root = str(tmp / 'out')
+    return root, municipality_geometry.build_levels(source, root)
+
+
+def test_cell_keys():
+    """範囲にかかるマス目を、負の座標も含めて床関数で番号付けする"""
+    assert municipality_geometry.cell_keys((139.1, 35.2, 140.3, 35.9), 0.5) == [
+        '278_70', '278_71', '279_70', '279_71', '280_70', '280_71']
+    assert municipality_geometry.cell_keys((-0.5, -0.5, 0.5, 0.5), 1.0) == ['-1_-1', '-1_0', '0_-1', '0_0']
+
+
+def test_split_and_uncoded_features(built):
+    """2つの地物に分かれた市区町村は1つにまとめ、市区町村コードのない地物は使わない"""
+    root, manifest = built
+    assert manifest['municipalities'] == len(PREFECTURES) * PER_SIDE ** 2
+    table = municipality_geometry.load_municipalities(root)
+    assert table['code'].is_unique
+    assert table['code'].str.fullmatch(r'\d{5}').all()
+    assert (table['code'].str[:2] == table['pref_code']).all()
+    first = table.set_index('code').loc['01001']
+    assert first['area'] > 0
+
+    features = municipality_geometry.load_features('full', manifest['prefecture_bounds']['01'], '01', root)
+    geometry = shape(next(f for f in features['features'] if f['properties']['id'] == '01001')['geometry'])
+    assert geometry.geom_type == 'Polygon'
+    assert geometry.area == pytest.approx((1.6 / PER_SIDE) ** 2, rel=1e-3)
+
+
+def test_cells_hold_exactly_the_intersecting_municipalities(built):
+    """各マス目には、そのマス目に重なる市区町村がすべて、重なるものだけ入っている"""
+    root, manifest = built
+    for level, settings in manifest['levels'].items():
+        cell = settings['cell']
+        stored = {}
+        for key in settings['chunks']:
+            with open(municipality_geometry.chunk_path(level, key, root), encoding='utf-8') as f:
+                for feature in json.load(f)['features']:
+                    stored.setdefault(feature['properties']['id'], (shape(feature['geometry']), set()))[1].add(key)
+        assert len(stored) == manifest['municipalities']
+        for code, (geometry, keys) in stored.items():
+            expected = {key for key in municipality_geometry.cell_keys(geometry.bounds, cell)
+                        if geometry.intersects(box(*(int(part) * cell for part in key.split('_')),
+                                                   *((int(part) + 1) * cell for part in key.split('_'))))}
+            assert keys == expected, (level, code)
+
+
+def test_load_features_filters_and_deduplicates(built):
+    """範囲にかかるマス目の地物を1回ずつ集め、pref_code の都道府県だけにする"""
+    root, manifest = built
+    bounds = manifest['prefecture_bounds']['13']
+    for level in municipality_geometry.LEVELS:
+        features = municipality_geometry.load_features(level, bounds, '13', root)['features']
+        ids = [feature['properties']['id'] for feature in features]
+        assert len(ids) == len(set(ids)) == PER_SIDE ** 2
+        assert {feature['properties']['pref'] for feature in features} == {'13'}
+    unfiltered = municipality_geometry.load_features('low', bounds, root=root)['features']
+    assert len(unfiltered) >= PER_SIDE ** 2
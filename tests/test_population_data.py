@@ -0,0 +1,98 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from population_data import PREFECTURES, YEARS, PopulationCube, fetch_population_data, sample_population_frame
+
+COUNT_COLUMNS = ['total_population', 'population_0_14', 'population_15_64', 'population_65plus']
+
+
+def legacy_population_data(year):
+    """以前のダッシュボードの fetch_population_data（年ごとに random.seed(年) から作る）"""
+    population_data = {
+        '01': {'total': 5250000, '0-14': 550000, '15-64': 3100000, '65+': 1600000},
+        '13': {'total': 14000000, '0-14': 1600000, '15-64': 9000000, '65+': 3400000},
+        '23': {'total': 7550000, '0-14': 1050000, '15-64': 4800000, '65+': 1700000},
+        '27': {'total': 8800000, '0-14': 1150000, '15-64': 5500000, '65+': 2150000},
+    }
+    rnd = random.Random(year)
+    rows = []
+    for pref_code, info in PREFECTURES.items():
+        if pref_code not in population_data:
+            area = info['area']
+            base = rnd.uniform(0.8, 1.2)
+            if info['region'] in ['関東', '近畿', '中部']:
+                base_population = min(3000000 + area * 50 * base, 8000000)
+            else:
+                base_population = min(800000 + area * 20 * base, 2500000)
+            total = int(base_population)
+            children = int(total * rnd.uniform(0.1, 0.15))
+            elderly = int(total * rnd.uniform(0.2, 0.35))
+            population_data[pref_code] = {'total': total, '0-14': children, '15-64': total - children - elderly,
+                                          '65+': elderly}
+        rows.append({
+            'pref_code': pref_code,
+            'prefecture': info['name'],
+            'region': info['region'],
+            'area': info['area'],
+            'total_population': population_data[pref_code]['total'],
+            'population_0_14': population_data[pref_code]['0-14'],
+            'population_15_64': population_data[pref_code]['15-64'],
+            'population_65plus': population_data[pref_code]['65+'],
+            'year': year,
+        })
+
+    year_diff = year - 2015
+    for data in rows:
+        change_factor = 1.0 + (year_diff * rnd.uniform(-0.01, 0.02))
+        data['total_population'] = int(data['total_population'] * change_factor)
+        data['population_0_14'] = int(data['population_0_14'] * max(0.95, change_factor * 0.97))
+        data['population_65plus'] = int(data['population_65plus'] * min(1.1, change_factor * 1.03))
+        data['population_15_64'] = data['total_population'] - data['population_0_14'] - data['population_65plus']
+        data['density'] = data['total_population'] / data['area']
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture(scope='module')
+def cube():
+    return PopulationCube(sample_population_frame(YEARS))
+
+
+@pytest.mark.parametrize('year', YEARS)
+def test_cube_matches_legacy(cube, year):
+    """キューブの年ごとの表は以前の年ごとの生成処理と同じ値になる"""
+    legacy = legacy_population_data(year)
+    frame = cube.year(year)
+    assert frame['pref_code'].tolist() == legacy['pref_code'].tolist()
+    assert frame['prefecture'].astype(str).tolist() == legacy['prefecture'].tolist()
+    assert frame['region'].astype(str).tolist() == legacy['region'].tolist()
+    for column in COUNT_COLUMNS + ['year']:
+        np.testing.assert_array_equal(frame[column].to_numpy(), legacy[column].to_numpy(), err_msg=column)
+    np.testing.assert_allclose(frame['density'].to_numpy(), legacy['density'].to_numpy())
+
+
+def test_fetch_population_data_returns_copy():
+    year = YEARS[0]
+    first = fetch_population_data(year)
+    first['total_population'] = 0
+    assert (fetch_population_data(year)['total_population'] > 0).all()
+
+
+@pytest.mark.parametrize('column', ['total_population', 'density', 'population_65plus'])
+@pytest.mark.parametrize('n', [1, 5, 20, None])
+def test_top_matches_sort(cube, column, n):
+    """上位n件は安定ソートで並べた先頭n件と同じ（同じ値は都道府県コード順）"""
+    year = YEARS[-1]
+    expected = cube.year(year).sort_values(column, ascending=False, kind='stable')
+    if n is not None:
+        expected = expected.head(n)
+    assert cube.top(year, column, n)['pref_code'].tolist() == expected['pref_code'].tolist()
+
+
+def test_regions_sum_to_total(cube):
+    year = YEARS[0]
+    regions = cube.regions(year)
+    assert regions['total_population'].sum() == cube.year(year)['total_population'].sum()
+    assert regions['region_en'].notna().all()
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from estat_client import EStatClient, make_session
+from estat_mock import MockEStatServer
+from population_data import COUNT_COLUMNS, sample_population_frame
+from population_store import HAS_PYARROW, read_store, sync
+
+
+class MetaOnlyClient:
+    """分類だけを返すクライアント（値の取得は呼ばれないこと）"""
+
+    requests = 0
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_meta_info(self, stats_data_id):
+        return self.objects
+
+    def iter_values(self, stats_data_id, **filters):
+        raise AssertionError('取り込む年がないのに値を取得した')
+
+
+@pytest.mark.parametrize('objects', [{}, {'time': {'classes': []}}])
+def test_sync_without_years(tmp_path, objects):
+    """時間軸の分類がない統計表では、何も取得せずにその旨を表示する"""
+    messages = []
+    assert sync(MetaOnlyClient(objects), '0003000000', path=str(tmp_path / 'population.parquet'),
+                log=messages.append) == []
+    assert '取り込める年がありません' in messages[-1]
+    assert not (tmp_path / 'population.parquet').exists()
+
+
+def mock_client(server):
+    return EStatClient('mock', base_url=server.url, session=make_session(backoff_factor=0.01),
+                       page_size=server.page_size)
+
+
+def data_requests(server):
+    return [params for endpoint, params in server.requests if endpoint == 'getStatsData']
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason='pyarrowがない')
+def test_sync_from_mock_server(tmp_path):
+    """ページ分割と503の再試行を経て全年を取り込み、2回目は新しい年だけを取得する"""
+    path = str(tmp_path / 'population.parquet')
+    frame = sample_population_frame([2015, 2016])
+
+    # 47都道府県 × 2年 × 年齢区分4つ（総数を含む） = 376件を100件ずつ取得し、3回に1回は503を返す
+    with MockEStatServer(frame, page_size=100, fail_every=3) as server:
+        assert sync(mock_client(server), server.stats_data_id, path, log=lambda message: None) == [2015, 2016]
+    pages = data_requests(server)
+    starts = sorted({int(params['startPosition']) for params in pages})
+    assert starts == [1, 101, 201, 301]
+    # 503を返したリクエストは同じ条件で再試行されている（メタ情報1回 + 4ページ + 再試行）
+    distinct = {(endpoint, tuple(sorted(params.items()))) for endpoint, params in server.requests}
+    assert len(distinct) == 5
+    assert len(server.requests) > len(distinct)
+    stored, metadata = read_store(path)
+    assert metadata['stats_data_id'] == server.stats_data_id
+    pd.testing.assert_frame_equal(stored[['year', 'pref_code', *COUNT_COLUMNS]],
+                                  frame[['year', 'pref_code', *COUNT_COLUMNS]].astype(stored.dtypes.to_dict()))
+
+    # 統計表に2017年が加わったら、その年だけを取得して追記する
+    with MockEStatServer(sample_population_frame([2015, 2016, 2017]), page_size=100) as server:
+        assert sync(mock_client(server), server.stats_data_id, path, log=lambda message: None) == [2017]
+    assert {params['cdTime'] for params in data_requests(server)} == {'2017000000'}
+    stored, _ = read_store(path)
+    assert sorted(stored['year'].unique()) == [2015, 2016, 2017]
+
+    # 新しい年がなければメタ情報だけを確認する
+    with MockEStatServer(sample_population_frame([2015, 2016, 2017])) as server:
+        assert sync(mock_client(server), server.stats_data_id, path, log=lambda message: None) == []
+    assert data_requests(server) == []
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import prefecture_geometry
+from benchmarks.fixtures import make_prefecture_geojson
+
+pytest.importorskip('shapely')
+
+SOURCE = json.dumps(make_prefecture_geojson(points_per_feature=200)).encode('utf-8')
+
+
+def wait_for_build(root):
+    build = prefecture_geometry._builds[str(root)]
+    if build['thread'] is not None:
+        build['thread'].join(60)
+
+
+def test_build_levels(tmp_path):
+    """詳細度ごとのファイルができ、属性は名前と2桁のコードだけになる"""
+    manifest = prefecture_geometry.build_levels(SOURCE, str(tmp_path))
+    assert prefecture_geometry.available(str(tmp_path))
+    assert list(manifest['levels']) == list(prefecture_geometry.LEVELS)
+    low = manifest['levels']['low']
+    assert low['vertices'] < manifest['levels']['full']['vertices']
+    features = prefecture_geometry.load_level('low', str(tmp_path))['features']
+    assert len(features) == 47
+    assert sorted(features[0]['properties']) == ['id', 'nam_ja']
+    assert [feature['properties']['id'] for feature in features[:2]] == ['01', '02']
+
+
+def test_ensure_levels_builds_once_in_background(tmp_path, monkeypatch):
+    """境界データがなければ別スレッドで一度だけ作成する"""
+    downloads = []
+
+    def download_source():
+        downloads.append(1)
+        return SOURCE
+
+    monkeypatch.setattr(prefecture_geometry, 'download_source', download_source)
+    root = str(tmp_path)
+    assert prefecture_geometry.ensure_levels(root)[1] is None
+    prefecture_geometry.ensure_levels(root)
+    wait_for_build(root)
+    assert prefecture_geometry.ensure_levels(root) == (True, None)
+    assert len(downloads) == 1
+
+
+def test_ensure_levels_retries_after_failure(tmp_path, monkeypatch):
+    """作成に失敗したら例外を返し、BUILD_RETRY_SECONDS がたつまでやり直さない"""
+    def offline():
+        raise OSError('offline')
+
+    monkeypatch.setattr(prefecture_geometry, 'download_source', offline)
+    root = str(tmp_path)
+    prefecture_geometry.ensure_levels(root)
+    wait_for_build(root)
+    available, error = prefecture_geometry.ensure_levels(root)
+    assert not available and str(error) == 'offline'
+
+    monkeypatch.setattr(prefecture_geometry, 'download_source', lambda: SOURCE)
+    monkeypatch.setattr(prefecture_geometry, 'BUILD_RETRY_SECONDS', 0)
+    prefecture_geometry.ensure_levels(root)
+    wait_for_build(root)
+    assert prefecture_geometry.ensure_levels(root) == (True, None)
@@ -0,0 +1,37 @@
+from benchmarks.run_benchmarks import find_regressions, main
+
+MB = 1024 ** 2
+
+
+def result(median, mad, peak_bytes=MB):
+    return {'best': median - mad, 'median': median, 'mad': mad, 'repeat': 9, 'peak_bytes': peak_bytes}
+
+
+def test_slower_median_beyond_noise_is_a_regression():
+    """中央値が許容倍率を超え、差がばらつきより大きければ退行"""
+    baseline = {'stage': result(0.100, 0.001)}
+    assert [name for name, _ in find_regressions({'stage': result(0.200, 0.002)}, baseline)] == ['stage']
+
+
+def test_noisy_stage_is_not_a_regression():
+    """中央値が許容倍率を超えても、差がばらつきの範囲なら退行とみなさない"""
+    baseline = {'stage': result(0.118, 0.015)}
+    assert find_regressions({'stage': result(0.186, 0.015)}, baseline) == []
+
+
+def test_small_relative_change_is_not_a_regression():
+    """ばらつきが小さくても、許容倍率以内なら退行とみなさない"""
+    baseline = {'stage': result(0.002, 0.00001)}
+    assert find_regressions({'stage': result(0.0028, 0.00001)}, baseline) == []
+
+
+def test_memory_regression():
+    """ピークメモリが許容倍率を超えて増えれば退行"""
+    baseline = {'stage': result(0.1, 0.001, peak_bytes=4 * MB)}
+    regressions = find_regressions({'stage': result(0.1, 0.001, peak_bytes=12 * MB)}, baseline)
+    assert [name for name, _ in regressions] == ['stage']
+
+
+def test_check_requires_a_local_baseline(tmp_path):
+    """--check は基準値がなければ計測せずに失敗する"""
+    assert main(['--check', '--baseline', str(tmp_path / 'baseline.json')]) == 2
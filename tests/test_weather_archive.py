@@ -0,0 +1,84 @@
+import pytest
+
+from benchmarks.fixtures import FakeResponse, FakeSession
+from weather_archive import HAS_PYARROW, ingest_station, is_complete, read_archive, read_partition
+
+pytestmark = pytest.mark.skipif(not HAS_PYARROW, reason='pyarrowがない')
+
+LOCATION = {'name': 'Tokyo', 'prec_no': 44, 'block_no': 47662}
+YEAR = 2020
+
+
+class FailingSession(FakeSession):
+    """指定した月だけサーバーエラーを返すセッション"""
+
+    def __init__(self, failing_months=()):
+        super().__init__()
+        self.failing_months = set(failing_months)
+        self.urls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.urls.append(url)
+        if any(f'month={month:02d}' in url for month in self.failing_months):
+            return FakeResponse('Internal Server Error', status_code=500)
+        return super().get(url, headers=headers, timeout=timeout)
+
+
+def ingest(tmp_path, session, **kwargs):
+    messages = []
+    count = ingest_station(LOCATION, YEAR, YEAR, root=str(tmp_path / 'archive'), max_workers=2,
+                           climatology_root=str(tmp_path / 'climatology'), log=messages.append, session=session,
+                           **kwargs)
+    return count, messages
+
+
+def stored_months(tmp_path):
+    df, closed_months = read_partition(str(tmp_path / 'archive'), LOCATION, YEAR)
+    return set(df['date'].dt.month), closed_months
+
+
+def test_ingest_then_skip(tmp_path):
+    """12か月そろって取り込めた年は、次の実行では取得せずに省略する"""
+    assert ingest(tmp_path, FailingSession())[0] == 1
+    assert is_complete(str(tmp_path / 'archive'), LOCATION, YEAR)
+    assert stored_months(tmp_path) == (set(range(1, 13)), set(range(1, 13)))
+
+    session = FailingSession()
+    count, messages = ingest(tmp_path, session)
+    assert count == 0 and session.urls == []
+    assert 'スキップ' in messages[-1]
+
+
+def test_failed_month_is_retried(tmp_path):
+    """取得に失敗した月は確定扱いにせず、次の実行で取り込む"""
+    ingest(tmp_path, FailingSession([3]))
+    assert stored_months(tmp_path) == (set(range(1, 13)) - {3}, set(range(1, 13)) - {3})
+    assert not is_complete(str(tmp_path / 'archive'), LOCATION, YEAR)
+    _, missing = read_archive(LOCATION, [(YEAR, 3), (YEAR, 4)], str(tmp_path / 'archive'))
+    assert missing == [(YEAR, 3)]
+
+    ingest(tmp_path, FailingSession())
+    assert stored_months(tmp_path) == (set(range(1, 13)), set(range(1, 13)))
+    assert is_complete(str(tmp_path / 'archive'), LOCATION, YEAR)
+
+
+def test_reingest_keeps_archived_month_that_fails(tmp_path):
+    """取り込み直しで取得に失敗した月も、前回取り込んだ行と確定の記録は残る"""
+    ingest(tmp_path, FailingSession([3]))
+    before, _ = read_partition(str(tmp_path / 'archive'), LOCATION, YEAR)
+
+    # 3月は取れたが、前回取り込めていた5月が今回は失敗した
+    ingest(tmp_path, FailingSession([5]))
+    after, closed_months = read_partition(str(tmp_path / 'archive'), LOCATION, YEAR)
+    assert closed_months == set(range(1, 13))
+    assert set(after['date'].dt.month) == set(range(1, 13))
+    assert after['date'].is_monotonic_increasing and after['date'].is_unique
+    may = after[after['date'].dt.month == 5].reset_index(drop=True)
+    assert may.equals(before[before['date'].dt.month == 5].reset_index(drop=True))
+
+
+def test_force_keeps_archived_month_that_fails(tmp_path):
+    ingest(tmp_path, FailingSession())
+    ingest(tmp_path, FailingSession([12]), force=True)
+    assert stored_months(tmp_path) == (set(range(1, 13)), set(range(1, 13)))
+    assert is_complete(str(tmp_path / 'archive'), LOCATION, YEAR)
@@ -0,0 +1,30 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from weather_cache import WeatherCache, month_closed_at
+
+
+@pytest.fixture
+def host_timezone(monkeypatch):
+    """サーバーのタイムゾーンを切り替える"""
+    def use(name):
+        monkeypatch.setenv('TZ', name)
+        time.tzset()
+    yield use
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize('tz', ['UTC', 'America/Los_Angeles', 'Asia/Tokyo'])
+def test_is_fresh_uses_jst_month_close(host_timezone, tz):
+    """月の締め（翌月の締め猶予後）は、サーバーのタイムゾーンに関係なく日本時間で判定する"""
+    host_timezone(tz)
+    cache = WeatherCache.__new__(WeatherCache)
+    cache.ttl = 1800
+    closed = month_closed_at(2024, 5).astimezone(timezone.utc)
+    now = closed.timestamp() + 10 ** 6  # TTLはとうに切れている
+    assert not cache.is_fresh({'fetched_at': closed.timestamp() - 60}, 2024, 5, now=now)
+    assert cache.is_fresh({'fetched_at': closed.timestamp()}, 2024, 5, now=now)
+    assert closed == datetime(2024, 6, 2, 15, tzinfo=timezone.utc)  # 2024-06-03 00:00 JST
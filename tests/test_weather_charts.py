@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from weather_charts import m4_indices
+
+
+def _buckets(x, n_buckets):
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    return np.clip(np.searchsorted(edges, x, side='right') - 1, 0, n_buckets - 1)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('n_buckets', [10, 100, 800])
+def test_m4_keeps_bucket_extremes(seed, n_buckets):
+    """バケツごとに最初・最後の点と最小・最大の値が残る"""
+    rng = np.random.default_rng(seed)
+    n = 20000
+    # 欠測日のような間隔の乱れと、同じ値の並びも含める
+    x = np.cumsum(rng.integers(1, 4, n)).astype(np.int64) * 86_400_000_000_000
+    y = np.round(rng.normal(15, 8, n), 1)
+    keep = m4_indices(x, y, n_buckets)
+
+    assert np.all(np.diff(keep) > 0)
+    assert len(keep) <= 4 * n_buckets
+    bucket = _buckets(x.astype(np.float64), n_buckets)
+    kept = np.zeros(n, dtype=bool)
+    kept[keep] = True
+    for b in np.unique(bucket):
+        members = np.flatnonzero(bucket == b)
+        assert kept[members[0]] and kept[members[-1]]
+        values = y[members][kept[members]]
+        assert values.min() == y[members].min()
+        assert values.max() == y[members].max()
+
+
+def test_m4_returns_all_points_when_short():
+    x = np.arange(100)
+    np.testing.assert_array_equal(m4_indices(x, np.sin(x), n_buckets=25), np.arange(100))
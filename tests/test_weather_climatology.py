@@ -0,0 +1,138 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from weather_climatology import Climatology, anomalies, day_of_year_index
+
+YEARS = range(2001, 2011)
+
+
+def daily_frame(years=YEARS, seed=0):
+    """各年の1月〜12月の日別データ（0.1℃刻み）"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(f'{min(years)}-01-01', f'{max(years)}-12-31', freq='D')
+    max_temp = np.round(rng.normal(20, 6, len(dates)), 1)
+    return pd.DataFrame({'date': dates, 'max_temp': max_temp,
+                         'min_temp': np.round(max_temp - rng.uniform(3, 10, len(dates)), 1)})
+
+
+def all_months(years=YEARS):
+    return [(year, month) for year in years for month in range(1, 13)]
+
+
+def test_day_of_year_index_keeps_feb_29_slot():
+    dates = pd.to_datetime(['2020-01-01', '2020-02-29', '2021-03-01', '2021-12-31'])
+    assert day_of_year_index(dates).tolist() == [0, 59, 60, 365]
+
+
+def test_update_skips_months_already_ingested():
+    """同じ月を2回取り込んでも二重に数えない"""
+    df = daily_frame()
+    climatology = Climatology(47662)
+    assert climatology.update(df, all_months()[:30]) == 30
+    count, total = climatology.count.copy(), climatology.total.copy()
+
+    assert climatology.update(df, all_months()[:30]) == 0
+    np.testing.assert_array_equal(climatology.count, count)
+    # 一部が重なる取り込みでは、新しい月だけを足す
+    assert climatology.update(df, all_months()[20:]) == len(all_months()) - 30
+
+    fresh = Climatology(47662)
+    fresh.update(df, all_months())
+    np.testing.assert_array_equal(climatology.count, fresh.count)
+    np.testing.assert_allclose(climatology.total, fresh.total)
+    np.testing.assert_array_equal(climatology.hist, fresh.hist)
+    assert climatology.n_months == len(all_months())
+    assert not np.array_equal(total, climatology.total)
+
+
+def test_records_and_mean():
+    df = daily_frame()
+    climatology = Climatology(47662)
+    climatology.update(df, all_months())
+    normals = climatology.normals(window=1)
+
+    doy = day_of_year_index(df['date'])
+    for column, prefix in (('max_temp', 'max'), ('min_temp', 'min')):
+        grouped = df.assign(doy=doy, year=df['date'].dt.year).groupby('doy')
+        high = grouped[column].max()
+        low = grouped[column].min()
+        np.testing.assert_allclose(normals[f'{prefix}_record_high'].to_numpy()[high.index], high.to_numpy())
+        np.testing.assert_allclose(normals[f'{prefix}_record_low'].to_numpy()[low.index], low.to_numpy())
+        np.testing.assert_allclose(normals[f'{prefix}_mean'].to_numpy()[high.index], grouped[column].mean())
+        # 記録の年は、その値になった年のどれか
+        for day in (0, 59, 200, 365):
+            rows = df[(doy == day) & (df[column] == high[day])]
+            assert normals[f'{prefix}_record_high_year'][day] in set(rows['date'].dt.year)
+
+
+def test_records_update_across_calls():
+    """後から取り込んだ月の値が記録を上回れば、記録と年を更新する"""
+    df = daily_frame()
+    climatology = Climatology(47662)
+    climatology.update(df, all_months(range(2001, 2006)))
+    hot = df[df['date'] == '2008-07-01'].copy()
+    hot['max_temp'] = 45.0
+    climatology.update(pd.concat([df[df['date'].dt.year != 2008], hot]), all_months(range(2006, 2011)))
+    normals = climatology.normals(window=1)
+    day = day_of_year_index(pd.to_datetime(['2008-07-01']))[0]
+    assert normals['max_record_high'][day] == 45.0
+    assert normals['max_record_high_year'][day] == 2008
+
+
+@pytest.mark.parametrize('q', [10, 50, 90])
+def test_percentiles_are_nearest_rank(q):
+    """パーセンタイルは移動窓内の値の nearest-rank（ceil(n * q / 100) 番目）"""
+    df = daily_frame()
+    climatology = Climatology(47662)
+    climatology.update(df, all_months())
+    window = 5
+    normals = climatology.normals(window=window, percentiles=(q,))
+
+    doy = day_of_year_index(df['date'])
+    for day in (0, 2, 59, 180, 364, 365):
+        near = [(day + offset) % 366 for offset in range(-(window // 2), window // 2 + 1)]
+        values = np.sort(df['max_temp'].to_numpy()[np.isin(doy, near)])
+        expected = values[math.ceil(len(values) * q / 100) - 1]
+        assert normals[f'max_p{q}'][day] == pytest.approx(expected)
+        assert normals['max_mean'][day] == pytest.approx(values.mean())
+
+
+def test_window_wraps_across_new_year():
+    """12月31日と1月1日は移動窓で隣どうしとして集計する"""
+    dates = pd.to_datetime(['2019-12-31', '2020-01-01', '2020-12-31', '2021-01-01'])
+    df = pd.DataFrame({'date': dates, 'max_temp': [1.0, 3.0, 5.0, 7.0], 'min_temp': [0.0, 0.0, 0.0, 0.0]})
+    climatology = Climatology(47662)
+    climatology.update(df, [(2019, 12), (2020, 1), (2020, 12), (2021, 1)])
+    normals = climatology.normals(window=3)
+    assert normals['max_mean'][0] == pytest.approx(4.0)
+    assert normals['max_mean'][365] == pytest.approx(4.0)
+    assert normals['max_mean'][1] == pytest.approx(5.0)  # 1月1日と1月2日（データなし）だけ
+    assert normals['max_mean'][364] == pytest.approx(3.0)
+    assert np.isnan(normals['max_mean'][2])
+    assert normals['max_p90'][0] == 7.0 and normals['max_p10'][365] == 1.0
+
+
+def test_lookup_and_anomalies_follow_dates():
+    df = daily_frame()
+    climatology = Climatology(47662)
+    climatology.update(df, all_months())
+    sample = df.sample(50, random_state=0)
+    normals = climatology.lookup(sample['date'])
+    expected = climatology.normals().iloc[day_of_year_index(sample['date'])]
+    np.testing.assert_allclose(normals['max_mean'], expected['max_mean'])
+    result = anomalies(sample, climatology)
+    np.testing.assert_allclose(result['max_anomaly'], sample['max_temp'].to_numpy() - expected['max_mean'].to_numpy())
+
+
+def test_save_and_load_round_trip(tmp_path):
+    df = daily_frame()
+    climatology = Climatology(47662)
+    climatology.update(df, all_months())
+    climatology.save(str(tmp_path))
+    loaded = Climatology.load({'block_no': 47662}, str(tmp_path))
+    assert loaded.months == climatology.months
+    pd.testing.assert_frame_equal(loaded.normals(), climatology.normals())
+    assert loaded.update(df, all_months()) == 0
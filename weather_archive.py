@@ -0,0 +1,295 @@
+"""気温データのローカル列指向アーカイブ（観測所/年で分割したParquet）を作るバッチ取り込みツール。
+
+コマンドラインから実行する（Streamlitは不要）:
+
+    python weather_archive.py --start 1990 --end 2024
+    python weather_archive.py --stations tokyo 44:47662 --start 2020 --end 2024 --workers 8
+
+アーカイブの構成:
+
+    data/weather_archive/block_no=47662/year=2023/data.parquet
+    data/weather_archive/block_no=47662/year=2023/_COMPLETE
+
+Parquetのメタデータには、取り込み時点で締まっていた月（closed_months）を記録する。
+12か月すべてが締まった状態で取り込めた年には _COMPLETE を置き、以降の実行では取り込みを省略する。
+締まった月は観測所ごとの気候値（weather_climatology、data/climatology/）にも足し込む。
+ダッシュボード（weather_streamlit.py）は load_month / load_range を通して、まずアーカイブを読み、
+足りない月だけ気象庁から取得する。
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+import traceback
+from datetime import datetime
+
+import pandas as pd
+
+from weather_cache import JST, WeatherCache, month_closed_at
+from weather_climatology import DEFAULT_CLIMATOLOGY_PATH, Climatology
+from weather_data import (DEFAULT_MAX_WORKERS, LOCATIONS, FetchResult, fetch_month_rows, fetch_months,
+                          iter_months, rows_to_frame)
+
+# pyarrowはアーカイブを読み書きするときに読み込む（ページの起動を遅くしない）。なければアーカイブは使わない
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# アーカイブの場所（環境変数で変更可能）
+DEFAULT_ARCHIVE_PATH = os.environ.get(
+    'WEATHER_ARCHIVE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'weather_archive')
+)
+
+COMPLETE_MARKER = '_COMPLETE'
+DATA_FILE = 'data.parquet'
+
+
+def partition_dir(root, location_info, year):
+    """観測所と年に対応するパーティションのディレクトリを返す関数"""
+    return os.path.join(root, f'block_no={int(location_info["block_no"])}', f'year={int(year)}')
+
+
+def is_complete(root, location_info, year):
+    """その年のパーティションが取り込み済み（12か月すべて確定）かを返す関数"""
+    return os.path.exists(os.path.join(partition_dir(root, location_info, year), COMPLETE_MARKER))
+
+
+def read_partition(root, location_info, year, columns=None):
+    """パーティションを読み込む関数。戻り値は (DataFrame, 確定済みの月の集合)。なければ (None, 空集合)。"""
+    path = os.path.join(partition_dir(root, location_info, year), DATA_FILE)
+    if not HAS_PYARROW or not os.path.exists(path):
+        return None, set()
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, columns=columns)
+    metadata = table.schema.metadata or {}
+    closed = metadata.get(b'closed_months', b'').decode('ascii')
+    closed_months = {int(m) for m in closed.split(',') if m}
+    return table.to_pandas(), closed_months
+
+
+def write_partition(root, location_info, year, df, closed_months):
+    """パーティションを書き込む関数。途中で止まっても壊れたファイルが残らないように置き換えで書く。"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    directory = partition_dir(root, location_info, year)
+    os.makedirs(directory, exist_ok=True)
+    marker = os.path.join(directory, COMPLETE_MARKER)
+    if os.path.exists(marker):
+        os.remove(marker)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b'closed_months': ','.join(str(m) for m in sorted(closed_months)).encode('ascii'),
+        b'ingested_at': datetime.now().isoformat(timespec='seconds').encode('ascii'),
+    })
+    path = os.path.join(directory, DATA_FILE)
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+    if len(closed_months) == 12:
+        with open(marker, 'w') as f:
+            f.write('')
+
+
+def read_archive(location_info, months, root=DEFAULT_ARCHIVE_PATH):
+    """(年, 月) のリストのうちアーカイブで賄える分を読む関数。
+
+    戻り値は (アーカイブから読めたDataFrame, アーカイブになかった月のリスト)。
+    """
+    months = list(months)
+    frames = []
+    missing = []
+    for year in sorted({y for y, _ in months}):
+        wanted = [m for y, m in months if y == year]
+        df, closed_months = read_partition(root, location_info, year)
+        covered = [m for m in wanted if m in closed_months]
+        missing.extend((year, m) for m in wanted if m not in closed_months)
+        if df is not None and covered:
+            frames.append(df[df['date'].dt.month.isin(covered)])
+
+    if frames:
+        archived = pd.concat(frames, ignore_index=True)
+    else:
+        archived = pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'), 'max_temp': pd.Series(dtype='float64'),
+                                 'min_temp': pd.Series(dtype='float64'), 'precipitation': pd.Series(dtype='object')})
+    return archived, missing
+
+
+def load_month(year, month, location_info, cache=None, precipitation=False, debug=False, progress=None,
+               root=DEFAULT_ARCHIVE_PATH):
+    """1か月分のデータをアーカイブ → キャッシュ → 気象庁の順に探して取得する関数（Streamlitに依存しない）。
+
+    例外は送出せず、エラー内容は diagnostics['error']（debug時は diagnostics['traceback'] も）に入れて返す。
+    progressを渡すと進捗の割合(0〜1)で呼び出す。
+    """
+    started = time.perf_counter()
+    diagnostics = {'year': year, 'month': month, 'source': None, 'messages': [], 'error': None}
+    df = None
+    try:
+        # ローカルのアーカイブにあればそれを使う
+        archived, missing = read_archive(location_info, [(year, month)], root)
+        if not missing and len(archived) > 0:
+            diagnostics['source'] = 'archive'
+            df = archived
+        else:
+            rows = fetch_month_rows(year, month, location_info, cache=cache, diagnostics=diagnostics,
+                                    debug=debug, progress=progress)
+            if rows is None:
+                diagnostics['error'] = "データ表が見つかりませんでした"
+            else:
+                df = rows_to_frame(rows, precipitation=True)
+        
+        if df is not None and len(df) == 0:
+            diagnostics['error'] = "データが見つかりませんでした"
+            df = None
+        if df is not None and not precipitation:
+            df = df.drop(columns='precipitation')
+    except Exception as e:
+        diagnostics['error'] = f"エラー発生: {str(e)}"
+        if debug:
+            diagnostics['traceback'] = traceback.format_exc()
+        df = None
+    
+    diagnostics['rows'] = 0 if df is None else len(df)
+    diagnostics['elapsed'] = time.perf_counter() - started
+    if progress is not None:
+        progress(1.0)
+    return FetchResult(df, diagnostics)
+
+
+def load_range(location_info, start, end, cache=None, precipitation=False, root=DEFAULT_ARCHIVE_PATH,
+               max_workers=DEFAULT_MAX_WORKERS, progress=None):
+    """期間のデータをアーカイブから読み、足りない月だけ気象庁から並列に取得して1つにまとめる関数。
+
+    diagnosticsには取得に失敗した月と理由（failures）、アーカイブから読めた月数（archived_months）などが入る。
+    progressを渡すと進捗の割合(0〜1)で呼び出す（呼び出し元のスレッドで呼ばれる）。
+    """
+    started = time.perf_counter()
+    months = list(iter_months(start, end))
+    archived, missing = read_archive(location_info, months, root)
+    failures = []
+    df = archived
+    if missing:
+        def on_progress(done, total):
+            if progress is not None:
+                progress(done / total)
+        
+        fetched, failures = fetch_months(location_info, missing, cache=cache, precipitation=True,
+                                         max_workers=max_workers, on_progress=on_progress)
+        if len(archived) == 0:
+            df = fetched
+        elif len(fetched) > 0:
+            df = pd.concat([archived, fetched], ignore_index=True)
+    df = df.sort_values('date').drop_duplicates('date').reset_index(drop=True)
+    if not precipitation:
+        df = df.drop(columns='precipitation')
+    
+    diagnostics = {
+        'start': tuple(start),
+        'end': tuple(end),
+        'months': len(months),
+        'archived_months': len(months) - len(missing),
+        'failures': failures,
+        'rows': len(df),
+        'error': None if len(df) > 0 else "データが見つかりませんでした",
+        'elapsed': time.perf_counter() - started,
+    }
+    if progress is not None:
+        progress(1.0)
+    return FetchResult(df if len(df) > 0 else None, diagnostics)
+
+
+def ingest_station(location_info, start_year, end_year, root=DEFAULT_ARCHIVE_PATH, cache=None,
+                   max_workers=DEFAULT_MAX_WORKERS, force=False, climatology_root=DEFAULT_CLIMATOLOGY_PATH, log=print,
+                   session=None):
+    """1つの観測所について、年ごとのパーティションを取り込む関数。取り込んだ年数を返す。
+
+    締まった月は観測所の気候値（weather_climatology）にも足し込む。
+    今回取得に失敗した月は、前回までに取り込んだ行と確定済みの記録をそのまま残す。
+    sessionを省略すると共有セッションを使う。
+    """
+    # 取り込む月の範囲と月の締めは日本時間で決める
+    now = datetime.now(JST)
+    climatology = Climatology.load(location_info, climatology_root)
+    climatology_months = climatology.n_months
+    ingested = 0
+    for year in range(start_year, min(end_year, now.year) + 1):
+        if not force and is_complete(root, location_info, year):
+            # 取り込み済みの年でも、気候値に入っていなければアーカイブから足し込む
+            if any((year * 12 + m - 1) not in climatology.months for m in range(1, 13)):
+                df, closed_months = read_partition(root, location_info, year)
+                climatology.update(df, [(year, m) for m in closed_months])
+            log(f"  {year}: 取り込み済みのためスキップ")
+            continue
+
+        last_month = 12 if year < now.year else now.month
+        months = list(iter_months((year, 1), (year, last_month)))
+        started = time.perf_counter()
+        df, failures = fetch_months(location_info, months, cache=cache, precipitation=True,
+                                    max_workers=max_workers, session=session)
+        failed = {m for (_, m), _ in failures}
+        closed_months = {m for _, m in months if m not in failed and month_closed_at(year, m) <= now}
+        if failed:
+            # 取得できなかった月は、アーカイブにある行を残す（取り込み直しで消えないように）
+            stored, stored_closed = read_partition(root, location_info, year)
+            if stored is not None:
+                kept = stored[stored['date'].dt.month.isin(failed)]
+                if len(kept) > 0:
+                    df = pd.concat([df, kept], ignore_index=True).sort_values('date').reset_index(drop=True)
+                closed_months |= stored_closed & failed
+        write_partition(root, location_info, year, df, closed_months)
+        climatology.update(df, [(year, m) for m in closed_months])
+        ingested += 1
+
+        status = "完了" if len(closed_months) == 12 else f"確定 {len(closed_months)}/12か月"
+        log(f"  {year}: {len(df)}件 ({status}, {time.perf_counter() - started:.1f}秒)")
+        for (_, m), reason in failures:
+            log(f"    {year}年{m}月の取得に失敗: {reason}")
+
+    if climatology.n_months != climatology_months:
+        climatology.save(climatology_root)
+        log(f"  気候値を更新: {climatology.n_months}か月分")
+    return ingested
+
+
+def parse_station(text):
+    """コマンドライン引数を観測所情報に変換する関数。地域名・英語名・"府県番号:地点番号" に対応。"""
+    for key, info in LOCATIONS.items():
+        if text == key or text.lower() == info['name'].lower():
+            return info
+    if ':' in text:
+        prec_no, block_no = text.split(':', 1)
+        return {'prec_no': int(prec_no), 'block_no': int(block_no), 'name': text}
+    raise argparse.ArgumentTypeError(f"不明な観測所です: {text}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='気象庁の日別気温データをParquetアーカイブに取り込みます')
+    parser.add_argument('--stations', nargs='+', type=parse_station,
+                        help='観測所（東京 / tokyo / 44:47662 など）。省略時は登録済みの全地点')
+    parser.add_argument('--start', type=int, required=True, help='開始年')
+    parser.add_argument('--end', type=int, default=datetime.now().year, help='終了年（省略時は今年）')
+    parser.add_argument('--archive', default=DEFAULT_ARCHIVE_PATH, help='アーカイブの出力先')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help='並列ダウンロード数')
+    parser.add_argument('--climatology', default=DEFAULT_CLIMATOLOGY_PATH, help='気候値の出力先')
+    parser.add_argument('--force', action='store_true', help='取り込み済みの年も取り込み直す')
+    args = parser.parse_args(argv)
+
+    if not HAS_PYARROW:
+        parser.error('アーカイブの作成には pyarrow が必要です（pip install pyarrow）')
+
+    stations = args.stations or list(LOCATIONS.values())
+    cache = WeatherCache()
+    for location_info in stations:
+        print(f"{location_info['name']} (block_no={location_info['block_no']}): {args.start}〜{args.end}年")
+        ingest_station(location_info, args.start, args.end, root=args.archive, cache=cache,
+                       max_workers=args.workers, force=args.force, climatology_root=args.climatology)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
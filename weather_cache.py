@@ -0,0 +1,157 @@
+"""気象庁の日別データページのパース結果をディスクに永続キャッシュするモジュール。
+
+キーは (prec_no, block_no, year, month) から作るハッシュで、値はパース済みの行データ。
+プロセスを再起動してもキャッシュが残るようにSQLite（標準ライブラリ）に保存する。
+
+有効期限の考え方:
+- 月が締まった後に取得したデータ（過去月）は二度と期限切れにならない
+- 当月分（または月が締まる前に取得したデータ）は短いTTLで再検証する
+- 再検証はETag/Last-Modifiedによる条件付きGETで行い、304なら保存済みの行を使い回す
+- 月の締めは日本時間で判定する（サーバーのタイムゾーンに関係なく同じ結果になる）
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    JST = ZoneInfo('Asia/Tokyo')
+except (ImportError, ZoneInfoNotFoundError):  # タイムゾーンデータがない環境（日本は夏時間がないので固定の+9時間でよい）
+    JST = timezone(timedelta(hours=9), 'JST')
+
+# キャッシュファイルの場所（環境変数で変更可能）
+DEFAULT_CACHE_PATH = os.environ.get(
+    'WEATHER_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'jma_daily.sqlite3')
+)
+
+# 当月データの有効期限（秒）
+CURRENT_MONTH_TTL = 30 * 60
+
+# 月末直後は気象庁側で値が確定していないことがあるので、締め後の猶予を置く
+CLOSE_GRACE = timedelta(days=2)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_pages (
+    key TEXT PRIMARY KEY,
+    prec_no INTEGER NOT NULL,
+    block_no INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    rows TEXT NOT NULL,
+    content_hash TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+)
+"""
+
+
+def cache_key(location_info, year, month):
+    """(prec_no, block_no, year, month) からキャッシュキーを作る関数"""
+    raw = f'{int(location_info["prec_no"])}:{int(location_info["block_no"])}:{int(year)}:{int(month):02d}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def content_hash(body):
+    """レスポンス本文のハッシュを計算する関数（ETagを返さないサーバー向けの変更検知用）"""
+    return hashlib.sha256(body).hexdigest()
+
+
+def month_closed_at(year, month):
+    """指定した年月のデータが確定したとみなす時刻（日本時間）を返す関数"""
+    if month == 12:
+        next_month = datetime(year + 1, 1, 1, tzinfo=JST)
+    else:
+        next_month = datetime(year, month + 1, 1, tzinfo=JST)
+    return next_month + CLOSE_GRACE
+
+
+class WeatherCache:
+    """日別気温データのパース結果を保存するSQLiteキャッシュ。
+
+    スレッドごとに接続を張り直すので、複数スレッドから同時に使ってよい。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=CURRENT_MONTH_TTL):
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(_SCHEMA)
+            conn.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, location_info, year, month):
+        """キャッシュエントリを取得する。なければNoneを返す。"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                'SELECT rows, content_hash, etag, last_modified, fetched_at FROM daily_pages WHERE key = ?',
+                (cache_key(location_info, year, month),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'rows': json.loads(row[0]),
+            'content_hash': row[1],
+            'etag': row[2],
+            'last_modified': row[3],
+            'fetched_at': row[4],
+        }
+
+    def put(self, location_info, year, month, rows, content_hash=None, etag=None, last_modified=None):
+        """パース済みの行データを保存する"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO daily_pages '
+                '(key, prec_no, block_no, year, month, rows, content_hash, etag, last_modified, fetched_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    cache_key(location_info, year, month),
+                    int(location_info['prec_no']), int(location_info['block_no']), int(year), int(month),
+                    json.dumps(rows, ensure_ascii=False), content_hash, etag, last_modified, time.time(),
+                )
+            )
+            conn.commit()
+
+    def touch(self, location_info, year, month, etag=None, last_modified=None):
+        """再検証で変更がなかったエントリの取得時刻（と検証子）を更新する"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'UPDATE daily_pages SET fetched_at = ?, '
+                'etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?',
+                (time.time(), etag, last_modified, cache_key(location_info, year, month))
+            )
+            conn.commit()
+
+    def is_fresh(self, entry, year, month, now=None):
+        """エントリをネットワークに問い合わせずに使ってよいかを判定する"""
+        if entry is None:
+            return False
+        fetched_at = datetime.fromtimestamp(entry['fetched_at'], JST)
+        # 月が締まった後に取得したデータはもう変わらない
+        if fetched_at >= month_closed_at(year, month):
+            return True
+        now = now if now is not None else time.time()
+        return now - entry['fetched_at'] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry):
+        """条件付きGET用のリクエストヘッダーを作る"""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
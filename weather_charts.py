@@ -0,0 +1,228 @@
+"""気温データのグラフ。
+
+plot_temperature はMatplotlibの静的なグラフ（pyplotを使わない Figure。画像にするのは figure_render）、
+temperature_chart はブラウザ側で描画するインタラクティブグラフ（Altair / Vega-Lite）を作る。
+
+インタラクティブグラフでは、数十年分の日別データをそのまま送ると系列ごとに1万点を超えるので、表示している期間を
+グラフの横幅（バケツ数）で区切り、M4法（各バケツの最初・最後・最小・最大の4点）で間引いてから送る。
+M4で残した点を線で結ぶと、ピクセル単位では間引く前の折れ線と同じ見た目になる。
+Streamlitはグラフのデータ部分を列指向（Arrow）で送るので、送信量は点の数にほぼ比例する。
+AltairとMatplotlibは読み込みに時間がかかるので、グラフを作る関数の中で読み込む（ページの初回表示を遅くしない）。
+"""
+import numpy as np
+import pandas as pd
+
+# グラフの横幅に相当するバケツ数（1系列あたり最大でこの4倍の点を送る）
+DEFAULT_BUCKETS = 800
+
+# 雨・雪マーカーを表示する最大日数（これより長い期間ではマーカーが重なって読めないので省略）
+MAX_MARKER_DAYS = 1100
+
+SERIES_LABELS = {'max_temp': 'Max Temp', 'min_temp': 'Min Temp'}
+SERIES_COLORS = ['#FF4B4B', '#4B6CFF']
+
+
+def m4_indices(x, y, n_buckets=DEFAULT_BUCKETS):
+    """M4ダウンサンプリングで残す点のインデックスを返す関数。
+
+    xは昇順に並んだ数値（日時ならint64に変換したもの）、yに欠損値は含めないこと。
+    点の数がバケツ数の4倍以下なら全点を返す。
+    """
+    n = len(y)
+    if n <= 4 * n_buckets:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # xの範囲を等幅のバケツに分ける（xは昇順なので各バケツは連続した区間になる）
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    bucket = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, n_buckets - 1)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    # バケツ→値の順に並べ替えると、各区間の先頭が最小値、末尾が最大値になる
+    order = np.lexsort((y, bucket))
+    return np.unique(np.concatenate([starts, ends, order[starts], order[ends]]))
+
+
+def downsample_temperatures(df, start=None, end=None, n_buckets=DEFAULT_BUCKETS):
+    """表示期間の最高/最低気温をM4で間引き、Altair用の縦持ちDataFrame（date, series, temp）にする関数"""
+    window = df
+    if start is not None:
+        window = window[window['date'] >= pd.Timestamp(start)]
+    if end is not None:
+        window = window[window['date'] <= pd.Timestamp(end)]
+
+    frames = []
+    for column, label in SERIES_LABELS.items():
+        series = window[['date', column]].dropna()
+        dates = series['date'].to_numpy()
+        values = series[column].to_numpy()
+        keep = m4_indices(dates.astype('datetime64[ns]').astype(np.int64), values, n_buckets)
+        frames.append(pd.DataFrame({'date': dates[keep], 'series': label, 'temp': values[keep]}))
+    return pd.concat(frames, ignore_index=True), window
+
+
+def temperature_chart(df, title, start=None, end=None, show_precipitation=False, n_buckets=DEFAULT_BUCKETS,
+                      climatology=None):
+    """表示期間に合わせて間引いた気温のインタラクティブグラフを作る関数。
+
+    climatology（weather_climatology.Climatology）を渡すと、平年値の破線を重ねる。
+
+    戻り値は (Altairのグラフ, 送信する点の数, 間引く前の点の数)。
+    """
+    import altair as alt
+
+    lines_data, window = downsample_temperatures(df, start, end, n_buckets)
+
+    x = alt.X('date:T', title='Date')
+    y = alt.Y('temp:Q', title='Temperature (℃)', scale=alt.Scale(domain=[-10, 40]))
+    color = alt.Color('series:N', title=None,
+                      scale=alt.Scale(domain=list(SERIES_LABELS.values()), range=SERIES_COLORS))
+
+    lines = alt.Chart(lines_data).mark_line(clip=True, strokeWidth=1.5).encode(
+        x=x, y=y, color=color,
+        tooltip=[alt.Tooltip('date:T', title='Date'), alt.Tooltip('series:N', title='Series'),
+                 alt.Tooltip('temp:Q', title='℃', format='.1f')],
+    )
+    # 0度の線を強調表示
+    zero_line = alt.Chart(pd.DataFrame({'temp': [0.0]})).mark_rule(color='black', opacity=0.8).encode(y='temp:Q')
+    layers = [lines, zero_line]
+
+    if climatology is not None and len(lines_data) > 0:
+        # 平年値は間引き後の日付について気候値の配列を引くだけ
+        normal_dates = pd.DatetimeIndex(np.unique(lines_data['date'].to_numpy()))
+        normals = climatology.lookup(normal_dates)
+        normal_data = pd.concat([
+            pd.DataFrame({'date': normal_dates, 'series': label, 'temp': normals[f'{column.split("_")[0]}_mean'].to_numpy()})
+            for column, label in SERIES_LABELS.items()
+        ], ignore_index=True)
+        layers.append(alt.Chart(normal_data).mark_line(clip=True, strokeDash=[4, 3], strokeWidth=1, opacity=0.8)
+                      .encode(x=x, y=y, color=color, detail='series:N'))
+
+    if show_precipitation and 'precipitation' in window.columns and len(window) <= MAX_MARKER_DAYS:
+        markers = window[window['precipitation'].isin(['rain', 'snow'])]
+        offsets = np.where(markers['precipitation'] == 'snow', 3.5, 2.0)
+        marker_data = pd.DataFrame({
+            'date': markers['date'].to_numpy(),
+            'temp': markers['max_temp'].to_numpy() + offsets,
+            'precipitation': markers['precipitation'].map({'rain': 'Rain', 'snow': 'Snow'}).to_numpy(),
+        })
+        layers.append(alt.Chart(marker_data).mark_point(filled=True, size=80, opacity=0.8, clip=True).encode(
+            x=x, y=y,
+            shape=alt.Shape('precipitation:N', title=None,
+                            scale=alt.Scale(domain=['Rain', 'Snow'], range=['triangle-down', 'diamond'])),
+            fill=alt.Fill('precipitation:N', legend=None,
+                          scale=alt.Scale(domain=['Rain', 'Snow'], range=['blue', 'skyblue'])),
+        ))
+
+    chart = alt.layer(*layers).properties(title=title, height=400).interactive(bind_y=False)
+    return chart, len(lines_data), int(window[list(SERIES_LABELS)].notna().sum().sum())
+
+
+# 雨・雪マーカーの表示設定（offsetは最高気温からの高さ）
+PRECIPITATION_STYLES = {
+    'rain': {'offset': 2.0, 'marker': 'v', 'color': 'blue', 'size': 150, 'alpha': 0.7, 'label': 'Rain'},
+    'snow': {'offset': 3.5, 'marker': '*', 'color': 'skyblue', 'size': 200, 'alpha': 0.8, 'label': 'Snow'},
+}
+
+
+def plot_temperature(df, location_name, year, month, show_precipitation=False, end=None, normals=None):
+    """最高気温と最低気温の推移をプロットする関数。雨や雪の日も表示可能。データがなければNoneを返す。
+
+    endに (年, 月) を渡すと、year/monthからendまでの期間グラフとして日付軸で描画する。
+    normalsに weather_climatology.anomalies の結果を渡すと、平年値と平年差の塗り分けを重ねる。
+    """
+    if df is None or len(df) == 0:
+        return None
+
+    import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+
+    # プロットの設定（pyplotの図の一覧に登録しない）
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+
+    # 英語表記用の月名マッピング
+    month_names = {1: 'January', 2: 'February', 3: 'March', 4: 'April', 5: 'May', 6: 'June',
+                  7: 'July', 8: 'August', 9: 'September', 10: 'October', 11: 'November', 12: 'December'}
+
+    is_range = end is not None and tuple(end) != (year, month)
+
+    # x軸用のデータ作成（単月は日付の日の部分のみ、期間指定は日付そのもの）
+    if is_range:
+        x_values = df['date']
+        style = '-' if len(df) > 120 else 'o-'  # 長期間ではマーカーを省略
+        linewidth = 1
+    else:
+        x_values = df['date'].dt.day
+        style = 'o-'
+        linewidth = 2
+
+    # 最高気温と最低気温の推移をプロット
+    ax.plot(x_values, df['max_temp'], style, linewidth=linewidth, color='#FF4B4B', label='Max Temp')
+    ax.plot(x_values, df['min_temp'], style, linewidth=linewidth, color='#4B6CFF', label='Min Temp')
+
+    # 平年値（破線）と平年差の塗り分け（平年より高い日は赤、低い日は青）
+    if normals is not None:
+        for column, color, label in (('max', '#FF4B4B', 'Normal Max'), ('min', '#4B6CFF', 'Normal Min')):
+            actual = normals[f'{column}_temp'].to_numpy()
+            normal = normals[f'{column}_normal'].to_numpy()
+            ax.plot(x_values, normal, '--', linewidth=1, color=color, alpha=0.8, label=label)
+            ax.fill_between(x_values, actual, normal, where=actual > normal, interpolate=True,
+                            color='#FF4B4B', alpha=0.15, linewidth=0)
+            ax.fill_between(x_values, actual, normal, where=actual < normal, interpolate=True,
+                            color='#4B6CFF', alpha=0.15, linewidth=0)
+
+    # 雨や雪の表示（show_precipitationがTrueの場合）
+    if show_precipitation and 'precipitation' in df.columns:
+        # 日ごとの区分を一度だけ配列にし、区分ごとにマーカーと縦線をまとめて1回で描画する
+        precipitation = df['precipitation'].to_numpy()
+        x_array = x_values.to_numpy()
+        max_temps = df['max_temp'].to_numpy()
+        for kind, marker_style in PRECIPITATION_STYLES.items():
+            is_kind = precipitation == kind
+            if not is_kind.any():
+                continue
+            kind_x = x_array[is_kind]
+            kind_temps = max_temps[is_kind]
+            # 最高気温から少し上の位置にマーカーを表示し、縦線（点線）で繋ぐ
+            ax.scatter(kind_x, kind_temps + marker_style['offset'], marker=marker_style['marker'], color=marker_style['color'],
+                       s=marker_style['size'], alpha=marker_style['alpha'], label=marker_style['label'])
+            ax.vlines(kind_x, kind_temps, kind_temps + marker_style['offset'], linestyles=':', color=marker_style['color'], alpha=0.5)
+
+    # y軸の範囲を-10度〜40度に設定
+    ax.set_ylim(bottom=-10, top=40)
+
+    # y軸の目盛りを5度ごとに設定
+    ax.set_yticks(range(-10, 41, 5))
+
+    if is_range:
+        # x軸の設定 - 期間に応じて自動で目盛り間隔を決める
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    else:
+        # x軸の設定 - 1日ごとに目盛りを入れる
+        ax.set_xticks(x_values)
+
+    # グリッドを追加 (5度ごとに補助線)
+    ax.grid(True, axis='y', linestyle='-', alpha=0.7)  # y軸グリッド
+    ax.grid(True, axis='x', linestyle='--', alpha=0.5)  # x軸グリッド（薄く）
+
+    # 0度の線を強調表示
+    ax.axhline(y=0, color='k', linestyle='-', linewidth=1.5, alpha=0.8)
+
+    # プロットの詳細設定
+    if is_range:
+        ax.set_title(f'{location_name} Temperature: {month_names[month]} {year} - '
+                     f'{month_names[end[1]]} {end[0]}', fontsize=16)
+        ax.set_xlabel('Date', fontsize=12)
+    else:
+        ax.set_title(f'{location_name} Temperature: {month_names[month]} {year}', fontsize=16)
+        ax.set_xlabel('Day', fontsize=12)
+    ax.set_ylabel('Temperature (℃)', fontsize=12)
+    ax.legend(loc='best')
+    fig.tight_layout()
+
+    return fig
@@ -0,0 +1,202 @@
+"""観測所ごとの日別気候値（平年値・パーセンタイル・記録）を保持する集計層。
+
+生の日別データを毎回集計し直さなくて済むように、観測所ごとに「通年日（2月29日を含む366日）×変数」の
+集計値（件数・合計・二乗和・0.1℃刻みのヒストグラム・最高/最低記録）だけをNumPy配列で持つ。
+新しい月を取り込むたびに足し込むだけで更新でき（取り込み済みの月は記録して二重計上しない）、
+観測所ごとに1つの圧縮 .npz ファイルとして保存する。
+
+平年値やパーセンタイルは、前後の日を含めた移動窓（既定15日）で集計値を合算してから計算する。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# 気候値の保存先（環境変数で変更可能）
+DEFAULT_CLIMATOLOGY_PATH = os.environ.get(
+    'WEATHER_CLIMATOLOGY_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'climatology')
+)
+
+VARIABLES = ('max_temp', 'min_temp')
+N_DAYS = 366
+
+# パーセンタイル計算用ヒストグラムの刻み（-50℃〜+50℃を0.1℃刻み）
+BIN_MIN = -50.0
+BIN_WIDTH = 0.1
+N_BINS = 1000
+
+# 平年値を計算するときの移動窓の日数
+DEFAULT_WINDOW = 15
+
+# うるう年の各月1日の通年日（0始まり）
+_MONTH_OFFSETS = np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])
+
+
+def day_of_year_index(dates):
+    """日付を2月29日を含む通年日（0〜365）に変換する関数"""
+    dates = pd.DatetimeIndex(dates)
+    return _MONTH_OFFSETS[dates.month.to_numpy() - 1] + dates.day.to_numpy() - 1
+
+
+def _window_sum(values, window):
+    """通年日の軸（axis=1）に沿って、年をまたいで循環する移動合計を取る（windowは奇数）"""
+    if window <= 1:
+        return values
+    half = window // 2
+    padded = np.concatenate([values[:, -half:], values, values[:, :half]], axis=1)
+    cumulative = np.cumsum(padded, axis=1, dtype=np.float64 if values.dtype.kind == 'f' else np.int64)
+    cumulative = np.concatenate([np.zeros_like(cumulative[:, :1]), cumulative], axis=1)
+    return cumulative[:, window:] - cumulative[:, :-window]
+
+
+class Climatology:
+    """1観測所の日別気候値。配列の1次元目は VARIABLES の順（最高気温, 最低気温）。"""
+
+    def __init__(self, block_no, count=None, total=None, total_sq=None, hist=None,
+                 record_high=None, record_high_year=None, record_low=None, record_low_year=None, months=None):
+        shape = (len(VARIABLES), N_DAYS)
+        self.block_no = int(block_no)
+        self.count = count if count is not None else np.zeros(shape, dtype=np.uint16)
+        self.total = total if total is not None else np.zeros(shape, dtype=np.float64)
+        self.total_sq = total_sq if total_sq is not None else np.zeros(shape, dtype=np.float64)
+        self.hist = hist if hist is not None else np.zeros(shape + (N_BINS,), dtype=np.uint16)
+        self.record_high = record_high if record_high is not None else np.full(shape, np.nan, dtype=np.float32)
+        self.record_high_year = record_high_year if record_high_year is not None else np.zeros(shape, dtype=np.int16)
+        self.record_low = record_low if record_low is not None else np.full(shape, np.nan, dtype=np.float32)
+        self.record_low_year = record_low_year if record_low_year is not None else np.zeros(shape, dtype=np.int16)
+        # 取り込み済みの月（year * 12 + month - 1）
+        self.months = set(int(m) for m in months) if months is not None else set()
+        self._normals = {}
+
+    @staticmethod
+    def path(location_info, root=DEFAULT_CLIMATOLOGY_PATH):
+        return os.path.join(root, f'block_no={int(location_info["block_no"])}.npz')
+
+    @classmethod
+    def load(cls, location_info, root=DEFAULT_CLIMATOLOGY_PATH):
+        """保存済みの気候値を読み込む。なければ空の気候値を返す。"""
+        path = cls.path(location_info, root)
+        if not os.path.exists(path):
+            return cls(location_info['block_no'])
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(location_info['block_no'], **arrays)
+
+    def save(self, root=DEFAULT_CLIMATOLOGY_PATH):
+        """圧縮した .npz として保存する（書き込み途中のファイルが残らないように置き換えで書く）"""
+        os.makedirs(root, exist_ok=True)
+        path = self.path({'block_no': self.block_no}, root)
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path, count=self.count, total=self.total, total_sq=self.total_sq, hist=self.hist,
+            record_high=self.record_high, record_high_year=self.record_high_year,
+            record_low=self.record_low, record_low_year=self.record_low_year,
+            months=np.array(sorted(self.months), dtype=np.int32),
+        )
+        os.replace(tmp_path, path)
+
+    @property
+    def n_months(self):
+        return len(self.months)
+
+    def update(self, df, months):
+        """df（date, max_temp, min_temp）のうち、まだ取り込んでいない months（(年, 月) のリスト）を足し込む。
+
+        締まった月だけを渡すこと。足し込んだ月数を返す。
+        """
+        new_keys = {year * 12 + month - 1 for year, month in months} - self.months
+        if not new_keys:
+            return 0
+        dates = pd.DatetimeIndex(df['date'])
+        month_keys = dates.year.to_numpy() * 12 + dates.month.to_numpy() - 1
+        selected = np.isin(month_keys, list(new_keys))
+        dates = dates[selected]
+        doy = day_of_year_index(dates)
+        years = dates.year.to_numpy()
+
+        for v, column in enumerate(VARIABLES):
+            values = df[column].to_numpy(dtype=np.float64)[selected]
+            valid = ~np.isnan(values)
+            v_doy, v_values, v_years = doy[valid], values[valid], years[valid]
+            if len(v_values) == 0:
+                continue
+
+            np.add.at(self.count[v], v_doy, 1)
+            np.add.at(self.total[v], v_doy, v_values)
+            np.add.at(self.total_sq[v], v_doy, v_values * v_values)
+            # 0.1℃単位の値が丸め誤差で隣の階級に入らないよう、わずかに下駄を履かせる
+            bins = np.clip(np.floor((v_values - BIN_MIN) / BIN_WIDTH + 1e-6).astype(np.int64), 0, N_BINS - 1)
+            np.add.at(self.hist[v], (v_doy, bins), 1)
+
+            # 記録: 通年日ごとの最大・最小を求めてから既存の記録と比べる
+            order = np.lexsort((v_values, v_doy))
+            sorted_doy = v_doy[order]
+            first = np.flatnonzero(np.r_[True, sorted_doy[1:] != sorted_doy[:-1]])
+            last = np.r_[first[1:], len(order)] - 1
+            slot = sorted_doy[first]
+
+            high, high_year = v_values[order[last]], v_years[order[last]]
+            beats_high = ~(high <= self.record_high[v, slot])  # 既存の記録がNaNなら更新
+            self.record_high[v, slot[beats_high]] = high[beats_high]
+            self.record_high_year[v, slot[beats_high]] = high_year[beats_high]
+
+            low, low_year = v_values[order[first]], v_years[order[first]]
+            beats_low = ~(low >= self.record_low[v, slot])
+            self.record_low[v, slot[beats_low]] = low[beats_low]
+            self.record_low_year[v, slot[beats_low]] = low_year[beats_low]
+
+        self.months |= new_keys
+        self._normals.clear()
+        return len(new_keys)
+
+    def normals(self, window=DEFAULT_WINDOW, percentiles=(10, 90)):
+        """通年日ごとの平年値・パーセンタイル・記録を DataFrame（366行）で返す。計算結果は保持して使い回す。"""
+        key = (window, tuple(percentiles))
+        if key in self._normals:
+            return self._normals[key]
+
+        count = _window_sum(self.count.astype(np.int64), window)
+        total = _window_sum(self.total, window)
+        hist = _window_sum(self.hist.astype(np.int32), window)
+        cumulative = np.cumsum(hist, axis=2)
+
+        columns = {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, total / count, np.nan)
+        for v, column in enumerate(VARIABLES):
+            prefix = column.split('_')[0]
+            columns[f'{prefix}_mean'] = mean[v]
+            for q in percentiles:
+                target = np.ceil(count[v] * q / 100.0)
+                bin_index = np.argmax(cumulative[v] >= np.maximum(target, 1)[:, None], axis=1)
+                value = np.round(BIN_MIN + bin_index * BIN_WIDTH, 1)
+                columns[f'{prefix}_p{q}'] = np.where(count[v] > 0, value, np.nan)
+            columns[f'{prefix}_record_high'] = self.record_high[v].astype(np.float64).round(1)
+            columns[f'{prefix}_record_high_year'] = self.record_high_year[v]
+            columns[f'{prefix}_record_low'] = self.record_low[v].astype(np.float64).round(1)
+            columns[f'{prefix}_record_low_year'] = self.record_low_year[v]
+        columns['years'] = self.count[0]
+
+        normals = pd.DataFrame(columns)
+        self._normals[key] = normals
+        return normals
+
+    def lookup(self, dates, window=DEFAULT_WINDOW):
+        """日付の並びに対応する平年値を、日付と同じ順のDataFrameで返す"""
+        return self.normals(window).iloc[day_of_year_index(dates)].reset_index(drop=True)
+
+
+def anomalies(df, climatology, window=DEFAULT_WINDOW):
+    """df（date, max_temp, min_temp）に平年値と平年差の列を加えたDataFrameを返す関数"""
+    normals = climatology.lookup(df['date'], window)
+    result = df.reset_index(drop=True).copy()
+    result['max_normal'] = normals['max_mean'].to_numpy()
+    result['min_normal'] = normals['min_mean'].to_numpy()
+    result['max_anomaly'] = result['max_temp'] - result['max_normal']
+    result['min_anomaly'] = result['min_temp'] - result['min_normal']
+    result['max_p90'] = normals['max_p90'].to_numpy()
+    result['min_p10'] = normals['min_p10'].to_numpy()
+    result['max_record_high'] = normals['max_record_high'].to_numpy()
+    result['min_record_low'] = normals['min_record_low'].to_numpy()
+    return result
@@ -0,0 +1,248 @@
+"""気象庁の日別気温データを取得・解析するデータ層（Streamlitに依存しない）。
+
+ワーカースレッドやバッチ処理からも呼べるように、画面表示に関わる処理はここに置かない。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from jma_table_parser import parse_daily_columns
+from weather_cache import WeatherCache, content_hash
+
+# 観測地点（prec_no: 府県番号, block_no: 地点番号）
+LOCATIONS = {
+    "東京": {"prec_no": 44, "block_no": 47662, "name": "Tokyo"},
+    "大阪": {"prec_no": 62, "block_no": 47772, "name": "Osaka"},
+    "北海道(札幌)": {"prec_no": 14, "block_no": 47412, "name": "Sapporo"},
+    "福岡": {"prec_no": 82, "block_no": 47807, "name": "Fukuoka"}
+}
+
+# 日別データページのURL
+DAILY_URL = ('https://www.data.jma.go.jp/obd/stats/etrn/view/daily_s1.php'
+             '?prec_no={prec_no}&block_no={block_no}&year={year}&month={month:02d}&day=1&view=')
+
+# 1ホストあたりの同時接続数の上限（気象庁サーバーに負荷をかけすぎないため）
+MAX_CONNECTIONS_PER_HOST = 4
+
+# 期間取得時のワーカースレッド数（キャッシュヒット分はネットワークを使わないので多めでよい）
+DEFAULT_MAX_WORKERS = 8
+
+# リクエストのタイムアウト（秒）
+REQUEST_TIMEOUT = 30
+
+
+def build_daily_url(location_info, year, month):
+    """日別データページのURLを組み立てる関数"""
+    return DAILY_URL.format(prec_no=location_info['prec_no'], block_no=location_info['block_no'],
+                            year=year, month=month)
+
+
+class FetchResult(NamedTuple):
+    """取得結果。dataは取得できなければNone、diagnosticsには取得元・所要時間・エラー内容などが入る。"""
+    data: Optional[pd.DataFrame]
+    diagnostics: dict
+
+
+class HostLimiter:
+    """ホストごとの同時リクエスト数を制限するセマフォの集まり"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def acquire(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.limit))
+        with semaphore:
+            yield
+
+
+_host_limiter = HostLimiter(MAX_CONNECTIONS_PER_HOST)
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """コネクションプールとリトライ設定を持つ共有セッションを返す関数"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,  # 0.5秒, 1秒, 2秒... と間隔を空けて再試行
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=('GET',),
+                respect_retry_after_header=True,
+            )
+            adapter = HTTPAdapter(pool_connections=MAX_CONNECTIONS_PER_HOST,
+                                  pool_maxsize=MAX_CONNECTIONS_PER_HOST, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def classify_precipitation(day_weather, night_weather):
+    """昼と夜の天気概況の配列から雨・雪を一括で判定する関数（雪があれば優先、なければ雨をチェック）。
+
+    戻り値は 'snow' / 'rain' / None の配列。
+    """
+    weather_text = pd.Series(day_weather, dtype=object) + pd.Series(night_weather, dtype=object)
+    is_snow = weather_text.str.contains('雪|みぞれ', regex=True).to_numpy(dtype=bool)
+    is_rain = weather_text.str.contains('雨', regex=False).to_numpy(dtype=bool)
+    return np.select([is_snow, is_rain], ['snow', 'rain'], default=None)
+
+
+def parse_daily_table(html, year, month, diagnostics=None, debug=False):
+    """日別データページのHTMLから気温と天気の行データを取り出す関数。表が見つからなければNoneを返す。
+
+    diagnosticsに辞書を渡すと、使ったパーサー・検出した列・ヘッダーを記録する。
+    debugがTrueなら、変換エラーなど解析中のメッセージも diagnostics['messages'] に追記する。
+    """
+    table = parse_daily_columns(html, debug=debug)
+    if table is None:
+        return None
+    
+    if diagnostics is not None:
+        diagnostics.update({
+            'parser': table.diagnostics['parser'],
+            'columns': table.diagnostics['columns'],
+            'first_headers': table.diagnostics['first_headers'],
+            'second_headers': table.diagnostics['second_headers'],
+        })
+        diagnostics.setdefault('messages', []).extend(table.diagnostics['messages'])
+    
+    precipitation = classify_precipitation(table.weather_day, table.weather_night)
+    
+    # キャッシュに保存できるように、欠損値はNoneにした行データにする
+    return [
+        {
+            'date': f'{year}-{month:02d}-{day:02d}',
+            'max_temp': None if max_temp != max_temp else max_temp,
+            'min_temp': None if min_temp != min_temp else min_temp,
+            'precipitation': precip_type,
+        }
+        for day, max_temp, min_temp, precip_type in zip(
+            table.day.tolist(), table.max_temp.tolist(), table.min_temp.tolist(), precipitation.tolist())
+    ]
+
+
+def fetch_month_rows(year, month, location_info, cache=None, session=None, diagnostics=None, debug=False,
+                     progress=None):
+    """1か月分の行データを取得する関数。キャッシュが新しければネットワークに問い合わせない。
+
+    表が見つからない場合はNoneを返し、通信エラーは例外として送出する。
+    diagnosticsに辞書を渡すと、URLや取得元（cache / revalidated / network）などを記録する。
+    progressを渡すと、処理の区切りごとに進捗の割合(0〜1)で呼び出す。
+    """
+    diagnostics = diagnostics if diagnostics is not None else {}
+    url = build_daily_url(location_info, year, month)
+    diagnostics['url'] = url
+    
+    # まずは永続キャッシュを確認（締まった月は再取得しない）
+    entry = cache.get(location_info, year, month) if cache is not None else None
+    if cache is not None and cache.is_fresh(entry, year, month):
+        diagnostics['source'] = 'cache'
+        return entry['rows']
+    
+    # リクエスト送信（キャッシュがあれば条件付きGETで再検証）
+    session = session if session is not None else get_session()
+    with _host_limiter.acquire(url):
+        response = session.get(url, headers=WeatherCache.conditional_headers(entry), timeout=REQUEST_TIMEOUT)
+    response.encoding = 'utf-8'
+    diagnostics['status_code'] = response.status_code
+    if progress is not None:
+        progress(0.5)
+    
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    
+    if entry is not None and response.status_code == 304:
+        # 変更なし: 保存済みの行を使い回す
+        cache.touch(location_info, year, month, etag, last_modified)
+        diagnostics['source'] = 'revalidated'
+        return entry['rows']
+    
+    response.raise_for_status()
+    body_hash = content_hash(response.content)
+    if entry is not None and entry['content_hash'] == body_hash:
+        # 検証子がなくても本文が同じならパースし直さない
+        cache.touch(location_info, year, month, etag, last_modified)
+        diagnostics['source'] = 'revalidated'
+        return entry['rows']
+    
+    diagnostics['source'] = 'network'
+    rows = parse_daily_table(response.text, year, month, diagnostics=diagnostics, debug=debug)
+    if rows is not None and cache is not None:
+        cache.put(location_info, year, month, rows, body_hash, etag, last_modified)
+    return rows
+
+
+def rows_to_frame(rows, precipitation=False):
+    """行データのリストを日付順のDataFrameに変換する関数"""
+    df = pd.DataFrame(rows, columns=['date', 'max_temp', 'min_temp', 'precipitation'])
+    if not precipitation:
+        df = df.drop(columns='precipitation')
+    df['date'] = pd.to_datetime(df['date'])
+    return df.sort_values('date').drop_duplicates('date').reset_index(drop=True)
+
+
+def iter_months(start, end):
+    """(年, 月) の範囲を両端を含めて列挙する関数"""
+    year, month = start
+    while (year, month) <= tuple(end):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def fetch_months(location_info, months, cache=None, precipitation=False,
+                 max_workers=DEFAULT_MAX_WORKERS, on_progress=None, session=None):
+    """(年, 月) のリストの各月を並列に取得し、1つのDataFrameにまとめる関数。
+
+    on_progressは呼び出し元のスレッドで (完了数, 総数) を渡して呼ばれる。
+    sessionを省略すると共有セッションを使う。
+    戻り値は (DataFrame, 取得に失敗した月と理由のリスト)。
+    """
+    months = list(months)
+    session = session if session is not None else get_session()
+    rows = []
+    failures = []
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_month_rows, year, month, location_info, cache, session): (year, month)
+            for year, month in months
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            year_month = futures[future]
+            try:
+                month_rows = future.result()
+                if month_rows is None:
+                    failures.append((year_month, "データ表が見つかりませんでした"))
+                else:
+                    rows.extend(month_rows)
+            except Exception as e:
+                failures.append((year_month, str(e)))
+            if on_progress is not None:
+                on_progress(done, len(months))
+    
+    return rows_to_frame(rows, precipitation), sorted(failures)
+
+
+def fetch_range(location_info, start, end, cache=None, precipitation=False,
+                max_workers=DEFAULT_MAX_WORKERS, on_progress=None, session=None):
+    """期間内の各月を並列に取得し、1つのDataFrameにまとめる関数。start/endは (年, 月) のタプル。"""
+    return fetch_months(location_info, iter_months(start, end), cache=cache, precipitation=precipitation,
+                        max_workers=max_workers, on_progress=on_progress, session=session)